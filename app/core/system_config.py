@@ -14,6 +14,26 @@ class SystemConfig(BaseSettings):
     """ 系统配置 """
     log_level: str = 'INFO'  # 日志级别
     server_timeout: int = 60  # 服务器超时时间，单位：分
+    file_change_journal_size: int = 10000  # 文件变更日志(环形缓冲区)保留的最大记录数
+    file_batch_workers: int = 8  # 批量文件操作的工作线程数
+    file_hash_cache_size: int = 8192  # 文件内容哈希缓存的最大条目数
+    file_content_cache_bytes: int = 64 * 1024 * 1024  # 文件内容缓存的内存预算，单位：字节
+    file_content_cache_max_file_bytes: int = 1024 * 1024  # 单个文件内容缓存的上限，单位：字节
+    file_line_index_files: int = 256  # 缓存行号索引的最大文件数量
+    file_upload_session_ttl: int = 24 * 3600  # 分片上传会话没有活动后保留的时长，单位：秒
+    file_upload_max_sessions: int = 256  # 同时存在的分片上传会话上限
+    file_copy_workers: int = 8  # 复制/删除目录树的并行工作线程数
+    file_operation_ttl: int = 3600  # 复制/移动/删除操作完成后保留进度的时长，单位：秒
+    file_snapshot_dir: str = '/tmp/.sandbox-snapshots'  # 目录快照的存储目录(快照之间通过硬链接共享未变化的文件)
+    file_disk_usage_cache_dirs: int = 100000  # 占用空间统计缓存的最大目录数
+    file_disk_usage_cache_ttl: int = 300  # 占用空间统计中单个目录扫描结果的最长复用时间，单位：秒
+    file_blob_store_dir: str = '/tmp/.sandbox-blobs'  # 按内容哈希寻址的blob存储目录
+    file_blob_store_max_bytes: int = 10 * 1024 * 1024 * 1024  # blob存储的容量上限，超出后淘汰最久未使用的blob，单位：字节
+    file_follow_poll_interval: float = 0.5  # 无法使用inotify时跟踪文件的轮询间隔，单位：秒
+    file_follow_heartbeat: int = 15  # 跟踪文件没有新数据时发送心跳的间隔，单位：秒
+    file_follow_max_read: int = 256 * 1024  # 跟踪文件时单条消息最多携带的字节数
+    file_regex_workers: int = 4  # 执行用户正则的工作进程数
+    file_regex_timeout: float = 10.0  # 单次正则搜索的默认时间预算，超时后终止工作进程并返回部分结果，单位：秒
 
     model_config = SettingsConfigDict(
         env_file='.env',  # 环境变量文件的路径
@@ -7,16 +7,32 @@
 @Desc   : 文件模块路由
 """
 import os
-from fastapi import APIRouter, Depends, File, Form, UploadFile
-from fastapi.responses import FileResponse
+from typing import Literal, Optional
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, File, Form, UploadFile, Request, Query, Header
+from fastapi.responses import StreamingResponse
 
 from app.interface.schemas.base import Response
 from app.interface.schemas.file import FileReadRequest, FileWriteRequest, FileReplaceRequest, FileSearchRequest, \
-    FileFindRequest, FileCheckRequest, FileDeleteRequest
+    FileReadBytesRequest, FileFindRequest, FileCheckRequest, FileDeleteRequest, FileWatchRequest, FileChangesRequest, \
+    FileListDirRequest, FileBatchRequest, FileChecksumRequest, FileMultiEditRequest, FileApplyPatchRequest, \
+    FileLineEditRequest, FileUploadSessionInitRequest, FileUploadSessionRequest, FileArchiveExportRequest, \
+    FileSignatureRequest, FileDeltaRequest, FileBlobMissingRequest, FileBlobMaterializeRequest, \
+    FileCopyRequest, FileMoveRequest, FileMkdirRequest, FileRmtreeRequest, FileOperationRequest, \
+    FileSnapshotCreateRequest, FileSnapshotListRequest, FileSnapshotRestoreRequest, FileSnapshotDeleteRequest, \
+    FileDiskUsageRequest
 from app.interface.service_dependencies import get_file_service
 from app.models.file import FileReadResult, FileWriteResult, FileReplaceResult, FileSearchResult, FileFindResult, \
-    FileUploadResult, FileCheckResult, FileDeleteResult
+    FileReadBytesResult, FileUploadResult, FileCheckResult, FileDeleteResult, FileWatchResult, FileChangesResult, \
+    FileListDirResult, FileBatchResult, FileChecksumResult, FileCacheStatsResult, FileMultiEditResult, \
+    FileApplyPatchResult, FileLineEditResult, FileUploadSessionResult, FileUploadPartResult, FileArchiveImportResult, \
+    FileSignatureResult, FileDeltaApplyResult, FileBlobMissingResult, FileBlobUploadResult, FileBlobMaterializeResult, \
+    FileOperationResult, FileMkdirResult, FileSnapshotInfo, FileSnapshotListResult, FileSnapshotRestoreResult, \
+    FileDiskUsageResult
 from app.services.file import FileService
+from app.services.file_archive import ARCHIVE_MEDIA_TYPES
+from app.services.file_download import FileDownloadResponse
 
 # 文件模块路由
 router = APIRouter(prefix='/file', tags=['文件模块'])
@@ -38,6 +54,27 @@ async def read_file(
         end_line=request.end_line,
         sudo=request.sudo,
         max_length=request.max_length,
+        if_none_match=request.if_none_match,
+        hash_algorithm=request.hash_algorithm,
+    )
+
+    return Response.success(msg='文件内容未修改' if result.not_modified else '文件内容读取成功', data=result)
+
+
+@router.post(
+    path='/read-bytes',
+    response_model=Response[FileReadBytesResult]
+)
+async def read_bytes(
+        request: FileReadBytesRequest,
+        file_service: FileService = Depends(get_file_service)
+) -> Response[FileReadBytesResult]:
+    """ 按字节范围读取文件，支持返回base64原始字节或自动检测编码，并嗅探是否为二进制文件 """
+    result = await file_service.read_bytes(
+        file_path=request.file_path,
+        offset=request.offset,
+        length=request.length,
+        encoding=request.encoding,
     )
 
     return Response.success(msg='文件内容读取成功', data=result)
@@ -60,6 +97,11 @@ async def write_file(
         leading_newline=request.leading_newline,
         trailing_newline=request.trailing_newline,
         sudo=request.sudo,
+        atomic=request.atomic,
+        fsync=request.fsync,
+        preserve_mode=request.preserve_mode,
+        preserve_owner=request.preserve_owner,
+        expected_hash=request.expected_hash,
     )
 
     return Response.success(msg='文件内容写入成功', data=result)
@@ -79,6 +121,8 @@ async def replace_in_file(
         old_str=request.old_str,
         new_str=request.new_str,
         sudo=request.sudo,
+        regex=request.regex,
+        max_replacements=request.max_replacements,
     )
 
     return Response.success(
@@ -87,6 +131,72 @@ async def replace_in_file(
     )
 
 
+@router.post(
+    path="/multi-edit",
+    response_model=Response[FileMultiEditResult],
+)
+async def multi_edit(
+        request: FileMultiEditRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileMultiEditResult]:
+    """对同一文件一次性应用多个编辑(字面量替换/行范围替换)，只写入一次"""
+    result = await file_service.multi_edit(
+        file_path=request.file_path,
+        edits=request.edits,
+        sudo=request.sudo,
+    )
+
+    return Response.success(
+        msg=f"文件编辑完成, 共生效{result.replaced_count}处编辑",
+        data=result,
+    )
+
+
+@router.post(
+    path="/apply-patch",
+    response_model=Response[FileApplyPatchResult],
+)
+async def apply_patch(
+        request: FileApplyPatchRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileApplyPatchResult]:
+    """应用unified diff补丁，支持多个文件、行号偏移与模糊上下文匹配"""
+    result = await file_service.apply_patch(
+        patch=request.patch,
+        base_dir=request.base_dir,
+        strip=request.strip,
+        max_fuzz=request.max_fuzz,
+        max_offset=request.max_offset,
+        allow_partial=request.allow_partial,
+        dry_run=request.dry_run,
+    )
+
+    return Response.success(
+        msg="补丁应用成功" if result.success else f"补丁部分应用失败, 失败{result.failed_hunks}个hunk",
+        data=result,
+    )
+
+
+@router.post(
+    path="/edit-lines",
+    response_model=Response[FileLineEditResult],
+)
+async def edit_lines(
+        request: FileLineEditRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileLineEditResult]:
+    """按行插入/删除/替换文件内容，只写入编辑位置的新内容"""
+    result = await file_service.edit_lines(
+        file_path=request.file_path,
+        op=request.op,
+        start_line=request.start_line,
+        end_line=request.end_line,
+        content=request.content,
+    )
+
+    return Response.success(msg="文件按行编辑成功", data=result)
+
+
 @router.post(
     path="/search-in-file",
     response_model=Response[FileSearchResult],
@@ -100,14 +210,56 @@ async def search_in_file(
         file_path=request.file_path,
         regex=request.regex,
         sudo=request.sudo,
+        timeout=request.timeout,
     )
 
+    # 超过时间预算时返回部分结果并在提示中说明
+    if result.timed_out:
+        return Response.success(
+            msg=f"文件内容搜索超时, 已扫描{result.scanned_lines}/{result.total_lines or '?'}行, "
+                f"返回部分结果{len(result.matches)}处匹配内容",
+            data=result,
+        )
     return Response.success(
         msg=f"文件内容搜索完成, 找到{len(result.matches)}处匹配内容",
         data=result,
     )
 
 
+@router.post(
+    path="/batch",
+    response_model=Response[FileBatchResult],
+)
+async def batch(
+        request: FileBatchRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileBatchResult]:
+    """在一次请求中并发执行多个读取/元数据/存在性检查操作"""
+    result = await file_service.batch(operations=request.operations)
+
+    return Response.success(
+        msg=f"批量操作完成, 成功{result.succeeded}个, 失败{result.failed}个",
+        data=result,
+    )
+
+
+@router.post(
+    path="/checksum",
+    response_model=Response[FileChecksumResult],
+)
+async def checksum(
+        request: FileChecksumRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileChecksumResult]:
+    """并发计算多个文件的内容哈希"""
+    result = await file_service.checksum(
+        file_paths=request.file_paths,
+        hash_algorithm=request.hash_algorithm,
+    )
+
+    return Response.success(msg="文件哈希计算完成", data=result)
+
+
 @router.post(
     path="/find-files",
     response_model=Response[FileFindResult],
@@ -120,6 +272,13 @@ async def find_files(
     result = await file_service.find_files(
         dir_path=request.dir_path,
         glob_pattern=request.glob_pattern,
+        max_depth=request.max_depth,
+        max_results=request.max_results,
+        use_default_ignores=request.use_default_ignores,
+        ignore_patterns=request.ignore_patterns,
+        respect_gitignore=request.respect_gitignore,
+        include_metadata=request.include_metadata,
+        cursor=request.cursor,
     )
 
     return Response.success(
@@ -128,6 +287,53 @@ async def find_files(
     )
 
 
+@router.post(path="/find-files-stream")
+async def find_files_stream(
+        request: FileFindRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> StreamingResponse:
+    """根据传递的文件夹+glob文件规则查找文件，并以NDJSON流的形式逐行返回"""
+    lines = file_service.stream_find_files(
+        dir_path=request.dir_path,
+        glob_pattern=request.glob_pattern,
+        max_depth=request.max_depth,
+        max_results=request.max_results,
+        use_default_ignores=request.use_default_ignores,
+        ignore_patterns=request.ignore_patterns,
+        respect_gitignore=request.respect_gitignore,
+        include_metadata=request.include_metadata,
+        cursor=request.cursor,
+    )
+
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.post(
+    path="/list-dir",
+    response_model=Response[FileListDirResult],
+)
+async def list_dir(
+        request: FileListDirRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileListDirResult]:
+    """根据传递的文件夹路径列出子条目(名字、类型、大小、修改时间、权限、软链接指向)"""
+    result = await file_service.list_dir(
+        dir_path=request.dir_path,
+        sort_by=request.sort_by,
+        reverse=request.reverse,
+        pattern=request.pattern,
+        types=request.types,
+        show_hidden=request.show_hidden,
+        offset=request.offset,
+        limit=request.limit,
+    )
+
+    return Response.success(
+        msg=f"列出文件夹完毕, 共{result.total}个条目",
+        data=result,
+    )
+
+
 @router.post(
     path="/upload-file",
     response_model=Response[FileUploadResult],
@@ -151,12 +357,547 @@ async def upload_file(
     )
 
 
-@router.get(path="/download-file")
+@router.api_route(
+    path="/upload-stream",
+    methods=["PUT", "POST"],
+    response_model=Response[FileUploadResult],
+)
+async def upload_stream(
+        request: Request,
+        file_path: str,
+        expected_hash: Optional[str] = None,
+        fsync: Literal["none", "data", "full"] = "none",
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileUploadResult]:
+    """将原始请求体流式写入沙箱文件(不经过multipart解析)，写入临时文件并校验哈希后原子替换"""
+    result = await file_service.upload_stream(
+        file_path=file_path,
+        chunks=request.stream(),
+        expected_hash=expected_hash,
+        fsync=fsync,
+    )
+
+    return Response.success(
+        msg="文件上传成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/upload-session/init",
+    response_model=Response[FileUploadSessionResult],
+)
+async def init_upload_session(
+        request: FileUploadSessionInitRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileUploadSessionResult]:
+    """创建分片上传会话，后续按偏移上传分片，支持乱序、并行与断点续传"""
+    result = await file_service.init_upload_session(
+        file_path=request.file_path,
+        total_size=request.total_size,
+        expected_hash=request.expected_hash,
+        fsync=request.fsync,
+    )
+
+    return Response.success(
+        msg="创建上传会话成功",
+        data=result,
+    )
+
+
+@router.api_route(
+    path="/upload-session/part",
+    methods=["PUT", "POST"],
+    response_model=Response[FileUploadPartResult],
+)
+async def upload_part(
+        request: Request,
+        session_id: str,
+        offset: int = Query(..., ge=0),
+        part_hash: Optional[str] = None,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileUploadPartResult]:
+    """将原始请求体作为分片写入上传会话的指定偏移"""
+    result = await file_service.upload_part(
+        session_id=session_id,
+        offset=offset,
+        chunks=request.stream(),
+        part_hash=part_hash,
+    )
+
+    return Response.success(
+        msg=f"分片上传成功, 已接收{result.received_bytes}字节",
+        data=result,
+    )
+
+
+@router.post(
+    path="/upload-session/status",
+    response_model=Response[FileUploadSessionResult],
+)
+async def get_upload_session(
+        request: FileUploadSessionRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileUploadSessionResult]:
+    """查询上传会话的进度与缺失区间"""
+    result = await file_service.get_upload_session(session_id=request.session_id)
+
+    return Response.success(
+        msg=f"查询上传会话成功, 还有{len(result.missing_ranges)}个缺失区间",
+        data=result,
+    )
+
+
+@router.post(
+    path="/upload-session/complete",
+    response_model=Response[FileUploadResult],
+)
+async def complete_upload_session(
+        request: FileUploadSessionRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileUploadResult]:
+    """校验并合并上传会话，原子替换目标文件"""
+    result = await file_service.complete_upload_session(session_id=request.session_id)
+
+    return Response.success(
+        msg="文件上传成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/upload-session/abort",
+    response_model=Response[FileUploadSessionResult],
+)
+async def abort_upload_session(
+        request: FileUploadSessionRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileUploadSessionResult]:
+    """取消上传会话并删除临时文件"""
+    result = await file_service.abort_upload_session(session_id=request.session_id)
+
+    return Response.success(
+        msg="已取消上传会话",
+        data=result,
+    )
+
+
+@router.api_route(
+    path="/import-archive",
+    methods=["PUT", "POST"],
+    response_model=Response[FileArchiveImportResult],
+)
+async def import_archive(
+        request: Request,
+        dir_path: str,
+        strip_components: int = Query(default=0, ge=0),
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileArchiveImportResult]:
+    """将请求体中的tar/tar.gz/tar.zst归档边接收边解压到指定文件夹"""
+    result = await file_service.import_archive(
+        dir_path=dir_path,
+        chunks=request.stream(),
+        strip_components=strip_components,
+    )
+
+    return Response.success(
+        msg=f"导入归档成功, 共解压{result.file_count}个文件",
+        data=result,
+    )
+
+
+@router.post(path="/export-archive")
+async def export_archive(
+        request: FileArchiveExportRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> StreamingResponse:
+    """将指定文件夹打包为归档并流式返回，支持include/exclude规则"""
+    chunks = file_service.export_archive(
+        dir_path=request.dir_path,
+        archive_format=request.format,
+        include=request.include,
+        exclude=request.exclude,
+        use_default_ignores=request.use_default_ignores,
+    )
+
+    filename = f"{os.path.basename(os.path.normpath(request.dir_path)) or 'archive'}.{request.format}"
+    return StreamingResponse(
+        chunks,
+        media_type=ARCHIVE_MEDIA_TYPES[request.format],
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"},
+    )
+
+
+@router.post(
+    path="/signature",
+    response_model=Response[FileSignatureResult],
+)
+async def file_signature(
+        request: FileSignatureRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileSignatureResult]:
+    """计算沙箱文件的块签名，客户端据此生成增量后通过apply-delta只上传修改过的部分"""
+    result = await file_service.file_signature(
+        file_path=request.file_path,
+        block_size=request.block_size,
+    )
+
+    return Response.success(
+        msg="计算文件签名成功",
+        data=result,
+    )
+
+
+@router.api_route(
+    path="/apply-delta",
+    methods=["PUT", "POST"],
+    response_model=Response[FileDeltaApplyResult],
+)
+async def apply_delta(
+        request: Request,
+        file_path: str,
+        expected_hash: Optional[str] = None,
+        fsync: Literal["none", "data", "full"] = "none",
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileDeltaApplyResult]:
+    """将请求体中的增量应用到沙箱文件，重建结果写入临时文件并校验后原子替换"""
+    result = await file_service.apply_file_delta(
+        file_path=file_path,
+        chunks=request.stream(),
+        expected_hash=expected_hash,
+        fsync=fsync,
+    )
+
+    return Response.success(
+        msg="应用增量成功",
+        data=result,
+    )
+
+
+@router.post(path="/delta")
+async def file_delta(
+        request: FileDeltaRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> StreamingResponse:
+    """根据客户端旧版本文件的块签名，流式返回把它更新为沙箱文件当前版本的增量"""
+    chunks = file_service.file_delta(
+        file_path=request.file_path,
+        signature=request.signature,
+    )
+
+    return StreamingResponse(chunks, media_type="application/octet-stream")
+
+
+@router.post(
+    path="/blobs/missing",
+    response_model=Response[FileBlobMissingResult],
+)
+async def missing_blobs(
+        request: FileBlobMissingRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileBlobMissingResult]:
+    """查询blob存储中缺失的内容哈希，客户端只上传缺失的blob"""
+    result = await file_service.missing_blobs(request.hashes)
+
+    return Response.success(
+        msg="查询缺失blob成功",
+        data=result,
+    )
+
+
+@router.api_route(
+    path="/blobs/upload",
+    methods=["PUT", "POST"],
+    response_model=Response[FileBlobUploadResult],
+)
+async def upload_blob(
+        request: Request,
+        content_hash: str,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileBlobUploadResult]:
+    """将原始请求体保存为blob，内容哈希必须与content_hash一致"""
+    result = await file_service.upload_blob(
+        content_hash=content_hash,
+        chunks=request.stream(),
+    )
+
+    return Response.success(
+        msg="上传blob成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/blobs/materialize",
+    response_model=Response[FileBlobMaterializeResult],
+)
+async def materialize_blobs(
+        request: FileBlobMaterializeRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileBlobMaterializeResult]:
+    """将blob以复制或reflink克隆的方式物化到目标路径，已存在的文件会被原子替换"""
+    result = await file_service.materialize_blobs(
+        items=request.items,
+        mode=request.mode,
+    )
+
+    return Response.success(
+        msg="物化blob完成",
+        data=result,
+    )
+
+
+@router.post(
+    path="/copy",
+    response_model=Response[FileOperationResult],
+)
+async def copy_path(
+        request: FileCopyRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileOperationResult]:
+    """复制文件或文件夹，数据在内核中复制，文件夹由多个工作线程并行处理"""
+    result = await file_service.copy_path(
+        src_path=request.src_path,
+        dst_path=request.dst_path,
+        overwrite=request.overwrite,
+        preserve_metadata=request.preserve_metadata,
+        wait=request.wait,
+    )
+
+    return Response.success(
+        msg="复制完成" if request.wait else "复制已开始",
+        data=result,
+    )
+
+
+@router.post(
+    path="/move",
+    response_model=Response[FileOperationResult],
+)
+async def move_path(
+        request: FileMoveRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileOperationResult]:
+    """移动文件或文件夹，跨文件系统时先复制再删除"""
+    result = await file_service.move_path(
+        src_path=request.src_path,
+        dst_path=request.dst_path,
+        overwrite=request.overwrite,
+        wait=request.wait,
+    )
+
+    return Response.success(
+        msg="移动完成" if request.wait else "移动已开始",
+        data=result,
+    )
+
+
+@router.post(
+    path="/mkdir",
+    response_model=Response[FileMkdirResult],
+)
+async def make_dir(
+        request: FileMkdirRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileMkdirResult]:
+    """创建文件夹"""
+    result = await file_service.make_dir(
+        dir_path=request.dir_path,
+        parents=request.parents,
+        exist_ok=request.exist_ok,
+    )
+
+    return Response.success(
+        msg="创建文件夹成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/rmtree",
+    response_model=Response[FileOperationResult],
+)
+async def remove_dir(
+        request: FileRmtreeRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileOperationResult]:
+    """递归删除文件夹，文件由多个工作线程并行删除"""
+    result = await file_service.remove_dir(
+        dir_path=request.dir_path,
+        wait=request.wait,
+    )
+
+    return Response.success(
+        msg="删除完成" if request.wait else "删除已开始",
+        data=result,
+    )
+
+
+@router.post(
+    path="/operation/status",
+    response_model=Response[FileOperationResult],
+)
+async def get_operation(
+        request: FileOperationRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileOperationResult]:
+    """查询复制/移动/删除操作的进度"""
+    result = await file_service.get_operation(request.operation_id)
+
+    return Response.success(
+        msg="查询操作进度成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/operation/cancel",
+    response_model=Response[FileOperationResult],
+)
+async def cancel_operation(
+        request: FileOperationRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileOperationResult]:
+    """取消进行中的复制/移动/删除操作，已完成的条目不会回滚"""
+    result = await file_service.cancel_operation(request.operation_id)
+
+    return Response.success(
+        msg="已请求取消操作",
+        data=result,
+    )
+
+
+@router.post(
+    path="/snapshot/create",
+    response_model=Response[FileSnapshotInfo],
+)
+async def create_snapshot(
+        request: FileSnapshotCreateRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileSnapshotInfo]:
+    """为文件夹创建增量快照，未变化的文件与上一个快照共享"""
+    result = await file_service.create_snapshot(
+        dir_path=request.dir_path,
+        label=request.label,
+        exclude=request.exclude,
+    )
+
+    return Response.success(
+        msg="创建快照成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/snapshot/list",
+    response_model=Response[FileSnapshotListResult],
+)
+async def list_snapshots(
+        request: FileSnapshotListRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileSnapshotListResult]:
+    """列出文件夹的全部快照及其大小"""
+    result = await file_service.list_snapshots(request.dir_path)
+
+    return Response.success(
+        msg="获取快照列表成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/snapshot/restore",
+    response_model=Response[FileSnapshotRestoreResult],
+)
+async def restore_snapshot(
+        request: FileSnapshotRestoreRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileSnapshotRestoreResult]:
+    """将文件夹恢复为快照时的状态，只处理有差异的条目"""
+    result = await file_service.restore_snapshot(
+        dir_path=request.dir_path,
+        snapshot_id=request.snapshot_id,
+        delete_extra=request.delete_extra,
+    )
+
+    return Response.success(
+        msg="恢复快照成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/snapshot/delete",
+    response_model=Response[FileSnapshotInfo],
+)
+async def delete_snapshot(
+        request: FileSnapshotDeleteRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileSnapshotInfo]:
+    """删除快照"""
+    result = await file_service.delete_snapshot(
+        dir_path=request.dir_path,
+        snapshot_id=request.snapshot_id,
+    )
+
+    return Response.success(
+        msg="删除快照成功",
+        data=result,
+    )
+
+
+@router.post(
+    path="/disk-usage",
+    response_model=Response[FileDiskUsageResult],
+)
+async def disk_usage(
+        request: FileDiskUsageRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileDiskUsageResult]:
+    """并行统计文件夹的占用空间，返回各子条目的大小与最大的文件，重复统计只扫描有变化的目录"""
+    result = await file_service.disk_usage(
+        dir_path=request.dir_path,
+        refresh=request.refresh,
+        top=request.top,
+        max_children=request.max_children,
+    )
+
+    return Response.success(
+        msg="统计占用空间成功",
+        data=result,
+    )
+
+
+@router.get(path="/follow")
+async def follow_file(
+        file_path: str,
+        offset: Optional[int] = Query(default=None, ge=0, description="可选，起始字节偏移，优先于lines"),
+        lines: int = Query(default=10, ge=0, le=10000, description="可选，从最后多少行开始跟踪"),
+        last_event_id: Optional[str] = Header(default=None),
+        file_service: FileService = Depends(get_file_service),
+) -> StreamingResponse:
+    """跟踪持续增长的文件(类似tail -F)，以SSE流推送新增内容，支持EventSource断线后按Last-Event-ID续传"""
+    # 1.EventSource重连时携带上一条消息的id(读取位置)，从该位置继续
+    if offset is None and last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    # 2.返回SSE流
+    # http://127.0.0.1:6001/api/file/follow?file_path=/tmp/app.log&lines=100
+    events = file_service.follow_file(file_path=file_path, offset=offset, lines=lines)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.api_route(path="/download-file", methods=["GET", "HEAD"])
 async def download_file(
         file_path: str,
+        compress: bool = True,
         file_service: FileService = Depends(get_file_service),
-) -> FileResponse:
-    """根据传递的filepath下载指定的文件"""
+) -> FileDownloadResponse:
+    """根据传递的filepath下载指定的文件，支持Range断点续传、多段Range、条件请求与gzip/zstd压缩"""
     # 1.确保下当前文件存在
     await file_service.ensure_file(file_path)
 
@@ -165,10 +906,11 @@ async def download_file(
 
     # 3.返回文件下载响应
     # http://127.0.0.1:6001/api/file/download-file?file_path=./files/wuye.md
-    return FileResponse(
-        path=file_path,
+    return FileDownloadResponse(
+        file_path=file_path,
         filename=filename,
         media_type="application/octet-stream",  # 流式下载
+        compress=compress,
     )
 
 
@@ -200,9 +942,75 @@ async def delete_file(
     """根据传递的文件路径删除指定的文件"""
     result = await file_service.delete_file(
         file_path=request.file_path,
+        sudo=request.sudo,
     )
 
     return Response.success(
         msg="删除文件成功",
         data=result,
     )
+
+
+@router.post(
+    path="/watch-dir",
+    response_model=Response[FileWatchResult],
+)
+async def watch_dir(
+        request: FileWatchRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileWatchResult]:
+    """监听指定目录，后续的查找与存在性检查直接使用内存索引"""
+    result = await file_service.watch_dir(dir_path=request.dir_path)
+
+    return Response.success(
+        msg=f"目录监听成功, 已索引{result.dir_count}个文件夹、{result.file_count}个文件",
+        data=result,
+    )
+
+
+@router.post(
+    path="/unwatch-dir",
+    response_model=Response[FileWatchResult],
+)
+async def unwatch_dir(
+        request: FileWatchRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileWatchResult]:
+    """取消监听指定目录"""
+    result = await file_service.unwatch_dir(dir_path=request.dir_path)
+
+    return Response.success(msg="已取消目录监听", data=result)
+
+
+@router.post(
+    path="/changes",
+    response_model=Response[FileChangesResult],
+)
+async def get_changes(
+        request: FileChangesRequest,
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileChangesResult]:
+    """根据传递的目录+游标获取游标之后新建、修改、删除的文件"""
+    result = await file_service.get_changes(
+        dir_path=request.dir_path,
+        cursor=request.cursor,
+        limit=request.limit,
+    )
+
+    return Response.success(
+        msg="需要全量同步" if result.reset else f"获取变更成功, 共{len(result.changes)}处变更",
+        data=result,
+    )
+
+
+@router.get(
+    path="/cache-stats",
+    response_model=Response[FileCacheStatsResult],
+)
+async def get_cache_stats(
+        file_service: FileService = Depends(get_file_service),
+) -> Response[FileCacheStatsResult]:
+    """获取文件内容缓存的命中率等统计信息"""
+    result = await file_service.get_cache_stats()
+
+    return Response.success(msg=f"获取缓存统计成功, 命中率{result.hit_rate:.2%}", data=result)
@@ -46,3 +46,10 @@ class BadRequestException(AppException):
 
     def __init__(self, msg: str = '客户端请求错误，请检查后重试.') -> None:
         super().__init__(msg=msg, status_code=status.HTTP_400_BAD_REQUEST)
+
+
+class ConflictException(AppException):
+    """ 资源冲突异常类(例如文件已被其他请求修改)，继承自 AppException """
+
+    def __init__(self, msg: str = '资源已被修改，请刷新后重试.') -> None:
+        super().__init__(msg=msg, status_code=status.HTTP_409_CONFLICT)
@@ -6,7 +6,7 @@
 @File   : file.py
 @Desc   : file 结构体定义
 """
-from typing import Optional
+from typing import Optional, List, Literal
 
 from pydantic import BaseModel, Field
 
@@ -18,6 +18,19 @@ class FileReadRequest(BaseModel):
     end_line: Optional[int] = Field(default=None, description="可选，结束行号，返回内容不包含该行")
     sudo: bool = Field(default=False, description="是否使用 sudo 权限读取文件")
     max_length: int = Field(default=10000, description="可选，最大返回长度，默认 10000 字符")
+    if_none_match: Optional[str] = Field(default=None, description="可选，已持有内容的哈希，未变化时不返回内容")
+    hash_algorithm: Literal["blake2b", "sha256"] = Field(default="blake2b", description="可选，内容哈希算法")
+
+
+class FileReadBytesRequest(BaseModel):
+    """按字节范围读取文件请求"""
+    file_path: str = Field(..., description="文件绝对路径")
+    offset: int = Field(default=0, description="可选，起始字节偏移，负数表示从文件末尾倒数")
+    length: int = Field(default=64 * 1024, ge=0, le=16 * 1024 * 1024, description="可选，最多读取的字节数，默认 64KB")
+    encoding: str = Field(
+        default="base64",
+        description="可选，返回内容的编码: base64(原始字节)/auto(自动检测，二进制文件返回base64)/指定文本编码(例如gbk)",
+    )
 
 
 class FileWriteRequest(BaseModel):
@@ -28,6 +41,17 @@ class FileWriteRequest(BaseModel):
     leading_newline: bool = Field(default=False, description="可选，是否在写入内容前，添加换行符")
     trailing_newline: bool = Field(default=False, description="可选，是否在写入内容结尾，添加换行符")
     sudo: bool = Field(default=False, description="可选，是否使用 sudo 权限写入文件")
+    atomic: bool = Field(default=True, description="可选，覆盖写入时是否先写临时文件再原子替换，默认开启")
+    fsync: Literal["none", "data", "full"] = Field(
+        default="none",
+        description="可选，落盘策略: none(交给操作系统)/data(同步数据)/full(同步数据、元数据与目录项)",
+    )
+    preserve_mode: bool = Field(default=True, description="可选，原子替换时是否保留原文件的权限")
+    preserve_owner: bool = Field(default=True, description="可选，原子替换时是否保留原文件的属主")
+    expected_hash: Optional[str] = Field(
+        default=None,
+        description="可选，文件当前内容的哈希(读取/写入接口返回的content_hash)，不一致时拒绝写入",
+    )
 
 
 class FileReplaceRequest(BaseModel):
@@ -36,6 +60,8 @@ class FileReplaceRequest(BaseModel):
     old_str: str = Field(..., description="要替换的原始字符串")
     new_str: str = Field(..., description="要替换的新字符串")
     sudo: Optional[bool] = Field(default=False, description="(可选)是否使用sudo权限")
+    regex: bool = Field(default=False, description="(可选)是否将old_str作为正则表达式，new_str中可以使用\\1等分组引用")
+    max_replacements: Optional[int] = Field(default=None, gt=0, description="(可选)最多替换的次数，默认全部替换")
 
 
 class FileSearchRequest(BaseModel):
@@ -43,12 +69,23 @@ class FileSearchRequest(BaseModel):
     file_path: str = Field(..., description="要查找内容的文件绝对路径")
     regex: str = Field(..., description="搜索正则表达式")
     sudo: Optional[bool] = Field(default=False, description="(可选)是否使用sudo权限")
+    timeout: Optional[float] = Field(
+        default=None, gt=0, le=300,
+        description="(可选)时间预算，单位为秒，超时后返回已扫描部分的匹配结果，默认使用系统配置",
+    )
 
 
 class FileFindRequest(BaseModel):
     """文件查找请求结构体"""
     dir_path: str = Field(..., description="搜索的目录绝对路径")
     glob_pattern: str = Field(..., description="文件名模式(glob语法)")
+    max_depth: Optional[int] = Field(default=None, ge=0, description="(可选)最大遍历深度, 相对dir_path计算")
+    max_results: Optional[int] = Field(default=None, gt=0, description="(可选)单次最多返回的条目数, 超出时返回下一页游标")
+    use_default_ignores: bool = Field(default=True, description="(可选)是否跳过.git、node_modules等默认忽略目录")
+    ignore_patterns: List[str] = Field(default_factory=list, description="(可选)额外的忽略规则(gitignore语法)")
+    respect_gitignore: bool = Field(default=True, description="(可选)是否遵循遍历过程中遇到的.gitignore文件")
+    include_metadata: bool = Field(default=False, description="(可选)是否返回文件类型、大小、修改时间等元数据")
+    cursor: Optional[str] = Field(default=None, description="(可选)分页游标, 取自上一页结果的next_cursor")
 
 
 class FileCheckRequest(BaseModel):
@@ -59,3 +96,223 @@ class FileCheckRequest(BaseModel):
 class FileDeleteRequest(BaseModel):
     """删除文件请求结构体"""
     file_path: str = Field(..., description="要删除的文件绝对路径")
+    sudo: bool = Field(default=False, description="(可选)是否使用sudo权限")
+
+
+class FileWatchRequest(BaseModel):
+    """目录监听/取消监听请求结构体"""
+    dir_path: str = Field(..., description="要监听的目录绝对路径")
+
+
+class FileChangesRequest(BaseModel):
+    """目录变更查询请求结构体"""
+    dir_path: str = Field(..., description="要查询变更的目录绝对路径, 未监听时会自动开始监听")
+    cursor: Optional[str] = Field(default=None, description="(可选)上一次查询返回的游标, 为空时返回全量条目")
+    limit: int = Field(default=1000, gt=0, description="(可选)单次最多读取的变更记录数")
+
+
+class FileListDirRequest(BaseModel):
+    """列出文件夹内容请求结构体"""
+    dir_path: str = Field(..., description="要列出的文件夹绝对路径")
+    sort_by: Literal["name", "size", "mtime", "type"] = Field(default="name", description="(可选)排序字段")
+    reverse: bool = Field(default=False, description="(可选)是否倒序排列")
+    pattern: Optional[str] = Field(default=None, description="(可选)按名字过滤的通配规则, 例如*.py")
+    types: Optional[List[Literal["file", "dir", "symlink", "other"]]] = Field(
+        default=None,
+        description="(可选)只返回指定类型的条目",
+    )
+    show_hidden: bool = Field(default=False, description="(可选)是否包含以.开头的隐藏条目")
+    offset: int = Field(default=0, ge=0, description="(可选)分页偏移量")
+    limit: Optional[int] = Field(default=None, gt=0, description="(可选)单页最多返回的条目数")
+
+
+class FileBatchOperation(BaseModel):
+    """批量文件操作中的单个操作"""
+    op: Literal["read", "stat", "exists"] = Field(..., description="操作类型")
+    file_path: str = Field(..., description="要操作的文件绝对路径")
+    start_line: int = Field(default=0, description="(可选)read操作读取的起始行，索引从 0 开始")
+    end_line: Optional[int] = Field(default=None, description="(可选)read操作的结束行号，返回内容不包含该行")
+    max_length: Optional[int] = Field(default=10000, description="(可选)read操作的最大返回长度，默认 10000 字符")
+    sudo: bool = Field(default=False, description="(可选)read操作是否使用 sudo 权限")
+    if_none_match: Optional[str] = Field(default=None, description="(可选)read操作已持有内容的哈希，未变化时不返回内容")
+
+
+class FileBatchRequest(BaseModel):
+    """批量文件操作请求结构体"""
+    operations: List[FileBatchOperation] = Field(..., min_length=1, max_length=1000, description="操作列表")
+
+
+class FileChecksumRequest(BaseModel):
+    """批量计算文件哈希请求结构体"""
+    file_paths: List[str] = Field(..., min_length=1, max_length=1000, description="要计算哈希的文件绝对路径列表")
+    hash_algorithm: Literal["blake2b", "sha256"] = Field(default="blake2b", description="(可选)哈希算法")
+
+
+class FileEdit(BaseModel):
+    """多处编辑中的单个编辑(字面量替换或行范围替换二选一)"""
+    old_str: Optional[str] = Field(default=None, min_length=1, description="(可选)要替换的原始字符串，按字面量匹配")
+    new_str: str = Field(default="", description="替换后的新内容，行范围编辑时不以换行结尾会自动补充换行")
+    start_line: Optional[int] = Field(default=None, ge=0, description="(可选)行范围编辑的起始行，索引从 0 开始")
+    end_line: Optional[int] = Field(default=None, ge=0, description="(可选)行范围编辑的结束行号，不包含该行，等于起始行表示插入")
+    expected_count: Optional[int] = Field(default=None, ge=1, description="(可选)字面量编辑预期的替换次数，不一致时整体失败")
+
+
+class FileMultiEditRequest(BaseModel):
+    """同一文件多处编辑请求结构体"""
+    file_path: str = Field(..., description="要编辑的文件绝对路径")
+    edits: List[FileEdit] = Field(..., min_length=1, max_length=1000, description="按顺序排列的编辑列表，均相对原文件内容")
+    sudo: Optional[bool] = Field(default=False, description="(可选)是否使用sudo权限")
+
+
+class FileApplyPatchRequest(BaseModel):
+    """应用unified diff补丁请求结构体"""
+    patch: str = Field(..., min_length=1, description="unified diff格式的补丁内容，可以包含多个文件")
+    base_dir: Optional[str] = Field(default=None, description="(可选)补丁中相对路径的基准目录，补丁使用绝对路径时可以不传")
+    strip: int = Field(default=1, ge=0, description="(可选)去掉补丁路径开头的层级数，与patch -p一致，git diff默认为1")
+    max_fuzz: int = Field(default=2, ge=0, le=3, description="(可选)上下文不匹配时最多忽略的首尾上下文行数")
+    max_offset: int = Field(default=1000, ge=0, le=100000, description="(可选)hunk实际位置与补丁行号最多相差的行数")
+    allow_partial: bool = Field(default=False, description="(可选)部分hunk失败时是否仍然写入其他成功的hunk")
+    dry_run: bool = Field(default=False, description="(可选)只检查补丁能否应用，不修改任何文件")
+
+
+class FileLineEditRequest(BaseModel):
+    """按行编辑文件请求结构体"""
+    file_path: str = Field(..., description="要编辑的文件绝对路径")
+    op: Literal["insert_at", "delete_range", "replace_range"] = Field(..., description="编辑类型: 插入/删除行/替换行")
+    start_line: int = Field(..., ge=0, description="起始行，索引从 0 开始，insert_at表示在该行之前插入(等于总行数时追加到末尾)")
+    end_line: Optional[int] = Field(default=None, ge=0, description="(可选)删除/替换的结束行号，不包含该行，默认只处理起始行")
+    content: str = Field(default="", description="(可选)插入/替换的新内容，不以换行结尾时自动补充换行")
+
+
+class FileUploadSessionInitRequest(BaseModel):
+    """创建分片上传会话请求结构体"""
+    file_path: str = Field(..., description="上传的目标文件绝对路径")
+    total_size: int = Field(..., ge=0, description="文件总大小, 单位为字节")
+    expected_hash: Optional[str] = Field(
+        default=None,
+        description="(可选)完整文件内容的哈希(算法:十六进制摘要)，合并时校验，不一致时需要重新上传",
+    )
+    fsync: Literal["none", "data", "full"] = Field(
+        default="none",
+        description="(可选)合并时的落盘策略: none(交给操作系统)/data(同步数据)/full(同步数据、元数据与目录项)",
+    )
+
+
+class FileUploadSessionRequest(BaseModel):
+    """分片上传会话操作(查询/合并/取消)请求结构体"""
+    session_id: str = Field(..., description="上传会话id")
+
+
+class FileArchiveExportRequest(BaseModel):
+    """导出归档请求结构体"""
+    dir_path: str = Field(..., description="要导出的文件夹绝对路径")
+    format: Literal["tar", "tar.gz", "tar.zst"] = Field(default="tar.gz", description="(可选)归档格式")
+    include: List[str] = Field(default_factory=list, description="(可选)只打包匹配的条目(glob语法, 相对dir_path)，默认全部")
+    exclude: List[str] = Field(default_factory=list, description="(可选)排除的条目(gitignore语法)")
+    use_default_ignores: bool = Field(default=False, description="(可选)是否跳过.git、node_modules等默认忽略目录")
+
+
+class FileSignatureRequest(BaseModel):
+    """计算文件块签名请求结构体"""
+    file_path: str = Field(..., description="要计算签名的文件绝对路径")
+    block_size: Optional[int] = Field(
+        default=None,
+        ge=1024,
+        le=128 * 1024,
+        description="(可选)块大小, 单位为字节，默认根据文件大小自动选择",
+    )
+
+
+class FileDeltaRequest(BaseModel):
+    """生成增量请求结构体"""
+    file_path: str = Field(..., description="作为新版本的沙箱文件绝对路径")
+    signature: str = Field(..., min_length=1, description="客户端旧版本文件的块签名(base64)，格式与签名接口返回的一致")
+
+
+class FileBlobMissingRequest(BaseModel):
+    """查询缺失blob请求结构体"""
+    hashes: List[str] = Field(..., min_length=1, max_length=10000, description="内容哈希列表(算法:十六进制摘要)")
+
+
+class FileBlobMaterializeItem(BaseModel):
+    """物化blob中的单个条目"""
+    content_hash: str = Field(..., description="blob的内容哈希(算法:十六进制摘要)")
+    file_path: str = Field(..., description="物化的目标文件绝对路径，已存在时原子替换")
+
+
+class FileBlobMaterializeRequest(BaseModel):
+    """物化blob请求结构体"""
+    items: List[FileBlobMaterializeItem] = Field(..., min_length=1, max_length=1000, description="要物化的条目列表")
+    mode: Literal["copy", "reflink"] = Field(
+        default="copy",
+        description="(可选)物化方式: copy(复制，支持reflink的文件系统上共享数据块)/"
+                    "reflink(克隆，与blob共享数据块而不复制数据，文件系统不支持或跨文件系统时退化为copy)",
+    )
+
+
+class FileCopyRequest(BaseModel):
+    """复制文件或文件夹请求结构体"""
+    src_path: str = Field(..., description="源文件或文件夹绝对路径")
+    dst_path: str = Field(..., description="目标绝对路径(复制后的完整路径，而不是所在的文件夹)")
+    overwrite: bool = Field(default=False, description="(可选)目标已存在时是否替换文件/合并文件夹")
+    preserve_metadata: bool = Field(default=True, description="(可选)是否保留权限、属主、修改时间与扩展属性")
+    wait: bool = Field(default=True, description="(可选)是否等待完成，为false时立即返回操作id用于查询进度")
+
+
+class FileMoveRequest(BaseModel):
+    """移动文件或文件夹请求结构体"""
+    src_path: str = Field(..., description="源文件或文件夹绝对路径")
+    dst_path: str = Field(..., description="目标绝对路径(移动后的完整路径，而不是所在的文件夹)")
+    overwrite: bool = Field(default=False, description="(可选)目标已存在时是否替换")
+    wait: bool = Field(default=True, description="(可选)是否等待完成，为false时立即返回操作id用于查询进度")
+
+
+class FileMkdirRequest(BaseModel):
+    """创建文件夹请求结构体"""
+    dir_path: str = Field(..., description="要创建的文件夹绝对路径")
+    parents: bool = Field(default=True, description="(可选)是否同时创建不存在的父文件夹")
+    exist_ok: bool = Field(default=True, description="(可选)文件夹已存在时是否视为成功")
+
+
+class FileRmtreeRequest(BaseModel):
+    """递归删除文件夹请求结构体"""
+    dir_path: str = Field(..., description="要删除的文件夹绝对路径")
+    wait: bool = Field(default=True, description="(可选)是否等待完成，为false时立即返回操作id用于查询进度")
+
+
+class FileOperationRequest(BaseModel):
+    """查询/取消复制、移动、删除操作请求结构体"""
+    operation_id: str = Field(..., description="操作id")
+
+
+class FileSnapshotCreateRequest(BaseModel):
+    """创建目录快照请求结构体"""
+    dir_path: str = Field(..., description="要创建快照的文件夹绝对路径")
+    label: Optional[str] = Field(default=None, max_length=200, description="(可选)快照的说明")
+    exclude: List[str] = Field(default_factory=list, description="(可选)排除的条目(gitignore语法)，恢复时保持不变")
+
+
+class FileSnapshotListRequest(BaseModel):
+    """列出目录快照请求结构体"""
+    dir_path: str = Field(..., description="文件夹绝对路径")
+
+
+class FileSnapshotRestoreRequest(BaseModel):
+    """恢复目录快照请求结构体"""
+    dir_path: str = Field(..., description="要恢复的文件夹绝对路径")
+    snapshot_id: str = Field(..., description="快照id")
+    delete_extra: bool = Field(default=True, description="(可选)是否删除快照之后新增的文件与文件夹")
+
+
+class FileSnapshotDeleteRequest(BaseModel):
+    """删除目录快照请求结构体"""
+    dir_path: str = Field(..., description="文件夹绝对路径")
+    snapshot_id: str = Field(..., description="快照id")
+
+
+class FileDiskUsageRequest(BaseModel):
+    """统计文件夹占用空间请求结构体"""
+    dir_path: str = Field(..., description="要统计的文件夹绝对路径")
+    refresh: bool = Field(default=False, description="(可选)是否忽略缓存重新扫描全部目录")
+    top: int = Field(default=20, ge=0, le=50, description="(可选)返回整个目录树中最大的文件数量")
+    max_children: int = Field(default=100, ge=0, le=1000, description="(可选)最多返回的直接子条目数量(按大小降序)")
@@ -17,6 +17,7 @@ from app.core.middleware import auto_extend_timeout_middleware
 from app.core.system_config import get_settings
 from app.interface.endpoints.routes import router
 from app.interface.errors.exception_handles import register_exception_handlers
+from app.interface.service_dependencies import get_file_service
 
 # 1. 获取配置实例(一定要基于 fastapi 项目运行，否则路径解析会出问题，例如找不到 core 模块)
 settings = get_settings()
@@ -40,6 +41,13 @@ async def lifespan(app: FastAPI):
     finally:
         # 关闭时释放资源
         logger.info("Neon Sandbox 正在关闭...")
+        get_file_service().file_index.close()
+        get_file_service().upload_sessions.close()
+        get_file_service().file_operations.cancel_all()
+        get_file_service().shutdown_executors()
+        get_file_service().follow_watcher.close()
+        get_file_service().regex_pool.close()
+        await get_file_service().sudo_helper.close()
 
 
 # 3. 定义 FastAPI 路由 tags 标签
@@ -14,12 +14,28 @@ class FileReadResult(BaseModel):
     """ 文件读取结果 """
     file_path: str = Field(..., description="文件路径")
     content: str = Field(..., description="文件内容")
+    content_hash: Optional[str] = Field(default=None, description="完整文件内容的哈希, 格式为 算法:十六进制摘要")
+    not_modified: bool = Field(default=False, description="内容哈希与if_none_match一致, 此时content为空")
+
+
+class FileReadBytesResult(BaseModel):
+    """按字节范围读取文件结果"""
+    file_path: str = Field(..., description="文件路径")
+    offset: int = Field(..., description="实际读取的起始字节偏移")
+    length: int = Field(..., description="content对应的字节数, offset + length为下一次读取的起始位置")
+    file_size: int = Field(..., description="文件总大小, 单位为字节")
+    eof: bool = Field(default=False, description="是否已读取到文件末尾")
+    encoding: str = Field(..., description="content的编码: base64或者解码使用的文本编码")
+    is_binary: bool = Field(default=False, description="根据文件开头的样本判断是否为二进制文件")
+    format: Optional[str] = Field(default=None, description="根据文件头识别出的格式, 例如elf/parquet/png/zip")
+    content: str = Field(..., description="读取的内容")
 
 
 class FileWriteResult(BaseModel):
     """文件写入结果"""
     file_path: str = Field(..., description="要写入的文件绝对路径")
     bytes_written: Optional[int] = Field(default=None, description="写入文件内容的字节数")
+    content_hash: Optional[str] = Field(default=None, description="覆盖写入后文件内容的哈希，可用于下一次写入的expected_hash")
 
 
 class FileReplaceResult(BaseModel):
@@ -33,12 +49,26 @@ class FileSearchResult(BaseModel):
     file_path: str = Field(..., description="要搜索内容的文件绝对路径")
     matches: List[str] = Field(default_factory=list, description="匹配内容列表")
     line_numbers: List[int] = Field(default_factory=list, description="匹配的行号列表")
+    timed_out: bool = Field(default=False, description="是否超过时间预算, 为True时只包含已扫描部分的匹配结果")
+    scanned_lines: int = Field(default=0, description="已扫描的行数")
+    total_lines: Optional[int] = Field(default=None, description="文件总行数, 未开始扫描就超时时为空")
+
+
+class FileEntry(BaseModel):
+    """文件条目信息"""
+    path: str = Field(..., description="文件绝对路径")
+    type: str = Field(..., description="条目类型: file/dir/symlink/other")
+    size: Optional[int] = Field(default=None, description="文件大小, 单位为字节")
+    mtime: Optional[float] = Field(default=None, description="最后修改时间戳")
 
 
 class FileFindResult(BaseModel):
     """文件查找结果"""
     dir_path: str = Field(..., description="搜索的目录绝对路径")
     files: List[str] = Field(default_factory=list, description="检索到的文件列表")
+    entries: Optional[List[FileEntry]] = Field(default=None, description="检索到的文件元数据列表, 仅在请求元数据时返回")
+    truncated: bool = Field(default=False, description="结果是否因为达到max_results而被截断")
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标, 为空表示没有更多结果")
 
 
 class FileUploadResult(BaseModel):
@@ -46,6 +76,7 @@ class FileUploadResult(BaseModel):
     file_path: str = Field(..., description="上传文件的绝对路径")
     file_size: int = Field(default=0, description="上传文件的大小, 单位为字节")
     success: bool = Field(..., description="是否上传成功")
+    content_hash: Optional[str] = Field(default=None, description="上传内容的哈希(流式上传时返回), 格式为 算法:十六进制摘要")
 
 
 class FileCheckResult(BaseModel):
@@ -58,3 +89,316 @@ class FileDeleteResult(BaseModel):
     """文件删除结果模型"""
     file_path: str = Field(..., description="需要删除文件的绝对路径")
     deleted: bool = Field(..., description="文件是否删除成功")
+
+
+class FileWatchResult(BaseModel):
+    """目录监听结果"""
+    dir_path: str = Field(..., description="监听的目录绝对路径")
+    watching: bool = Field(..., description="当前是否处于监听状态")
+    dir_count: int = Field(default=0, description="索引中的文件夹数量")
+    file_count: int = Field(default=0, description="索引中的文件数量")
+    degraded: bool = Field(default=False, description="是否存在无法使用inotify、退化为mtime校验的文件夹")
+
+
+class FileChange(BaseModel):
+    """单个文件变更"""
+    path: str = Field(..., description="发生变更的文件绝对路径")
+    change: str = Field(..., description="变更类型: created/modified/deleted")
+    is_dir: bool = Field(default=False, description="是否为文件夹, 文件夹被删除时其子条目一并视为删除")
+    size: Optional[int] = Field(default=None, description="变更后的文件大小, 删除时为空")
+    mtime: Optional[float] = Field(default=None, description="变更后的修改时间戳, 删除时为空")
+
+
+class FileChangesResult(BaseModel):
+    """目录变更查询结果"""
+    dir_path: str = Field(..., description="查询的目录绝对路径")
+    cursor: str = Field(..., description="新的游标, 下次查询时传入")
+    reset: bool = Field(default=False, description="是否需要全量同步, 为True时files为目录下的完整条目列表")
+    has_more: bool = Field(default=False, description="是否还有更多变更未返回")
+    changes: List[FileChange] = Field(default_factory=list, description="游标之后的变更列表(同一路径已合并)")
+    files: Optional[List[FileEntry]] = Field(default=None, description="全量同步时目录下的完整条目列表")
+
+
+class FileListDirResult(BaseModel):
+    """文件夹列表结果(列式结构, 同一下标对应同一个条目)"""
+    dir_path: str = Field(..., description="列出的文件夹绝对路径")
+    total: int = Field(default=0, description="过滤后的条目总数")
+    offset: int = Field(default=0, description="本页第一个条目在过滤结果中的下标")
+    names: List[str] = Field(default_factory=list, description="条目名字列表")
+    types: List[str] = Field(default_factory=list, description="条目类型列表: file/dir/symlink/other")
+    sizes: List[Optional[int]] = Field(default_factory=list, description="条目大小列表, 单位为字节")
+    mtimes: List[Optional[float]] = Field(default_factory=list, description="条目修改时间戳列表")
+    modes: List[Optional[str]] = Field(default_factory=list, description="条目权限列表, 格式同ls -l, 例如-rw-r--r--")
+    link_targets: List[Optional[str]] = Field(default_factory=list, description="软链接指向的路径列表, 非软链接为空")
+
+
+class FileBatchItemResult(BaseModel):
+    """批量操作中单个操作的结果"""
+    op: str = Field(..., description="操作类型: read/stat/exists")
+    file_path: str = Field(..., description="操作的文件绝对路径")
+    success: bool = Field(..., description="该操作是否成功")
+    error: Optional[str] = Field(default=None, description="失败原因")
+    content: Optional[str] = Field(default=None, description="read操作读取到的文件内容")
+    content_hash: Optional[str] = Field(default=None, description="read操作得到的完整文件内容哈希")
+    not_modified: bool = Field(default=False, description="read操作的内容哈希与if_none_match一致, 此时不返回内容")
+    exists: Optional[bool] = Field(default=None, description="exists操作的结果")
+    entry: Optional[FileEntry] = Field(default=None, description="stat操作得到的文件元数据")
+
+
+class FileBatchResult(BaseModel):
+    """批量文件操作结果"""
+    results: List[FileBatchItemResult] = Field(default_factory=list, description="与请求顺序一致的操作结果列表")
+    succeeded: int = Field(default=0, description="成功的操作数")
+    failed: int = Field(default=0, description="失败的操作数")
+
+
+class FileChecksumItem(BaseModel):
+    """单个文件的哈希结果"""
+    file_path: str = Field(..., description="文件绝对路径")
+    content_hash: Optional[str] = Field(default=None, description="文件内容哈希, 格式为 算法:十六进制摘要")
+    size: Optional[int] = Field(default=None, description="文件大小, 单位为字节")
+    error: Optional[str] = Field(default=None, description="计算失败的原因")
+
+
+class FileChecksumResult(BaseModel):
+    """批量文件哈希结果"""
+    hash_algorithm: str = Field(..., description="使用的哈希算法")
+    items: List[FileChecksumItem] = Field(default_factory=list, description="与请求顺序一致的哈希结果列表")
+
+
+class FileCacheStatsResult(BaseModel):
+    """文件内容缓存统计结果"""
+    entries: int = Field(default=0, description="缓存的文件数量")
+    bytes: int = Field(default=0, description="缓存占用的内存, 单位为字节")
+    max_bytes: int = Field(default=0, description="缓存的内存预算, 单位为字节")
+    hits: int = Field(default=0, description="命中次数")
+    misses: int = Field(default=0, description="未命中次数")
+    evictions: int = Field(default=0, description="因超出内存预算被淘汰的次数")
+    invalidations: int = Field(default=0, description="因文件写入被主动失效的次数")
+    hit_rate: float = Field(default=0.0, description="命中率")
+
+
+class FileEditResult(BaseModel):
+    """单个编辑的执行结果"""
+    index: int = Field(..., description="编辑在请求列表中的序号")
+    replaced_count: int = Field(default=0, description="编辑生效的次数")
+
+
+class FileMultiEditResult(BaseModel):
+    """同一文件多处编辑结果"""
+    file_path: str = Field(..., description="编辑的文件绝对路径")
+    replaced_count: int = Field(default=0, description="所有编辑生效的总次数")
+    edits: List[FileEditResult] = Field(default_factory=list, description="每个编辑的执行结果")
+
+
+class FilePatchHunkResult(BaseModel):
+    """单个hunk的应用结果"""
+    index: int = Field(..., description="hunk在文件补丁中的序号")
+    old_start: int = Field(..., description="hunk在原文件中的起始行号")
+    old_count: int = Field(..., description="hunk在原文件中的行数")
+    new_start: int = Field(..., description="hunk在新文件中的起始行号")
+    new_count: int = Field(..., description="hunk在新文件中的行数")
+    applied: bool = Field(default=False, description="是否应用成功")
+    offset: int = Field(default=0, description="实际应用位置与补丁行号相差的行数")
+    fuzz: int = Field(default=0, description="匹配时忽略的首尾上下文行数")
+    error: Optional[str] = Field(default=None, description="应用失败的原因")
+
+
+class FilePatchFileResult(BaseModel):
+    """单个文件的补丁应用结果"""
+    file_path: str = Field(..., description="补丁修改的文件绝对路径(重命名时为新路径)")
+    action: str = Field(..., description="修改类型: modify/create/delete/rename")
+    success: bool = Field(default=False, description="所有hunk是否都应用成功")
+    written: bool = Field(default=False, description="文件是否已被修改")
+    error: Optional[str] = Field(default=None, description="失败原因")
+    hunks: List[FilePatchHunkResult] = Field(default_factory=list, description="每个hunk的应用结果")
+
+
+class FileApplyPatchResult(BaseModel):
+    """补丁应用结果"""
+    success: bool = Field(default=False, description="所有文件的所有hunk是否都应用成功")
+    applied_hunks: int = Field(default=0, description="应用成功的hunk数量")
+    failed_hunks: int = Field(default=0, description="应用失败的hunk数量")
+    files: List[FilePatchFileResult] = Field(default_factory=list, description="每个文件的应用结果")
+
+
+class FileLineEditResult(BaseModel):
+    """按行编辑文件结果"""
+    file_path: str = Field(..., description="编辑的文件绝对路径")
+    op: str = Field(..., description="编辑类型")
+    start_line: int = Field(..., description="编辑的起始行")
+    removed_lines: int = Field(default=0, description="删除的行数")
+    inserted_lines: int = Field(default=0, description="插入的行数")
+    bytes_written: int = Field(default=0, description="写入新内容的字节数")
+
+
+class FileUploadRange(BaseModel):
+    """上传会话中的字节区间"""
+    start: int = Field(..., description="起始偏移(包含)")
+    end: int = Field(..., description="结束偏移(不包含)")
+
+
+class FileUploadSessionResult(BaseModel):
+    """分片上传会话状态"""
+    session_id: str = Field(..., description="上传会话id")
+    file_path: str = Field(..., description="上传的目标文件绝对路径")
+    total_size: int = Field(default=0, description="文件总大小, 单位为字节")
+    received_bytes: int = Field(default=0, description="已接收的字节数")
+    missing_ranges: List[FileUploadRange] = Field(default_factory=list, description="尚未接收的字节区间")
+    state: str = Field(..., description="会话状态: open/completing/closed")
+
+
+class FileUploadPartResult(BaseModel):
+    """分片上传结果"""
+    session_id: str = Field(..., description="上传会话id")
+    offset: int = Field(..., description="分片的起始偏移")
+    length: int = Field(default=0, description="分片的字节数")
+    received_bytes: int = Field(default=0, description="会话已接收的字节数")
+    complete: bool = Field(default=False, description="是否已接收全部内容(可以合并)")
+
+
+class FileArchiveSkippedEntry(BaseModel):
+    """导入归档时被跳过的条目"""
+    path: str = Field(..., description="条目在归档中的路径")
+    reason: str = Field(..., description="跳过的原因")
+
+
+class FileArchiveImportResult(BaseModel):
+    """导入归档结果"""
+    dir_path: str = Field(..., description="解压的目标文件夹绝对路径")
+    file_count: int = Field(default=0, description="解压的文件数量")
+    dir_count: int = Field(default=0, description="解压的文件夹数量")
+    link_count: int = Field(default=0, description="解压的软链接/硬链接数量")
+    total_bytes: int = Field(default=0, description="解压的文件内容总字节数")
+    skipped: List[FileArchiveSkippedEntry] = Field(default_factory=list, description="因路径越界等原因被跳过的条目")
+
+
+class FileSignatureResult(BaseModel):
+    """文件块签名结果"""
+    file_path: str = Field(..., description="计算签名的文件绝对路径")
+    file_size: int = Field(default=0, description="文件大小, 单位为字节")
+    block_size: int = Field(..., description="块大小, 单位为字节")
+    block_count: int = Field(default=0, description="块数量")
+    signature: str = Field(..., description="二进制签名的base64编码")
+
+
+class FileDeltaApplyResult(BaseModel):
+    """增量应用结果"""
+    file_path: str = Field(..., description="更新的文件绝对路径")
+    file_size: int = Field(default=0, description="重建后的文件大小, 单位为字节")
+    copied_bytes: int = Field(default=0, description="从原文件复制的字节数")
+    literal_bytes: int = Field(default=0, description="由增量直接传输的字节数")
+    content_hash: Optional[str] = Field(default=None, description="重建结果的哈希(传递expected_hash时才会计算)")
+
+
+class FileBlobMissingResult(BaseModel):
+    """查询缺失blob结果"""
+    missing: List[str] = Field(default_factory=list, description="存储中不存在、需要上传的内容哈希")
+    present: int = Field(default=0, description="已存在的blob数量")
+
+
+class FileBlobUploadResult(BaseModel):
+    """上传blob结果"""
+    content_hash: str = Field(..., description="blob的内容哈希")
+    size: int = Field(default=0, description="blob大小, 单位为字节")
+    existed: bool = Field(default=False, description="blob是否已经存在(此时不会读取请求体)")
+
+
+class FileBlobMaterializeItemResult(BaseModel):
+    """物化blob中单个条目的结果"""
+    content_hash: str = Field(..., description="blob的内容哈希")
+    file_path: str = Field(..., description="物化的目标文件绝对路径")
+    success: bool = Field(..., description="是否物化成功")
+    method: Optional[str] = Field(default=None, description="实际使用的物化方式: copy/reflink")
+    error: Optional[str] = Field(default=None, description="失败原因")
+
+
+class FileBlobMaterializeResult(BaseModel):
+    """物化blob结果"""
+    items: List[FileBlobMaterializeItemResult] = Field(default_factory=list, description="与请求顺序一致的结果列表")
+    succeeded: int = Field(default=0, description="成功的条目数")
+    failed: int = Field(default=0, description="失败的条目数")
+
+
+class FileOperationResult(BaseModel):
+    """复制/移动/删除操作的进度与结果"""
+    operation_id: str = Field(..., description="操作id")
+    op: str = Field(..., description="操作类型: copy/move/rmtree")
+    src_path: str = Field(..., description="源路径")
+    dst_path: Optional[str] = Field(default=None, description="目标路径")
+    state: str = Field(..., description="操作状态: running/succeeded/failed/cancelled")
+    total_entries: int = Field(default=0, description="需要处理的条目数(扫描完成前不断增加)")
+    done_entries: int = Field(default=0, description="已处理的条目数")
+    failed_entries: int = Field(default=0, description="处理失败的条目数")
+    total_bytes: int = Field(default=0, description="需要复制的字节数")
+    done_bytes: int = Field(default=0, description="已复制的字节数")
+    errors: List[str] = Field(default_factory=list, description="失败条目的错误信息(最多100条)")
+    started_at: float = Field(..., description="开始时间戳")
+    finished_at: Optional[float] = Field(default=None, description="结束时间戳，进行中为空")
+
+
+class FileMkdirResult(BaseModel):
+    """创建文件夹结果"""
+    dir_path: str = Field(..., description="文件夹绝对路径")
+    created: bool = Field(default=False, description="是否新建(已存在时为false)")
+
+
+class FileSnapshotInfo(BaseModel):
+    """目录快照信息"""
+    snapshot_id: str = Field(..., description="快照id(按创建时间排序)")
+    dir_path: str = Field(..., description="快照的文件夹绝对路径")
+    label: Optional[str] = Field(default=None, description="快照的说明")
+    created_at: float = Field(..., description="创建时间戳")
+    file_count: int = Field(default=0, description="文件数量")
+    dir_count: int = Field(default=0, description="文件夹数量")
+    link_count: int = Field(default=0, description="软链接数量")
+    total_bytes: int = Field(default=0, description="快照中文件的总大小, 单位为字节")
+    copied_files: int = Field(default=0, description="创建时复制的文件数量(相对上一个快照有变化)")
+    copied_bytes: int = Field(default=0, description="创建时复制的字节数，即该快照新增占用的空间")
+    linked_files: int = Field(default=0, description="与上一个快照共享(硬链接)的文件数量")
+    exclude: List[str] = Field(default_factory=list, description="创建时使用的排除规则")
+
+
+class FileSnapshotListResult(BaseModel):
+    """目录快照列表"""
+    dir_path: str = Field(..., description="文件夹绝对路径")
+    snapshots: List[FileSnapshotInfo] = Field(default_factory=list, description="按创建时间排序的快照列表")
+
+
+class FileSnapshotRestoreResult(BaseModel):
+    """恢复目录快照结果"""
+    dir_path: str = Field(..., description="恢复的文件夹绝对路径")
+    snapshot_id: str = Field(..., description="快照id")
+    restored_files: int = Field(default=0, description="重新复制的文件数量")
+    restored_bytes: int = Field(default=0, description="重新复制的字节数")
+    unchanged_files: int = Field(default=0, description="未变化而跳过的文件数量")
+    deleted_entries: int = Field(default=0, description="删除的条目数量(删除的文件夹按一个条目计算)")
+    created_dirs: int = Field(default=0, description="新建的文件夹数量")
+    errors: List[str] = Field(default_factory=list, description="恢复失败的条目与原因")
+
+
+class FileDiskUsageEntry(BaseModel):
+    """占用空间统计中的单个条目"""
+    path: str = Field(..., description="条目绝对路径")
+    type: str = Field(..., description="条目类型: dir/file")
+    bytes: int = Field(default=0, description="大小之和(含目录本身，与du -b一致), 单位为字节")
+    disk_bytes: int = Field(default=0, description="实际占用的磁盘空间(按块计算，与du一致), 单位为字节")
+    file_count: int = Field(default=0, description="文件数量(含软链接)")
+    dir_count: int = Field(default=0, description="子文件夹数量(不含自身)")
+
+
+class FileDiskUsageResult(BaseModel):
+    """文件夹占用空间统计结果"""
+    dir_path: str = Field(..., description="统计的文件夹绝对路径")
+    bytes: int = Field(default=0, description="大小之和(含目录本身，与du -b一致), 单位为字节")
+    disk_bytes: int = Field(default=0, description="实际占用的磁盘空间(按块计算，与du一致), 单位为字节")
+    file_count: int = Field(default=0, description="文件数量(含软链接)")
+    dir_count: int = Field(default=0, description="子文件夹数量(不含自身)")
+    children: List[FileDiskUsageEntry] = Field(
+        default_factory=list,
+        description="直接子文件夹与直接子文件中最大的若干个，按大小降序",
+    )
+    largest_files: List[FileDiskUsageEntry] = Field(default_factory=list, description="整个目录树中最大的文件")
+    scanned_dirs: int = Field(default=0, description="本次重新扫描的目录数量")
+    cached_dirs: int = Field(default=0, description="直接使用缓存的目录数量")
+    errors: int = Field(default=0, description="无法读取的条目数量")
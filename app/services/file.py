@@ -8,15 +8,59 @@
 """
 import logging
 import asyncio
+import base64
+import errno
+import fnmatch
+import io
+import json
 import os
 import re
-import glob
-from typing import Optional
+import stat
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Iterator, Tuple, Dict, AsyncIterator
 from fastapi import UploadFile
 
-from app.interface.errors.exceptions import BadRequestException, NotFoundException, AppException
+from app.core.system_config import get_settings
+from app.interface.errors.exceptions import BadRequestException, NotFoundException, AppException, ConflictException
+from app.interface.schemas.file import FileBatchOperation, FileEdit, FileBlobMaterializeItem
 from app.models.file import FileReadResult, FileWriteResult, FileReplaceResult, FileSearchResult, FileFindResult, \
-    FileUploadResult, FileCheckResult, FileDeleteResult
+    FileReadBytesResult, FileUploadResult, FileCheckResult, FileDeleteResult, FileEntry, FileWatchResult, FileChange, FileChangesResult, \
+    FileListDirResult, FileBatchItemResult, FileBatchResult, FileChecksumItem, FileChecksumResult, \
+    FileCacheStatsResult, FileEditResult, FileMultiEditResult, FilePatchHunkResult, FilePatchFileResult, \
+    FileApplyPatchResult, FileLineEditResult, FileUploadRange, FileUploadSessionResult, FileUploadPartResult, \
+    FileArchiveSkippedEntry, FileArchiveImportResult, FileSignatureResult, FileDeltaApplyResult, \
+    FileBlobMissingResult, FileBlobUploadResult, FileBlobMaterializeItemResult, FileBlobMaterializeResult, \
+    FileOperationResult, FileMkdirResult, FileSnapshotInfo, FileSnapshotListResult, FileSnapshotRestoreResult, \
+    FileDiskUsageEntry, FileDiskUsageResult
+from app.services.file_archive import ARCHIVE_FORMATS, END_OF_STREAM, ChunkQueue, QueueReader, QueueWriter, \
+    StreamCancelled, extract_tar_stream, iter_archive_entries, write_tar_stream
+from app.services.file_blob import BlobStore, parse_blob_hash
+from app.services.file_compress import ZSTD_AVAILABLE
+from app.services.file_content_cache import FileContentCache
+from app.services.file_delta import DeltaError, Signature, default_block_size, compute_signature, generate_delta, \
+    apply_delta
+from app.services.file_edit import AtomicWriter, FSYNC_NONE, CHUNK_SIZE, stream_replace, apply_edits, copy_range, \
+    replace_file_bytes, sync_file
+from app.services.file_encoding import SNIFF_BYTES, sniff_binary, detect_encoding, normalize_encoding, decode_range, \
+    decode_text, range_encoding
+from app.services.file_follow import FileFollower, FollowWatcher, FOLLOW_FILE_EVENTS, FOLLOW_DIR_EVENTS, \
+    FOLLOW_TRUNCATED, sse_message
+from app.services.file_hash import FileHashCache, DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS, file_signature, new_hasher
+from app.services.file_index import FileIndex
+from app.services.file_journal import CHANGE_CREATED, CHANGE_MODIFIED, CHANGE_DELETED
+from app.services.file_lines import LineOffsetIndex
+from app.services.file_regex import RegexPool, RegexWorkerError, SOURCE_PATH, SOURCE_TEXT
+from app.services.file_upload import UploadSessionManager, UploadSession, pump_stream, UPLOAD_BUFFER_SIZE
+from app.services.file_ops import FileOperation, FileOperationManager, copy_file, copy_symlink, copy_tree, \
+    remove_tree
+from app.services.file_usage import DiskUsageCache, DirUsage
+from app.services.file_snapshot import SnapshotInfo, SnapshotStore
+from app.services.file_patch import DEV_NULL, FilePatch, HunkOutcome, PatchError, parse_unified_diff, apply_hunks
+from app.services.file_walker import DEFAULT_IGNORE_NAMES, iter_glob_entries, encode_cursor, decode_cursor, \
+    entry_metadata, entry_type, stat_file_type
+from app.services.sudo_helper import SudoHelperClient
 
 logger = logging.getLogger(__name__)
 
@@ -25,18 +69,183 @@ class FileService:
     """ 文件沙箱服务 """
 
     def __init__(self):
-        pass
+        # 监听目录的文件元数据内存索引(按需开启)
+        settings = get_settings()
+        self.file_index = FileIndex(journal_size=settings.file_change_journal_size)
+
+        # 按文件签名缓存的内容哈希
+        self.hash_cache = FileHashCache(max_entries=settings.file_hash_cache_size)
+
+        # 按内存预算淘汰的热点文件内容缓存
+        self.content_cache = FileContentCache(
+            max_bytes=settings.file_content_cache_bytes,
+            max_entry_bytes=settings.file_content_cache_max_file_bytes,
+        )
+
+        # 按行编辑文件使用的行号->字节偏移索引
+        self.line_index = LineOffsetIndex(max_files=settings.file_line_index_files)
+
+        # 可断点续传的分片上传会话
+        self.upload_sessions = UploadSessionManager(
+            ttl=settings.file_upload_session_ttl,
+            max_sessions=settings.file_upload_max_sessions,
+        )
+
+        # 复制/移动/删除目录树的进度记录与并行工作线程
+        self.file_operations = FileOperationManager(ttl=settings.file_operation_ttl)
+        self._copy_workers = settings.file_copy_workers
+        self._copy_executor = ThreadPoolExecutor(
+            max_workers=settings.file_copy_workers,
+            thread_name_prefix="file-copy",
+        )
+        self._operation_tasks = set()
+
+        # 按目录修改时间缓存的占用空间统计
+        self.usage_cache = DiskUsageCache(
+            max_dirs=settings.file_disk_usage_cache_dirs,
+            ttl=settings.file_disk_usage_cache_ttl,
+        )
+        self._batch_workers = settings.file_batch_workers
+
+        # 基于硬链接的增量目录快照
+        self.snapshot_store = SnapshotStore(root=settings.file_snapshot_dir)
+
+        # 按内容哈希寻址的blob存储，相同内容只需上传一次
+        self.blob_store = BlobStore(
+            root=settings.file_blob_store_dir,
+            max_bytes=settings.file_blob_store_max_bytes,
+        )
+
+        # 跟踪持续增长的文件(全部跟踪共享一个inotify实例)
+        self.follow_watcher = FollowWatcher()
+        self._follow_poll_interval = settings.file_follow_poll_interval
+        self._follow_heartbeat = settings.file_follow_heartbeat
+        self._follow_max_read = settings.file_follow_max_read
+
+        # 执行用户正则的可终止工作进程池，灾难性回溯的正则不会占用线程池
+        self.regex_pool = RegexPool(workers=settings.file_regex_workers)
+        self._regex_timeout = settings.file_regex_timeout
+
+        # 常驻的特权助手进程(第一次使用sudo操作时启动)
+        self.sudo_helper = SudoHelperClient()
+
+        # 按路径分段的写入锁，保证同一文件的比对哈希与写入不会被其他写入插入
+        self._write_locks = [threading.Lock() for _ in range(64)]
+
+        # 批量文件操作使用独立的有界线程池，避免占满asyncio默认线程池
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=settings.file_batch_workers,
+            thread_name_prefix="file-batch",
+        )
+
+    def shutdown_executors(self) -> None:
+        """服务关闭时停止复制/批量线程池，不等待正在执行的任务，尚未开始的任务直接取消"""
+        self._copy_executor.shutdown(wait=False, cancel_futures=True)
+        self._batch_executor.shutdown(wait=False, cancel_futures=True)
 
     @classmethod
-    async def read_file(
+    def _hash_algorithm_of(cls, expected_hash: Optional[str]) -> str:
+        """解析"算法:十六进制摘要"格式的预期哈希，返回其算法(为空时返回默认算法)"""
+        if expected_hash is None:
+            return DEFAULT_HASH_ALGORITHM
+        hash_algorithm = expected_hash.split(":", 1)[0]
+        if hash_algorithm not in HASH_ALGORITHMS or ":" not in expected_hash:
+            raise BadRequestException(f"预期哈希格式错误: {expected_hash}，应为\"算法:十六进制摘要\"")
+        return hash_algorithm
+
+    def _write_lock(self, file_path: str) -> threading.Lock:
+        """获取文件路径对应的写入锁"""
+        return self._write_locks[hash(os.path.realpath(file_path)) % len(self._write_locks)]
+
+    def _read_cached(
+            self,
+            file_path: str,
+            st: os.stat_result,
+            hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+            if_none_match: Optional[str] = None,
+    ) -> Optional[Tuple[Optional[str], str]]:
+        """从内容缓存中读取签名一致的文件内容，返回(内容, 哈希)，未命中返回None"""
+        cached = self.content_cache.get(file_path, st, hash_algorithm)
+        if cached is None:
+            return None
+        content, content_hash = cached
+        return (None if content_hash == if_none_match else content), content_hash
+
+    def _read_text(
+            self,
+            file_path: str,
+            encoding: str = "utf-8",
+            hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+            if_none_match: Optional[str] = None,
+            check_cache: bool = True,
+    ) -> Tuple[Optional[str], str]:
+        """同步读取文件的全部文本内容并计算内容哈希，返回(内容, 哈希)，哈希与if_none_match一致时内容为None"""
+        try:
+            # 1.文件签名未变化时优先使用内容缓存，缓存的哈希与调用方持有的一致时同样无需读取内容
+            st = os.stat(file_path)
+            cached = self._read_cached(file_path, st, hash_algorithm, if_none_match) if check_cache else None
+            if cached is not None:
+                return cached
+            cached_hash = self.hash_cache.lookup(st, hash_algorithm)
+            if if_none_match is not None and cached_hash == if_none_match:
+                return None, cached_hash
+
+            # 2.以字节方式读取全部内容，读取前后签名一致时可以复用/写入哈希缓存
+            with open(file_path, "rb") as f:
+                data = f.read()
+                unchanged = file_signature(os.fstat(f.fileno())) == file_signature(st)
+            if unchanged and cached_hash is not None:
+                content_hash = cached_hash
+            else:
+                content_hash = self.hash_cache.hash_bytes(data, hash_algorithm)
+                if unchanged:
+                    self.hash_cache.store(st, content_hash, hash_algorithm)
+
+            # 3.内容没有变化时同样不返回内容
+            if if_none_match is not None and content_hash == if_none_match:
+                return None, content_hash
+
+            # 4.按照文本模式的换行规则解码(不是合法的utf-8时根据开头的样本检测编码)，读取期间未被修改的内容写入内容缓存
+            content = decode_text(data, encoding)
+            if unchanged:
+                self.content_cache.put(file_path, st, content, hash_algorithm, content_hash)
+            return content, content_hash
+        except Exception as e:
+            raise AppException(msg=f"读取文件失败: {str(e)}")
+
+    @classmethod
+    def _slice_content(
             cls,
+            content: str,
+            start_line: Optional[int] = None,
+            end_line: Optional[int] = None,
+            max_length: Optional[int] = None,
+    ) -> str:
+        """根据行号范围与最大长度裁切文件内容"""
+        # 1.判断是否传递了读取范围
+        if start_line is not None or end_line is not None:
+            # 2.将内容切割成行，并且提取指定范围行号的数据
+            lines = content.splitlines()
+            start = start_line if start_line is not None else 0
+            end = end_line if end_line is not None else len(lines)
+            content = "\n".join(lines[start:end])
+
+        # 3.裁切下数据长度
+        if max_length is not None and 0 < max_length < len(content):
+            content = content[:max_length] + "(truncated)"
+        return content
+
+    async def read_file(
+            self,
             file_path: str,
             start_line: Optional[int] = None,
             end_line: Optional[int] = None,
             sudo: bool = False,
             max_length: int = 10000,
+            if_none_match: Optional[str] = None,
+            hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
     ) -> FileReadResult:
-        """根据传递的文件路径+起始行号+权限+最大长度读取文件内容"""
+        """根据传递的文件路径+起始行号+权限+最大长度读取文件内容，内容哈希与if_none_match一致时只返回未修改标记"""
         try:
             # 1.检测在当前权限下能否获取该文件
             if not os.path.exists(file_path) and not sudo:
@@ -46,67 +255,133 @@ class FileService:
             # 2.获取系统编码, 默认使用utf-8
             encoding = "utf-8"
 
-            # 3.判断是否为sudo，如果是则使用命令行的方式读取文件
+            # 3.判断是否为sudo，如果是则通过常驻的特权助手进程读取文件
             if sudo:
-                # 4.使用sudo cat命令读取文件内容
-                command = f"sudo cat '{file_path}'"
-                process = await asyncio.create_subprocess_shell(
-                    command,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                )
+                # 4.读取文件的全部内容
+                try:
+                    raw = await self.sudo_helper.read(file_path)
+                except FileNotFoundError:
+                    raise NotFoundException(f"要读取的文件不存在: {file_path}")
+                except OSError as e:
+                    raise BadRequestException(f"阅读文件失败: {str(e)}")
 
-                # 5.读取子进程的输出，并等待子进程结束
-                stdout, stderr = process.communicate()
+                # 5.计算内容哈希并解码内容(与非sudo读取一致，统一换行符)
+                content_hash = self.hash_cache.hash_bytes(raw, hash_algorithm)
+                content = None
+                if content_hash != if_none_match:
+                    content = raw.decode(encoding, errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+            else:
+                # 6.内容缓存命中时直接在事件循环中返回，否则使用asyncio创建线程读取文件
+                cached = self._read_cached(file_path, os.stat(file_path), hash_algorithm, if_none_match)
+                if cached is None:
+                    cached = await asyncio.to_thread(
+                        self._read_text, file_path, encoding, hash_algorithm, if_none_match, False,
+                    )
+                content, content_hash = cached
 
-                # 6.判断子进程的状态是否正常结束
-                if process.returncode != 0:
-                    raise BadRequestException(f"阅读文件失败: {stderr.decode()}")
+            # 7.内容未变化时只返回哈希
+            if content is None:
+                return FileReadResult(file_path=file_path, content="", content_hash=content_hash, not_modified=True)
 
-                # 7.读取输出内容
-                content = stdout.decode(encoding, errors="replace")
-            else:
-                # 8.创建一个内部读取函数
-                def async_read_file() -> str:
-                    try:
-                        with open(file_path, "r", encoding=encoding) as f:
-                            return f.read()
-                    except Exception as e:
-                        raise AppException(msg=f"读取文件失败: {str(e)}")
-
-                # 9.使用asyncio创建线程读取文件
-                content = await asyncio.to_thread(async_read_file)
-
-            # 10.判断是否传递了读取范围
-            if start_line is not None or end_line is not None:
-                # 11.将内容切割成行，并且提取指定范围行号的数据
-                lines = content.splitlines()
-                start = start_line if start_line is not None else 0
-                end = end_line if end_line is not None else len(lines)
-                content = "\n".join(lines[start:end])
-
-            # 12.裁切下数据长度
-            if max_length is not None and 0 < max_length < len(content):
-                content = content[:max_length] + "(truncated)"
-
-            return FileReadResult(file_path=file_path, content=content)
+            # 8.按照读取范围与最大长度裁切内容
+            content = self._slice_content(content, start_line, end_line, max_length)
+
+            return FileReadResult(file_path=file_path, content=content, content_hash=content_hash)
         except Exception as e:
-            # 13.判断异常类型执行不同操作
+            # 9.判断异常类型执行不同操作
             if isinstance(e, BadRequestException) or isinstance(e, AppException):
                 raise
             raise AppException(f"文件读取失败: {str(e)}")
 
-    @classmethod
+    async def read_bytes(
+            self,
+            file_path: str,
+            offset: int = 0,
+            length: int = 64 * 1024,
+            encoding: str = "base64",
+    ) -> FileReadBytesResult:
+        """
+        按字节范围读取文件，只读取请求的范围与文件开头用于嗅探的少量字节
+        1.offset为负数时从文件末尾倒数(例如读取Parquet文件末尾的footer)
+        2.encoding为base64时返回原始字节的base64编码；为auto时根据文件开头的样本检测编码，二进制文件仍返回base64；
+          也可以直接指定编码名称(例如gbk)
+        3.文本解码不会拆分多字节字符，offset + length即为下一次读取的起始位置
+        """
+        # 1.校验文件与编码
+        if not os.path.exists(file_path):
+            raise NotFoundException(f"该文件不存在: {file_path}")
+        if not os.path.isfile(file_path):
+            raise BadRequestException(f"该路径不是文件: {file_path}")
+        if encoding not in ("base64", "auto"):
+            try:
+                encoding = normalize_encoding(encoding)
+            except LookupError:
+                raise BadRequestException(f"不支持的编码: {encoding}")
+
+        def async_read_bytes() -> FileReadBytesResult:
+            with open(file_path, "rb") as f:
+                # 2.定位读取范围并读取
+                fd = f.fileno()
+                size = os.fstat(fd).st_size
+                start = max(0, size + offset) if offset < 0 else min(offset, size)
+                data = os.pread(fd, min(length, size - start), start)
+
+                # 3.嗅探文件开头判断是否为二进制(范围已包含文件开头时直接复用)
+                sample = data[:SNIFF_BYTES] if start == 0 else os.pread(fd, SNIFF_BYTES, 0)
+            is_binary, kind = sniff_binary(sample)
+
+            # 4.按编码返回内容
+            used_encoding = encoding
+            if encoding == "auto":
+                used_encoding = "base64" if is_binary else detect_encoding(sample)
+            if used_encoding == "base64":
+                content = base64.b64encode(data).decode("ascii")
+                read_length = len(data)
+            else:
+                used_encoding = range_encoding(used_encoding, sample, start)
+                content, skipped, read_length = decode_range(
+                    data, used_encoding, start, at_eof=start + len(data) >= size,
+                )
+                start += skipped
+            return FileReadBytesResult(
+                file_path=file_path,
+                offset=start,
+                length=read_length,
+                file_size=size,
+                eof=start + read_length >= size,
+                encoding=used_encoding,
+                is_binary=is_binary,
+                format=kind,
+                content=content,
+            )
+
+        try:
+            return await asyncio.to_thread(async_read_bytes)
+        except UnicodeDecodeError as e:
+            raise BadRequestException(f"按{encoding}解码失败: {str(e)}")
+        except OSError as e:
+            raise BadRequestException(f"读取文件失败: {str(e)}")
+
     async def write_file(
-            cls,
+            self,
             file_path: str,
             content: str,
             append: bool = False,
             leading_newline: bool = False,
             trailing_newline: bool = False,
             sudo: bool = False,
+            atomic: bool = True,
+            fsync: str = FSYNC_NONE,
+            preserve_mode: bool = True,
+            preserve_owner: bool = True,
+            expected_hash: Optional[str] = None,
     ) -> FileWriteResult:
-        """根据传递的文件路径+内容向指定文件写入内容"""
+        """
+        根据传递的文件路径+内容向指定文件写入内容
+        1.覆盖写入默认先写同目录临时文件再原子替换，读取方不会看到写了一半的文件
+        2.expected_hash不为空时先比对文件当前内容的哈希，不一致说明文件已被其他请求修改，拒绝写入
+        3.sudo模式下通过特权助手进程写入，支持原子替换与落盘策略，不支持expected_hash
+        """
         try:
             # 1.组装实际写入的内容
             if leading_newline:
@@ -114,63 +389,86 @@ class FileService:
             if trailing_newline:
                 content = content + "\n"
 
-            # 2.判断是否是sudo权限
+            # 2.判断是否是sudo权限，sudo模式下通过常驻的特权助手进程写入
             if sudo:
-                # 3.使用命令的方式先向临时文件写入数据，计算追加模式
-                mode = ">>" if append else ">"
-
-                # 4.创建一个临时文件
-                temp_file = f"/tmp/file_write_{os.getpid()}.tmp"
-
-                # 5.创建一个内部函数使用asyncio创建新线程写入数据
-                def async_write_temp_file() -> int:
-                    with open(temp_file, "w", encoding="utf-8") as f:
-                        f.write(content)
-                    return len(content.encode("utf-8"))
-
-                # 6.使用asyncio创建子线程并写入
-                bytes_written = await asyncio.to_thread(async_write_temp_file)
-
-                # 7.使用命令行将临时文件写入到目标哦文件中
-                command = f"sudo bash -c \"cat {temp_file} {mode} {file_path}\""
-                process = await asyncio.create_subprocess_shell(
-                    command,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
+                if expected_hash is not None:
+                    raise BadRequestException("sudo模式下不支持expected_hash")
+                data = content.encode("utf-8")
+                try:
+                    bytes_written = await self.sudo_helper.write(
+                        file_path,
+                        data,
+                        append=append,
+                        atomic=atomic,
+                        fsync=fsync,
+                    )
+                except OSError as e:
+                    raise BadRequestException(f"文件内容写入失败: {str(e)}")
+                return FileWriteResult(
+                    file_path=file_path,
+                    bytes_written=bytes_written,
+                    content_hash=None if append else FileHashCache.hash_bytes(data),
                 )
 
-                # 8.等待子进程执行完毕
-                stdout, stderr = await process.communicate()
+            # 3.解析预期哈希的算法
+            hash_algorithm = self._hash_algorithm_of(expected_hash)
 
-                # 9.检测子进程是否正常执行
-                if process.returncode != 0:
-                    raise BadRequestException(f"文件内容写入失败: {stderr.decode()}")
+            # 4.非sudo下使用Python方式写入，先确保文件路径存在
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            data = content.encode("utf-8")
 
-                # 10.清除下临时文件
-                os.unlink(temp_file)
-            else:
-                # 11.非sudo下使用Python方式写入，先确保文件路径存在
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            # 5.创建一个异步写入的函数，同一文件的写入串行执行，保证比对哈希与写入之间不会被其他写入插入
+            def async_write_file() -> Optional[str]:
+                with self._write_lock(file_path):
+                    if expected_hash is not None:
+                        try:
+                            current_hash, _ = self.hash_cache.hash_file(file_path, hash_algorithm)
+                        except FileNotFoundError:
+                            raise ConflictException(f"文件已不存在: {file_path}")
+                        if current_hash != expected_hash:
+                            raise ConflictException(f"文件已被修改，当前哈希为{current_hash}")
 
-                # 12.创建一个异步写入的函数
-                def async_write_file() -> int:
-                    write_mode = "a" if append else "w"
-                    with open(file_path, write_mode, encoding="utf-8") as f:
-                        return f.write(content)
+                    # 6.追加写入或关闭原子写入时直接写入原文件
+                    if append or not atomic:
+                        with open(file_path, "ab" if append else "wb") as f:
+                            f.write(data)
+                            f.flush()
+                            sync_file(f.fileno(), fsync)
+                        return None if append else FileHashCache.hash_bytes(data, hash_algorithm)
 
-                # 13.使用asyncio创建一个子线程写入内容
-                bytes_written = await asyncio.to_thread(async_write_file)
+                    # 7.覆盖写入时写入临时文件后原子替换(软链接写入其指向的文件)，无法替换或存在硬链接时直接覆盖
+                    target = os.path.realpath(file_path)
+                    try:
+                        st = os.stat(target)
+                    except FileNotFoundError:
+                        st = None
+                    replace_file_bytes(
+                        target,
+                        data,
+                        preserve_from=st,
+                        preserve_mode=preserve_mode,
+                        preserve_owner=preserve_owner,
+                        fsync=fsync,
+                    )
+                    return FileHashCache.hash_bytes(data, hash_algorithm)
+
+            # 8.使用asyncio创建一个子线程写入内容
+            content_hash = await asyncio.to_thread(async_write_file)
 
             return FileWriteResult(
                 file_path=file_path,
-                bytes_written=bytes_written,
+                bytes_written=len(data),
+                content_hash=content_hash,
             )
         except Exception as e:
-            # 14.根据不同的错误执行不同的操作
+            # 9.根据不同的错误执行不同的操作
             logger.error(f"文件内容写入失败: {str(e)}", exc_info=True)
-            if isinstance(e, BadRequestException):
+            if isinstance(e, BadRequestException) or isinstance(e, ConflictException):
                 raise
             raise AppException(f"文件内容写入失败: {str(e)}")
+        finally:
+            # 10.无论写入是否成功，文件内容都可能已经变化，主动失效内容缓存
+            self.content_cache.invalidate(file_path)
 
     async def replace_in_file(
             self,
@@ -178,87 +476,692 @@ class FileService:
             old_str: str,
             new_str: str,
             sudo: bool = False,
+            regex: bool = False,
+            max_replacements: Optional[int] = None,
     ) -> FileReplaceResult:
-        """根据传递的数据替换文件内指定的内容"""
-        # 1.调用服务获取对应的文件内容
-        file_read_result = await self.read_file(file_path=file_path, sudo=sudo, max_length=None)
-        content = file_read_result.content
-
-        # 2.计算old_str出现的次数，只有出现次数>0才需要替换
-        replaced_count = content.count(old_str)
-        if replaced_count == 0:
+        """根据传递的数据替换文件内指定的内容(非sudo模式下分块流式处理并原子替换原文件)"""
+        # 1.校验参数并编译匹配规则(普通模式按字面量匹配)
+        if not old_str:
+            raise BadRequestException("要替换的原始字符串不能为空")
+        if max_replacements is not None and max_replacements <= 0:
+            raise BadRequestException("最大替换次数必须大于0")
+        try:
+            pattern = re.compile(old_str if regex else re.escape(old_str))
+        except re.error as e:
+            raise BadRequestException(f"传递正则表达式[{old_str}]出错: {str(e)}")
+
+        # 2.sudo模式下读取全部内容后在内存中替换，再通过sudo写回
+        if sudo:
+            file_read_result = await self.read_file(file_path=file_path, sudo=sudo, max_length=None)
+            replacement = new_str if regex else lambda _: new_str
+            try:
+                new_content, replaced_count = pattern.subn(
+                    replacement,
+                    file_read_result.content,
+                    count=max_replacements or 0,
+                )
+            except (re.error, IndexError) as e:
+                raise BadRequestException(f"替换内容[{new_str}]出错: {str(e)}")
+            if replaced_count > 0:
+                await self.write_file(file_path=file_path, content=new_content, sudo=sudo)
             return FileReplaceResult(file_path=file_path, replaced_count=replaced_count)
 
-        # 3.替换旧内容
-        new_content = content.replace(old_str, new_str)
+        # 3.判断文件是否存在
+        if not os.path.isfile(file_path):
+            raise NotFoundException(f"文件不存在: {file_path}")
 
-        # 4.将替换后的新内容写入到文件中
-        await self.write_file(
-            file_path=file_path,
-            content=new_content,
-            sudo=sudo,
-        )
+        # 4.分块读取原文件，替换结果写入同目录下的临时文件，没有任何替换时丢弃临时文件(软链接写入其指向的文件)
+        target = os.path.realpath(file_path)
+
+        def async_stream_replace() -> int:
+            with open(target, "r", encoding="utf-8", errors="surrogateescape", newline="") as src:
+                with AtomicWriter(
+                        target,
+                        mode="w",
+                        encoding="utf-8",
+                        errors="surrogateescape",
+                        newline="",
+                        preserve_from=os.fstat(src.fileno()),
+                ) as writer:
+                    count = stream_replace(
+                        src,
+                        writer.file,
+                        pattern,
+                        new_str,
+                        regex=regex,
+                        max_replacements=max_replacements,
+                        overlap=None if regex else len(old_str),
+                    )
+                    if count == 0:
+                        writer.discard()
+                    return count
+
+        try:
+            replaced_count = await asyncio.to_thread(async_stream_replace)
+        except (re.error, IndexError) as e:
+            # 5.替换内容中引用了不存在的分组
+            raise BadRequestException(f"替换内容[{new_str}]出错: {str(e)}")
+        except Exception as e:
+            logger.error(f"文件内容替换失败: {str(e)}", exc_info=True)
+            raise AppException(f"文件内容替换失败: {str(e)}")
+        finally:
+            # 6.原文件可能已被替换，主动失效内容缓存
+            self.content_cache.invalidate(file_path)
 
         return FileReplaceResult(file_path=file_path, replaced_count=replaced_count)
 
+    async def multi_edit(
+            self,
+            file_path: str,
+            edits: List[FileEdit],
+            sudo: bool = False,
+    ) -> FileMultiEditResult:
+        """对同一文件一次性应用多个编辑，所有编辑都相对原文件内容，只遍历并写入一次"""
+        # 1.预先校验所有编辑，拆分为字面量编辑与行范围编辑
+        literal_edits: List[Tuple[int, str, str]] = []
+        line_edits: List[Tuple[int, int, int, str]] = []
+        for index, edit in enumerate(edits):
+            if (edit.old_str is None) == (edit.start_line is None):
+                raise BadRequestException(f"第{index}个编辑必须且只能指定old_str或start_line其中之一")
+            if edit.old_str is not None:
+                literal_edits.append((index, edit.old_str, edit.new_str))
+                continue
+            end_line = edit.start_line if edit.end_line is None else edit.end_line
+            if end_line < edit.start_line:
+                raise BadRequestException(f"第{index}个编辑的结束行不能小于起始行")
+            new_str = edit.new_str
+            if new_str and not new_str.endswith(("\n", "\r")):
+                new_str += "\n"
+            line_edits.append((index, edit.start_line, end_line, new_str))
+
+        # 2.行范围之间不能重叠(同一位置的多个插入按顺序写入)
+        ordered = sorted(line_edits, key=lambda e: e[1])
+        for previous, current in zip(ordered, ordered[1:]):
+            if current[1] < previous[2]:
+                raise BadRequestException(f"第{previous[0]}个编辑与第{current[0]}个编辑的行范围重叠")
+
+        # 3.根据每个编辑的生效次数校验结果，任何一个不满足时整体失败
+        def check_counts(counts: List[int]) -> Optional[str]:
+            errors = []
+            for index, edit in enumerate(edits):
+                if edit.old_str is None:
+                    continue
+                if counts[index] == 0:
+                    errors.append(f"第{index}个编辑未找到原始字符串")
+                elif edit.expected_count is not None and counts[index] != edit.expected_count:
+                    errors.append(f"第{index}个编辑预期替换{edit.expected_count}处，实际{counts[index]}处")
+            return "; ".join(errors) or None
+
+        def build_result(counts: List[int]) -> FileMultiEditResult:
+            return FileMultiEditResult(
+                file_path=file_path,
+                replaced_count=sum(counts),
+                edits=[FileEditResult(index=index, replaced_count=count) for index, count in enumerate(counts)],
+            )
+
+        # 4.sudo模式下读取全部内容后在内存中编辑，再通过sudo写回
+        if sudo:
+            file_read_result = await self.read_file(file_path=file_path, sudo=sudo, max_length=None)
+            output = io.StringIO()
+            try:
+                counts = apply_edits(io.StringIO(file_read_result.content), output, literal_edits, line_edits)
+            except ValueError as e:
+                raise BadRequestException(f"文件编辑失败: {str(e)}")
+            error = check_counts(counts)
+            if error:
+                raise BadRequestException(f"文件编辑失败: {error}")
+            await self.write_file(file_path=file_path, content=output.getvalue(), sudo=sudo)
+            return build_result(counts)
+
+        # 5.判断文件是否存在
+        if not os.path.isfile(file_path):
+            raise NotFoundException(f"文件不存在: {file_path}")
+
+        # 6.单次流式遍历原文件并写入临时文件，校验失败时丢弃临时文件(软链接写入其指向的文件)
+        target = os.path.realpath(file_path)
+
+        def async_apply_edits() -> Tuple[List[int], Optional[str]]:
+            with open(target, "r", encoding="utf-8", errors="surrogateescape", newline="") as src:
+                with AtomicWriter(
+                        target,
+                        mode="w",
+                        encoding="utf-8",
+                        errors="surrogateescape",
+                        newline="",
+                        preserve_from=os.fstat(src.fileno()),
+                ) as writer:
+                    counts = apply_edits(src, writer.file, literal_edits, line_edits)
+                    error = check_counts(counts)
+                    if error:
+                        writer.discard()
+                    return counts, error
+
+        try:
+            counts, error = await asyncio.to_thread(async_apply_edits)
+        except ValueError as e:
+            raise BadRequestException(f"文件编辑失败: {str(e)}")
+        except Exception as e:
+            logger.error(f"文件编辑失败: {str(e)}", exc_info=True)
+            raise AppException(f"文件编辑失败: {str(e)}")
+        finally:
+            # 7.原文件可能已被替换，主动失效内容缓存
+            self.content_cache.invalidate(file_path)
+
+        if error:
+            raise BadRequestException(f"文件编辑失败: {error}")
+        return build_result(counts)
+
+    @classmethod
+    def _resolve_patch_path(cls, path: str, base_dir: Optional[str], strip: int) -> Optional[str]:
+        """将补丁中的路径转换为绝对路径，/dev/null返回None"""
+        if path == DEV_NULL:
+            return None
+        if base_dir is None:
+            if not os.path.isabs(path):
+                raise BadRequestException(f"补丁中的路径[{path}]不是绝对路径，需要传递base_dir")
+            return path
+        parts = [part for part in path.split("/") if part]
+        if strip >= len(parts):
+            raise BadRequestException(f"补丁中的路径[{path}]层级不足，无法去掉{strip}层")
+        return os.path.join(base_dir, *parts[strip:])
+
+    def _apply_file_patch(
+            self,
+            file_patch: FilePatch,
+            base_dir: Optional[str],
+            strip: int,
+            max_fuzz: int,
+            max_offset: int,
+            allow_partial: bool,
+            dry_run: bool,
+    ) -> FilePatchFileResult:
+        """在子线程中把单个文件的补丁流式应用到磁盘文件"""
+        # 1.解析新旧路径与修改类型
+        old_path = self._resolve_patch_path(file_patch.old_path, base_dir, strip)
+        new_path = self._resolve_patch_path(file_patch.new_path, base_dir, strip)
+        if old_path is None and new_path is None:
+            raise BadRequestException("补丁的新旧路径不能同时为/dev/null")
+        if old_path is None:
+            action = "create"
+        elif new_path is None:
+            action = "delete"
+        else:
+            action = "modify" if old_path == new_path else "rename"
+        result = FilePatchFileResult(file_path=new_path or old_path, action=action)
+
+        def finish(outcomes: List[HunkOutcome], written: bool) -> FilePatchFileResult:
+            result.hunks = [
+                FilePatchHunkResult(
+                    index=index,
+                    old_start=hunk.old_start,
+                    old_count=hunk.old_count,
+                    new_start=hunk.new_start,
+                    new_count=hunk.new_count,
+                    applied=outcome.applied,
+                    offset=outcome.offset,
+                    fuzz=outcome.fuzz,
+                    error=outcome.error,
+                )
+                for index, (hunk, outcome) in enumerate(zip(file_patch.hunks, outcomes))
+            ]
+            result.success = all(outcome.applied for outcome in outcomes)
+            result.written = written
+            if not result.success:
+                result.error = f"{sum(not outcome.applied for outcome in outcomes)}个hunk应用失败"
+            return result
+
+        try:
+            # 2.新建文件：目标文件已存在且非空时拒绝覆盖
+            if action == "create":
+                if os.path.exists(new_path) and os.path.getsize(new_path) > 0:
+                    result.error = f"文件已存在: {new_path}"
+                    return result
+                target = os.path.realpath(new_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with AtomicWriter(target, mode="w", encoding="utf-8", newline="") as writer:
+                    outcomes = apply_hunks(None, writer.file, file_patch.hunks, max_fuzz, max_offset)
+                    written = all(outcome.applied for outcome in outcomes) and not dry_run
+                    if not written:
+                        writer.discard()
+                return finish(outcomes, written)
+
+            if not os.path.isfile(old_path):
+                result.error = f"文件不存在: {old_path}"
+                return result
+
+            # 3.删除文件：应用补丁后内容为空才删除
+            if action == "delete":
+                with open(old_path, "r", encoding="utf-8", errors="surrogateescape", newline="") as src:
+                    output = io.StringIO()
+                    outcomes = apply_hunks(src, output, file_patch.hunks, max_fuzz, max_offset)
+                if output.getvalue():
+                    finish(outcomes, False)
+                    result.success = False
+                    result.error = "应用补丁后文件仍有剩余内容，无法删除"
+                    return result
+                written = all(outcome.applied for outcome in outcomes) and not dry_run
+                if written:
+                    os.remove(old_path)
+                return finish(outcomes, written)
+
+            # 4.修改/重命名：流式应用到新路径的临时文件后原子替换(软链接写入其指向的文件)
+            target = os.path.realpath(new_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(old_path, "r", encoding="utf-8", errors="surrogateescape", newline="") as src:
+                with AtomicWriter(
+                        target,
+                        mode="w",
+                        encoding="utf-8",
+                        errors="surrogateescape",
+                        newline="",
+                        preserve_from=os.fstat(src.fileno()),
+                ) as writer:
+                    outcomes = apply_hunks(src, writer.file, file_patch.hunks, max_fuzz, max_offset)
+                    applied = [outcome.applied for outcome in outcomes]
+                    written = not dry_run and (all(applied) or (allow_partial and any(applied)))
+                    if not written:
+                        writer.discard()
+            if action == "rename" and written:
+                os.remove(old_path)
+            return finish(outcomes, written)
+        except OSError as e:
+            result.error = str(e)
+            return result
+        finally:
+            for path in (old_path, new_path):
+                if path is not None:
+                    self.content_cache.invalidate(path)
+
+    async def apply_patch(
+            self,
+            patch: str,
+            base_dir: Optional[str] = None,
+            strip: int = 1,
+            max_fuzz: int = 2,
+            max_offset: int = 1000,
+            allow_partial: bool = False,
+            dry_run: bool = False,
+    ) -> FileApplyPatchResult:
+        """
+        应用unified diff补丁(可以包含多个文件)
+        1.每个文件单独流式应用并原子替换，未修改的区域逐行复制，不会把整个文件读入内存
+        2.默认任意hunk失败时该文件保持不变，多个文件之间不保证整体原子性
+        """
+        # 1.解析补丁
+        try:
+            file_patches = parse_unified_diff(patch)
+        except PatchError as e:
+            raise BadRequestException(f"补丁格式错误: {str(e)}")
+        if base_dir is not None and not os.path.isdir(base_dir):
+            raise NotFoundException(f"文件夹不存在: {base_dir}")
+
+        # 2.在子线程中依次应用每个文件的补丁(同一文件可能出现多次，需要保持顺序)
+        def async_apply() -> List[FilePatchFileResult]:
+            return [
+                self._apply_file_patch(file_patch, base_dir, strip, max_fuzz, max_offset, allow_partial, dry_run)
+                for file_patch in file_patches
+            ]
+
+        files = await asyncio.to_thread(async_apply)
+        applied_hunks = sum(hunk.applied for file in files for hunk in file.hunks)
+        failed_hunks = sum(not hunk.applied for file in files for hunk in file.hunks)
+        return FileApplyPatchResult(
+            success=all(file.success for file in files),
+            applied_hunks=applied_hunks,
+            failed_hunks=failed_hunks,
+            files=files,
+        )
+
+    async def edit_lines(
+            self,
+            file_path: str,
+            op: str,
+            start_line: int,
+            end_line: Optional[int] = None,
+            content: str = "",
+    ) -> FileLineEditResult:
+        """
+        按行插入/删除/替换文件内容，不需要读取和重建整个文件
+        1.通过行号索引定位编辑区间的字节偏移
+        2.编辑区间之前与之后的内容使用copy_file_range直接复制到同目录临时文件，只写入新内容
+        3.写入完成后原子替换原文件，并平移行号索引
+        """
+        # 1.根据操作类型计算要替换的行区间[start_line, end_line)
+        if op == "insert_at":
+            end_line = start_line
+        elif end_line is None:
+            end_line = start_line + 1
+        elif end_line <= start_line:
+            raise BadRequestException("结束行必须大于起始行")
+        if op == "delete_range":
+            content = ""
+        elif not content:
+            raise BadRequestException(f"{op}操作的内容不能为空")
+
+        # 2.新内容不以换行结尾时自动补充换行
+        data = content.encode("utf-8")
+        if data and not data.endswith((b"\n", b"\r")):
+            data += b"\n"
+
+        if not os.path.isfile(file_path):
+            raise NotFoundException(f"文件不存在: {file_path}")
+
+        # 软链接编辑其指向的文件，写入、行号索引与内容缓存统一使用解析后的路径
+        target = os.path.realpath(file_path)
+
+        def async_edit_lines() -> FileLineEditResult:
+            nonlocal data
+            with open(target, "rb") as src:
+                fd = src.fileno()
+                st = os.fstat(fd)
+
+                # 3.定位起止行的字节偏移
+                start = self.line_index.offset_of(target, fd, st, start_line)
+                if start is None:
+                    raise BadRequestException(f"起始行{start_line}超出文件行数")
+                end = start if end_line == start_line else self.line_index.offset_of(target, fd, st, end_line)
+                if end is None:
+                    raise BadRequestException(f"结束行{end_line}超出文件行数")
+                (start_offset, start_newlines), (end_offset, end_newlines) = start, end
+
+                # 4.在没有换行结尾的最后一行之后追加内容时先补充换行
+                if data and start_offset == st.st_size > 0 and os.pread(fd, 1, start_offset - 1) != b"\n":
+                    data = b"\n" + data
+
+                # 5.复制未修改的前缀、写入新内容、复制未修改的后缀，然后原子替换
+                with AtomicWriter(target, mode="wb", preserve_from=st) as writer:
+                    copy_range(fd, writer.file.fileno(), 0, start_offset)
+                    writer.file.write(data)
+                    writer.file.flush()
+                    copy_range(fd, writer.file.fileno(), end_offset, st.st_size - end_offset)
+
+            # 6.平移行号索引，后续编辑不需要重新扫描
+            self.line_index.update_after_edit(
+                target,
+                st,
+                os.stat(target),
+                start_offset,
+                end_offset,
+                removed_newlines=end_newlines - start_newlines,
+                added_newlines=data.count(b"\n"),
+                added_bytes=len(data),
+            )
+            return FileLineEditResult(
+                file_path=file_path,
+                op=op,
+                start_line=start_line,
+                removed_lines=end_line - start_line,
+                inserted_lines=len(content.splitlines()),
+                bytes_written=len(data),
+            )
+
+        try:
+            return await asyncio.to_thread(async_edit_lines)
+        except BadRequestException:
+            raise
+        except Exception as e:
+            logger.error(f"按行编辑文件失败: {str(e)}", exc_info=True)
+            raise AppException(f"按行编辑文件失败: {str(e)}")
+        finally:
+            # 7.原文件可能已被替换，主动失效内容缓存(通过软链接路径读取的缓存同样失效)
+            self.content_cache.invalidate(target)
+            if target != file_path:
+                self.content_cache.invalidate(file_path)
+
     async def search_in_file(
             self,
             file_path: str,
             regex: str,
             sudo: bool = False,
+            timeout: Optional[float] = None,
     ) -> FileSearchResult:
-        """根据传递的文件路径+匹配规则查询文件内符合的内容"""
-        # 1.调用服务获取对应的文件内容
-        file_read_result = await self.read_file(file_path=file_path, sudo=sudo, max_length=None)
-        content = file_read_result.content
-
-        # 2.将读取的内容拆分成每一行
-        lines = content.splitlines()
-        matches = []
-        line_numbers = []
-
-        # 3.将外部传递的regex转换为正则
+        """
+        根据传递的文件路径+匹配规则查询文件内符合的内容
+        正则在可终止的工作进程中执行，超过时间预算时终止进程并返回已扫描部分的匹配结果(timed_out为True)
+        """
+        # 1.在当前进程中校验正则，语法错误直接返回
         try:
-            pattern = re.compile(regex)
+            re.compile(regex)
         except Exception as e:
             raise BadRequestException(f"传递正则表达式[{regex}]出错: {str(e)}")
 
-        # 4.创建一个异步函数，使用子线程方式执行避免长时间io阻塞
-        def async_matches():
-            nonlocal matches, line_numbers
-            for idx, line in enumerate(lines):
-                if pattern.match(line):
-                    matches.append(line)
-                    line_numbers.append(idx)
+        # 2.非sudo时由工作进程直接读取文件，sudo时先通过特权助手读取内容
+        if sudo:
+            file_read_result = await self.read_file(file_path=file_path, sudo=sudo, max_length=None)
+            kind, source = SOURCE_TEXT, file_read_result.content
+        else:
+            if not os.path.isfile(file_path):
+                logger.error(f"要读取的文件不存在或无权限: {file_path}")
+                raise NotFoundException(f"要读取的文件不存在或无权限: {file_path}")
+            kind, source = SOURCE_PATH, file_path
 
-        # 5.使用asyncio创建子线程并调用
-        await asyncio.to_thread(async_matches)
+        # 3.在工作进程池中执行，等待结果的线程最多占用timeout秒
+        try:
+            outcome = await asyncio.to_thread(
+                self.regex_pool.search, regex, 0, kind, source, timeout or self._regex_timeout,
+            )
+        except RegexWorkerError as e:
+            raise AppException(f"文件内容搜索失败: {str(e)}")
 
         return FileSearchResult(
             file_path=file_path,
-            matches=matches,
-            line_numbers=line_numbers,
+            matches=[line for _, line in outcome.matches],
+            line_numbers=[index for index, _ in outcome.matches],
+            timed_out=outcome.timed_out,
+            scanned_lines=outcome.scanned_lines,
+            total_lines=outcome.total_lines,
         )
 
-    @classmethod
-    async def find_files(cls, dir_path: str, glob_pattern: str) -> FileFindResult:
-        """根据传递的文件夹路径+glob规则查询文件列表"""
+    def _iter_find_entries(
+            self,
+            dir_path: str,
+            glob_pattern: str,
+            max_depth: Optional[int] = None,
+            use_default_ignores: bool = True,
+            ignore_patterns: Optional[List[str]] = None,
+            respect_gitignore: bool = True,
+            cursor: Optional[str] = None,
+    ) -> Iterator[Tuple[str, os.DirEntry]]:
+        """校验查找参数并返回(文件路径, DirEntry)迭代器"""
         # 1.检测下传递进来的目录是否存在
-        if not os.path.exists(dir_path):
+        if not os.path.isdir(dir_path):
             raise NotFoundException(f"当前文件夹不存在: {dir_path}")
 
-        # 2.定义一个异步函数使用asyncio子线程运行避免IO阻塞
-        def async_glob():
-            search_pattern = os.path.join(dir_path, glob_pattern)
-            return glob.glob(search_pattern, recursive=True)
+        # 2.解析分页游标
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except ValueError as e:
+                raise BadRequestException(str(e))
+
+        # 3.绝对路径的glob规则转换为相对当前文件夹的规则，不在当前文件夹之下时拒绝
+        if os.path.isabs(glob_pattern):
+            root = os.path.normpath(os.path.abspath(dir_path))
+            pattern = os.path.normpath(glob_pattern)
+            if pattern != root and not pattern.startswith(root.rstrip(os.sep) + os.sep):
+                raise BadRequestException(f"glob规则不在当前文件夹之下: {glob_pattern}")
+            glob_pattern = pattern[len(root):].lstrip(os.sep) + ("/" if glob_pattern.endswith("/") else "")
+
+        # 4.创建基于scandir的遍历器
+        return iter_glob_entries(
+            root=dir_path,
+            glob_pattern=glob_pattern,
+            max_depth=max_depth,
+            ignore_names=DEFAULT_IGNORE_NAMES if use_default_ignores else (),
+            ignore_patterns=ignore_patterns,
+            respect_gitignore=respect_gitignore,
+            after=after,
+            list_dir=self.file_index.list_dir,
+        )
+
+    async def find_files(
+            self,
+            dir_path: str,
+            glob_pattern: str,
+            max_depth: Optional[int] = None,
+            max_results: Optional[int] = None,
+            use_default_ignores: bool = True,
+            ignore_patterns: Optional[List[str]] = None,
+            respect_gitignore: bool = True,
+            include_metadata: bool = False,
+            cursor: Optional[str] = None,
+    ) -> FileFindResult:
+        """根据传递的文件夹路径+glob规则查询文件列表"""
+        # 1.校验参数并创建遍历器(被监听的目录直接从内存索引读取)
+        entries = self._iter_find_entries(
+            dir_path=dir_path,
+            glob_pattern=glob_pattern,
+            max_depth=max_depth,
+            use_default_ignores=use_default_ignores,
+            ignore_patterns=ignore_patterns,
+            respect_gitignore=respect_gitignore,
+            cursor=cursor,
+        )
+
+        # 2.定义一个同步函数使用asyncio子线程运行避免IO阻塞，多取一条用于判断是否还有下一页
+        def async_walk():
+            files, metadata = [], []
+            last_rel_path = None
+            for rel_path, entry in entries:
+                if max_results is not None and len(files) >= max_results:
+                    return files, metadata, last_rel_path
+                files.append(os.path.join(dir_path, rel_path))
+                if include_metadata:
+                    metadata.append(FileEntry(path=files[-1], **entry_metadata(entry)))
+                last_rel_path = rel_path
+            return files, metadata, None
 
         # 3.创建子线程完成任务
-        files = await asyncio.to_thread(async_glob)
+        files, metadata, next_rel_path = await asyncio.to_thread(async_walk)
 
-        return FileFindResult(dir_path=dir_path, files=files)
+        return FileFindResult(
+            dir_path=dir_path,
+            files=files,
+            entries=metadata if include_metadata else None,
+            truncated=next_rel_path is not None,
+            next_cursor=encode_cursor(next_rel_path) if next_rel_path is not None else None,
+        )
 
-    @classmethod
-    async def upload_file(cls, file: UploadFile, file_path: str) -> FileUploadResult:
+    def stream_find_files(
+            self,
+            dir_path: str,
+            glob_pattern: str,
+            max_depth: Optional[int] = None,
+            max_results: Optional[int] = None,
+            use_default_ignores: bool = True,
+            ignore_patterns: Optional[List[str]] = None,
+            respect_gitignore: bool = True,
+            include_metadata: bool = False,
+            cursor: Optional[str] = None,
+    ) -> Iterator[str]:
+        """以NDJSON的格式逐行输出查找结果，最后一行为汇总信息"""
+        # 1.在开始输出前完成参数校验，确保错误能以正常的JSON响应返回
+        entries = self._iter_find_entries(
+            dir_path=dir_path,
+            glob_pattern=glob_pattern,
+            max_depth=max_depth,
+            use_default_ignores=use_default_ignores,
+            ignore_patterns=ignore_patterns,
+            respect_gitignore=respect_gitignore,
+            cursor=cursor,
+        )
+
+        # 2.定义生成器逐条输出(由Starlette在线程池中迭代)
+        def generate() -> Iterator[str]:
+            count = 0
+            last_rel_path = None
+            next_cursor = None
+            for rel_path, entry in entries:
+                if max_results is not None and count >= max_results:
+                    next_cursor = encode_cursor(last_rel_path)
+                    break
+                item = {"path": os.path.join(dir_path, rel_path)}
+                if include_metadata:
+                    item.update(entry_metadata(entry))
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+                count += 1
+                last_rel_path = rel_path
+            yield json.dumps({"done": True, "count": count, "next_cursor": next_cursor}) + "\n"
+
+        return generate()
+
+    async def list_dir(
+            self,
+            dir_path: str,
+            sort_by: str = "name",
+            reverse: bool = False,
+            pattern: Optional[str] = None,
+            types: Optional[List[str]] = None,
+            show_hidden: bool = False,
+            offset: int = 0,
+            limit: Optional[int] = None,
+    ) -> FileListDirResult:
+        """根据传递的文件夹路径列出子条目及其元数据"""
+        # 1.检测下传递进来的目录是否存在
+        if not os.path.isdir(dir_path):
+            raise NotFoundException(f"当前文件夹不存在: {dir_path}")
+
+        # 2.定义一个同步函数，读取、stat、过滤、排序全部在同一个子线程中批量完成
+        def async_list_dir() -> FileListDirResult:
+            # 3.被监听的目录直接使用内存索引，否则使用scandir读取
+            entries = self.file_index.list_dir(dir_path)
+            if entries is None:
+                try:
+                    with os.scandir(dir_path) as it:
+                        entries = list(it)
+                except OSError as e:
+                    raise AppException(f"读取文件夹失败: {str(e)}")
+
+            # 4.过滤隐藏条目、名字与类型
+            rows = []
+            for entry in entries:
+                if not show_hidden and entry.name.startswith("."):
+                    continue
+                if pattern and not fnmatch.fnmatchcase(entry.name, pattern):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    st = None
+                file_type = stat_file_type(st) if st is not None else entry_type(entry)
+                if types and file_type not in types:
+                    continue
+                rows.append((entry.name, file_type, st))
+
+            # 5.先按名字排序，再按指定字段稳定排序
+            rows.sort(key=lambda row: row[0])
+            if sort_by == "size":
+                rows.sort(key=lambda row: row[2].st_size if row[2] is not None else -1)
+            elif sort_by == "mtime":
+                rows.sort(key=lambda row: row[2].st_mtime if row[2] is not None else 0)
+            elif sort_by == "type":
+                rows.sort(key=lambda row: row[1])
+            if reverse:
+                rows.reverse()
+
+            # 6.分页后组装列式结果，只对本页的软链接读取指向
+            result = FileListDirResult(dir_path=dir_path, total=len(rows), offset=offset)
+            page = rows[offset:offset + limit] if limit is not None else rows[offset:]
+            for name, file_type, st in page:
+                link_target = None
+                if file_type == "symlink":
+                    try:
+                        link_target = os.readlink(os.path.join(dir_path, name))
+                    except OSError:
+                        pass
+                result.names.append(name)
+                result.types.append(file_type)
+                result.sizes.append(st.st_size if st is not None else None)
+                result.mtimes.append(st.st_mtime if st is not None else None)
+                result.modes.append(stat.filemode(st.st_mode) if st is not None else None)
+                result.link_targets.append(link_target)
+            return result
+
+        # 7.使用asyncio创建子线程完成任务
+        return await asyncio.to_thread(async_list_dir)
+
+    async def upload_file(self, file: UploadFile, file_path: str) -> FileUploadResult:
         """根据传递的文件源+路径将文件上传至沙箱"""
         try:
             # 1.定义分块上传，每次只上传8k
@@ -291,6 +1194,1030 @@ class FileService:
         except Exception as e:
             logger.error(f"上传文件到沙箱出错: {str(e)}")
             raise AppException(f"上传文件到沙箱出错: {str(e)}")
+        finally:
+            self.content_cache.invalidate(file_path)
+
+    async def upload_stream(
+            self,
+            file_path: str,
+            chunks: AsyncIterator[bytes],
+            expected_hash: Optional[str] = None,
+            fsync: str = FSYNC_NONE,
+            buffer_size: int = UPLOAD_BUFFER_SIZE,
+    ) -> FileUploadResult:
+        """
+        把请求体的数据流直接写入目标文件，只落盘一次
+        1.数据写入目标文件同目录下的临时文件，全部接收且校验通过后原子替换，中途失败或断开时删除临时文件
+        2.接收的分块合并为buffer_size大小的缓冲区后在工作线程中写入并计算哈希，写入的同时继续接收下一个缓冲区
+        3.expected_hash不为空时使用其算法计算哈希并比对，不一致时放弃写入
+        """
+        # 1.解析预期哈希的算法
+        hash_algorithm = self._hash_algorithm_of(expected_hash)
+        hasher = new_hasher(hash_algorithm)
+
+        # 2.在目标文件(软链接写入其指向的文件)同目录创建临时文件，保留已有文件的权限与属主
+        def open_writer() -> AtomicWriter:
+            os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+            target = os.path.realpath(file_path)
+            try:
+                st = os.stat(target)
+            except FileNotFoundError:
+                st = None
+            atomic_writer = AtomicWriter(target, mode="wb", preserve_from=st, fsync=fsync)
+            atomic_writer.__enter__()
+            return atomic_writer
+
+        def write_buffer(data: bytes, _offset: int) -> None:
+            writer.file.write(data)
+            hasher.update(data)
+
+        try:
+            writer = await asyncio.to_thread(open_writer)
+        except OSError as e:
+            raise BadRequestException(f"上传文件到沙箱出错: {str(e)}")
+
+        # 3.接收数据流，缓冲区写满后交给工作线程写入
+        try:
+            file_size = await pump_stream(chunks, write_buffer, buffer_size)
+
+            # 4.校验哈希，通过后原子替换目标文件
+            content_hash = f"{hash_algorithm}:{hasher.hexdigest()}"
+            if expected_hash is not None and content_hash != expected_hash:
+                raise BadRequestException(f"上传内容校验失败，实际哈希为{content_hash}")
+            await asyncio.to_thread(writer.__exit__, None, None, None)
+        except BaseException as e:
+            # 5.出错(包括客户端断开导致的取消)时删除临时文件
+            await asyncio.to_thread(writer.__exit__, type(e), e, e.__traceback__)
+            if isinstance(e, AppException) or not isinstance(e, Exception):
+                raise
+            logger.error(f"上传文件到沙箱出错: {str(e)}")
+            raise AppException(f"上传文件到沙箱出错: {str(e)}")
+        finally:
+            self.content_cache.invalidate(file_path)
+
+        # 6.缓存新文件的哈希，后续比对或校验无需重新读取
+        try:
+            self.hash_cache.store(os.stat(file_path), content_hash, hash_algorithm)
+        except OSError:
+            pass
+        return FileUploadResult(
+            file_path=file_path,
+            file_size=file_size,
+            success=True,
+            content_hash=content_hash,
+        )
+
+    @classmethod
+    def _session_result(cls, session: UploadSession) -> FileUploadSessionResult:
+        """把上传会话转换为返回结果"""
+        return FileUploadSessionResult(
+            session_id=session.session_id,
+            file_path=session.file_path,
+            total_size=session.total_size,
+            received_bytes=session.received_bytes,
+            missing_ranges=[FileUploadRange(start=start, end=end) for start, end in session.missing_ranges()],
+            state=session.state,
+        )
+
+    async def init_upload_session(
+            self,
+            file_path: str,
+            total_size: int,
+            expected_hash: Optional[str] = None,
+            fsync: str = FSYNC_NONE,
+    ) -> FileUploadSessionResult:
+        """创建分片上传会话，在目标文件同目录创建按总大小预分配的临时文件"""
+        self._hash_algorithm_of(expected_hash)
+        try:
+            session = await asyncio.to_thread(
+                self.upload_sessions.create,
+                file_path,
+                total_size,
+                expected_hash,
+                fsync,
+            )
+        except OSError as e:
+            raise BadRequestException(f"创建上传会话失败: {str(e)}")
+        return self._session_result(session)
+
+    async def upload_part(
+            self,
+            session_id: str,
+            offset: int,
+            chunks: AsyncIterator[bytes],
+            part_hash: Optional[str] = None,
+    ) -> FileUploadPartResult:
+        """
+        把请求体写入上传会话的指定偏移，同一会话的多个分片可以乱序、并行上传
+        1.数据边接收边通过pwrite写入预分配的临时文件，分片完整写入后才记为已接收，中断的分片重新上传即可
+        2.part_hash不为空时校验分片内容，不一致时该分片不会被记为已接收
+        """
+        session = self.upload_sessions.get(session_id)
+        hasher = new_hasher(self._hash_algorithm_of(part_hash)) if part_hash is not None else None
+        if offset > session.total_size:
+            raise BadRequestException(f"分片偏移{offset}超出文件总大小{session.total_size}")
+
+        def write_part(data: bytes, relative_offset: int) -> None:
+            session.write(data, offset + relative_offset)
+            if hasher is not None:
+                hasher.update(data)
+
+        # 1.持有会话引用期间写入分片，会话不会被关闭
+        session.acquire()
+        try:
+            length = await pump_stream(chunks, write_part)
+            if hasher is not None:
+                actual_hash = f"{hasher.name}:{hasher.hexdigest()}"
+                if actual_hash != part_hash:
+                    raise BadRequestException(f"分片内容校验失败，实际哈希为{actual_hash}")
+            session.mark_received(offset, offset + length)
+        except OSError as e:
+            logger.error(f"写入上传分片出错: {str(e)}")
+            raise AppException(f"写入上传分片出错: {str(e)}")
+        finally:
+            session.release()
+
+        # 2.返回会话的接收进度
+        received_bytes = session.received_bytes
+        return FileUploadPartResult(
+            session_id=session_id,
+            offset=offset,
+            length=length,
+            received_bytes=received_bytes,
+            complete=received_bytes == session.total_size,
+        )
+
+    async def get_upload_session(self, session_id: str) -> FileUploadSessionResult:
+        """查询上传会话的进度与缺失区间，用于断点续传"""
+        return self._session_result(self.upload_sessions.get(session_id))
+
+    async def complete_upload_session(self, session_id: str) -> FileUploadResult:
+        """
+        合并上传会话
+        1.所有区间都已接收后，如果创建会话时传递了expected_hash则校验完整文件的哈希
+        2.校验不通过时清空已接收区间，需要重新上传全部内容
+        3.校验通过后按落盘策略同步并原子替换目标文件，保留原文件的权限与属主
+        """
+        session = self.upload_sessions.get(session_id)
+        session.begin_complete()
+
+        def async_complete() -> Optional[str]:
+            # 1.检查是否还有缺失的区间
+            missing = session.missing_ranges()
+            if missing:
+                raise BadRequestException(
+                    f"还有{sum(end - start for start, end in missing)}字节未上传，"
+                    f"第一个缺失区间为[{missing[0][0]}, {missing[0][1]})"
+                )
+
+            # 2.校验完整文件的哈希(重命名不会改变文件签名，哈希缓存对目标文件仍然有效)
+            content_hash = None
+            if session.expected_hash is not None:
+                content_hash, _ = self.hash_cache.hash_file(
+                    session.temp_path,
+                    self._hash_algorithm_of(session.expected_hash),
+                )
+                if content_hash != session.expected_hash:
+                    session.reset_received()
+                    raise BadRequestException(f"上传内容校验失败，实际哈希为{content_hash}，需要重新上传")
+
+            # 3.原子替换目标文件
+            try:
+                st = os.stat(session.target)
+            except FileNotFoundError:
+                st = None
+            session.commit(st)
+            return content_hash
+
+        try:
+            content_hash = await asyncio.to_thread(async_complete)
+        except BaseException as e:
+            session.cancel_complete()
+            if isinstance(e, AppException) or not isinstance(e, Exception):
+                raise
+            logger.error(f"合并上传会话出错: {str(e)}")
+            raise AppException(f"合并上传会话出错: {str(e)}")
+        finally:
+            self.content_cache.invalidate(session.file_path)
+
+        session.finish()
+        self.upload_sessions.remove(session_id)
+        return FileUploadResult(
+            file_path=session.file_path,
+            file_size=session.total_size,
+            success=True,
+            content_hash=content_hash,
+        )
+
+    async def abort_upload_session(self, session_id: str) -> FileUploadSessionResult:
+        """取消上传会话并删除临时文件"""
+        session = self.upload_sessions.get(session_id)
+        await asyncio.to_thread(session.abort)
+        self.upload_sessions.remove(session_id)
+        return self._session_result(session)
+
+    async def import_archive(
+            self,
+            dir_path: str,
+            chunks: AsyncIterator[bytes],
+            strip_components: int = 0,
+    ) -> FileArchiveImportResult:
+        """
+        把请求体中的tar/tar.gz/tar.zst归档边接收边解压到dir_path，不需要先把归档保存到磁盘
+        1.协程负责接收数据并放入有界队列，工作线程从队列读取并逐个条目解压，队列满时暂停接收
+        2.路径越界、指向目录之外的链接、设备文件等条目会被跳过并在结果中列出
+        """
+        chunk_queue = ChunkQueue()
+
+        def async_extract():
+            try:
+                return extract_tar_stream(
+                    QueueReader(chunk_queue),
+                    dir_path,
+                    strip_components=strip_components,
+                    on_file=self.content_cache.invalidate,
+                )
+            finally:
+                # 解压结束(包括出错)后通知接收方停止
+                chunk_queue.cancel()
+
+        # 1.启动解压线程，同时把请求体送入队列
+        extract_task = asyncio.ensure_future(asyncio.to_thread(async_extract))
+        try:
+            try:
+                await pump_stream(chunks, lambda data, _offset: chunk_queue.put(data), CHUNK_SIZE)
+                await asyncio.to_thread(chunk_queue.put, END_OF_STREAM)
+            except StreamCancelled:
+                # 解压线程提前结束，结果以解压线程为准
+                pass
+            except BaseException:
+                chunk_queue.cancel()
+                await asyncio.gather(extract_task, return_exceptions=True)
+                raise
+            stats = await extract_task
+        except (tarfile.TarError, EOFError, ValueError) as e:
+            raise BadRequestException(f"归档解析失败: {str(e)}")
+        except OSError as e:
+            logger.error(f"解压归档出错: {str(e)}")
+            raise AppException(f"解压归档出错: {str(e)}")
+
+        return FileArchiveImportResult(
+            dir_path=dir_path,
+            file_count=stats.file_count,
+            dir_count=stats.dir_count,
+            link_count=stats.link_count,
+            total_bytes=stats.total_bytes,
+            skipped=[FileArchiveSkippedEntry(path=path, reason=reason) for path, reason in stats.skipped],
+        )
+
+    def export_archive(
+            self,
+            dir_path: str,
+            archive_format: str = "tar.gz",
+            include: Optional[List[str]] = None,
+            exclude: Optional[List[str]] = None,
+            use_default_ignores: bool = False,
+    ) -> AsyncIterator[bytes]:
+        """
+        把文件夹打包为归档并以数据流的形式返回，归档边生成边发送，不在磁盘上暂存
+        工作线程打包并写入有界队列，客户端断开后打包线程会在下一次写入时停止
+        """
+        # 1.在开始输出前完成参数校验，确保错误能以正常的JSON响应返回
+        if not os.path.isdir(dir_path):
+            raise NotFoundException(f"该文件夹不存在: {dir_path}")
+        if archive_format not in ARCHIVE_FORMATS:
+            raise BadRequestException(f"不支持的归档格式: {archive_format}")
+        if archive_format == "tar.zst" and not ZSTD_AVAILABLE:
+            raise BadRequestException("当前环境不支持zstd压缩")
+        chunk_queue = ChunkQueue()
+
+        def async_pack() -> None:
+            writer = QueueWriter(chunk_queue)
+            try:
+                entries = iter_archive_entries(
+                    dir_path,
+                    include=include,
+                    exclude=exclude,
+                    ignore_names=DEFAULT_IGNORE_NAMES if use_default_ignores else (),
+                )
+                write_tar_stream(writer, entries, archive_format)
+                writer.finish()
+            except StreamCancelled:
+                pass
+            except Exception as e:
+                logger.error(f"导出归档出错: {str(e)}", exc_info=True)
+                chunk_queue.cancel()
+
+        # 2.逐块输出打包线程生成的数据
+        async def generate() -> AsyncIterator[bytes]:
+            packer = asyncio.ensure_future(asyncio.to_thread(async_pack))
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.to_thread(chunk_queue.get)
+                    except StreamCancelled:
+                        raise AppException(f"导出归档出错: {dir_path}")
+                    if chunk is END_OF_STREAM:
+                        break
+                    yield chunk
+                await packer
+            finally:
+                chunk_queue.cancel()
+
+        return generate()
+
+    async def file_signature(self, file_path: str, block_size: Optional[int] = None) -> FileSignatureResult:
+        """
+        计算文件的块签名(每块adler32弱校验+blake2b强校验)，客户端据此生成把该文件更新为本地版本的增量
+        block_size为空时根据文件大小自动选择
+        """
+
+        def async_signature() -> FileSignatureResult:
+            try:
+                fd = os.open(file_path, os.O_RDONLY | os.O_CLOEXEC)
+            except FileNotFoundError:
+                raise NotFoundException(f"该文件不存在: {file_path}")
+            try:
+                st = os.fstat(fd)
+                if not stat.S_ISREG(st.st_mode):
+                    raise BadRequestException(f"该路径不是文件: {file_path}")
+                size = block_size or default_block_size(st.st_size)
+                signature = compute_signature(fd, st.st_size, size)
+            finally:
+                os.close(fd)
+            return FileSignatureResult(
+                file_path=file_path,
+                file_size=st.st_size,
+                block_size=size,
+                block_count=-(-st.st_size // size),
+                signature=base64.b64encode(signature).decode("ascii"),
+            )
+
+        try:
+            return await asyncio.to_thread(async_signature)
+        except AppException:
+            raise
+        except OSError as e:
+            logger.error(f"计算文件签名出错: {str(e)}")
+            raise AppException(f"计算文件签名出错: {str(e)}")
+
+    async def apply_file_delta(
+            self,
+            file_path: str,
+            chunks: AsyncIterator[bytes],
+            expected_hash: Optional[str] = None,
+            fsync: str = FSYNC_NONE,
+    ) -> FileDeltaApplyResult:
+        """
+        把请求体中的增量应用到沙箱文件，重建出新版本并原子替换
+        1.增量由客户端根据file_signature返回的签名生成，COPY指令从当前文件复制(优先copy_file_range)，LITERAL指令直接写入
+        2.请求体边接收边在工作线程中应用，新内容写入同目录的临时文件，出错或断开时原文件保持不变
+        3.expected_hash不为空时校验重建结果的哈希，不一致(例如生成签名后文件又被修改)时放弃写入
+        """
+        hash_algorithm = self._hash_algorithm_of(expected_hash)
+
+        def async_apply(source: QueueReader) -> FileDeltaApplyResult:
+            target = os.path.realpath(file_path)
+            with self._write_lock(file_path):
+                # 1.打开当前文件作为基准
+                try:
+                    base_fd = os.open(target, os.O_RDONLY | os.O_CLOEXEC)
+                except FileNotFoundError:
+                    raise NotFoundException(f"该文件不存在: {file_path}")
+                try:
+                    st = os.fstat(base_fd)
+                    if not stat.S_ISREG(st.st_mode):
+                        raise BadRequestException(f"该路径不是文件: {file_path}")
+
+                    # 2.应用增量写入临时文件，校验通过后原子替换
+                    content_hash = None
+                    with AtomicWriter(target, mode="wb", preserve_from=st, fsync=fsync) as writer:
+                        stats = apply_delta(source, base_fd, st.st_size, writer.file)
+                        if expected_hash is not None:
+                            # 重命名不会改变文件签名，哈希缓存对目标文件仍然有效
+                            content_hash, _ = self.hash_cache.hash_file(writer.temp_path, hash_algorithm)
+                            if content_hash != expected_hash:
+                                raise BadRequestException(f"增量应用结果校验失败，实际哈希为{content_hash}")
+                        file_size = os.fstat(writer.file.fileno()).st_size
+                finally:
+                    os.close(base_fd)
+            return FileDeltaApplyResult(
+                file_path=file_path,
+                file_size=file_size,
+                copied_bytes=stats.copied_bytes,
+                literal_bytes=stats.literal_bytes,
+                content_hash=content_hash,
+            )
+
+        chunk_queue = ChunkQueue()
+
+        def async_consume() -> FileDeltaApplyResult:
+            try:
+                return async_apply(QueueReader(chunk_queue))
+            finally:
+                chunk_queue.cancel()
+
+        # 1.启动应用增量的线程，同时把请求体送入队列
+        apply_task = asyncio.ensure_future(asyncio.to_thread(async_consume))
+        try:
+            try:
+                await pump_stream(chunks, lambda data, _offset: chunk_queue.put(data), CHUNK_SIZE)
+                await asyncio.to_thread(chunk_queue.put, END_OF_STREAM)
+            except StreamCancelled:
+                pass
+            except BaseException:
+                chunk_queue.cancel()
+                await asyncio.gather(apply_task, return_exceptions=True)
+                raise
+            return await apply_task
+        except AppException:
+            raise
+        except (DeltaError, EOFError) as e:
+            raise BadRequestException(f"增量应用失败: {str(e)}")
+        except OSError as e:
+            logger.error(f"应用增量出错: {str(e)}")
+            raise AppException(f"应用增量出错: {str(e)}")
+        finally:
+            self.content_cache.invalidate(file_path)
+
+    def file_delta(self, file_path: str, signature: str) -> AsyncIterator[bytes]:
+        """
+        根据客户端文件的块签名，生成把客户端文件更新为沙箱文件当前版本的增量，以数据流的形式返回
+        未修改的块只传输COPY指令，只有修改过的字节才会以LITERAL指令传输
+        """
+        # 1.在开始输出前完成参数校验，确保错误能以正常的JSON响应返回
+        try:
+            parsed = Signature.from_base64(signature)
+        except DeltaError as e:
+            raise BadRequestException(f"签名解析失败: {str(e)}")
+        if not os.path.exists(file_path):
+            raise NotFoundException(f"该文件不存在: {file_path}")
+        if not os.path.isfile(file_path):
+            raise BadRequestException(f"该路径不是文件: {file_path}")
+        chunk_queue = ChunkQueue()
+
+        def async_generate() -> None:
+            writer = QueueWriter(chunk_queue)
+            try:
+                with open(file_path, "rb") as f:
+                    generate_delta(f.fileno(), os.fstat(f.fileno()).st_size, parsed, writer.write)
+                writer.finish()
+            except StreamCancelled:
+                pass
+            except Exception as e:
+                logger.error(f"生成增量出错: {str(e)}", exc_info=True)
+                chunk_queue.cancel()
+
+        # 2.逐块输出生成线程产生的增量
+        async def generate() -> AsyncIterator[bytes]:
+            generator = asyncio.ensure_future(asyncio.to_thread(async_generate))
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.to_thread(chunk_queue.get)
+                    except StreamCancelled:
+                        raise AppException(f"生成增量出错: {file_path}")
+                    if chunk is END_OF_STREAM:
+                        break
+                    yield chunk
+                await generator
+            finally:
+                chunk_queue.cancel()
+
+        return generate()
+
+    def follow_file(self, file_path: str, offset: Optional[int] = None, lines: int = 10) -> AsyncIterator[str]:
+        """
+        跟踪持续增长的文件(类似tail -F)，以SSE流的形式推送新增的内容
+        1.从offset(优先)或者最后lines行开始，之后只读取新增的字节，不会重复读取整个文件
+        2.通过inotify监听文件与所在文件夹，无法使用inotify时按固定间隔stat轮询
+        3.文件被截断时推送truncated并从头读取；被轮转(路径指向了新文件)时先读完旧文件，再推送rotated并切换到新文件
+        """
+        # 1.在开始输出前完成参数校验，确保错误能以正常的JSON响应返回
+        if not os.path.exists(file_path):
+            raise NotFoundException(f"该文件不存在: {file_path}")
+        if not os.path.isfile(file_path):
+            raise BadRequestException(f"该路径不是文件: {file_path}")
+        follower = FileFollower(file_path, self._follow_max_read)
+        try:
+            start, size, truncated = follower.open(offset, lines)
+        except OSError as e:
+            raise BadRequestException(f"打开文件失败: {str(e)}")
+        dir_path, name = os.path.split(os.path.abspath(file_path))
+
+        # 2.推送初始位置，之后循环等待文件变化并推送新增的内容
+        async def generate() -> AsyncIterator[str]:
+            loop = asyncio.get_running_loop()
+            wake = asyncio.Event()
+            file_wd = self.follow_watcher.subscribe(file_path, FOLLOW_FILE_EVENTS, wake)
+            dir_wd = self.follow_watcher.subscribe(dir_path, FOLLOW_DIR_EVENTS, wake, name)
+            polling = file_wd is None or dir_wd is None
+            try:
+                yield sse_message("open", start, {
+                    "file_path": file_path,
+                    "offset": start,
+                    "size": size,
+                    "mode": "poll" if polling else "inotify",
+                })
+                if truncated:
+                    yield sse_message(FOLLOW_TRUNCATED, 0, {"offset": 0})
+                last_sent = loop.time()
+                while True:
+                    wake.clear()
+                    events, more, switched = await asyncio.to_thread(follower.check)
+                    if switched and not polling:
+                        # 轮转后原watch仍在旧文件上，改为监听新文件
+                        self.follow_watcher.unsubscribe(file_wd, wake)
+                        file_wd = self.follow_watcher.subscribe(file_path, FOLLOW_FILE_EVENTS, wake)
+                    for event in events:
+                        payload = {"offset": event.offset}
+                        if event.data:
+                            payload["data"] = event.data
+                        yield sse_message(event.event, event.offset, payload)
+                    if events:
+                        last_sent = loop.time()
+                    if more:
+                        continue
+
+                    # 3.inotify模式下超时只用于心跳与兜底检查(部分文件系统不会产生事件)
+                    timeout = self._follow_poll_interval if polling else self._follow_heartbeat
+                    try:
+                        await asyncio.wait_for(wake.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        if loop.time() - last_sent >= self._follow_heartbeat:
+                            yield ": keepalive\n\n"
+                            last_sent = loop.time()
+            finally:
+                self.follow_watcher.unsubscribe(file_wd, wake)
+                self.follow_watcher.unsubscribe(dir_wd, wake)
+                follower.close()
+
+        return generate()
+
+    async def missing_blobs(self, hashes: List[str]) -> FileBlobMissingResult:
+        """查询blob存储中不存在的内容哈希，客户端只需上传这些blob"""
+
+        def async_missing() -> List[str]:
+            missing = []
+            for content_hash in dict.fromkeys(hashes):
+                if not self.blob_store.exists(content_hash):
+                    missing.append(content_hash)
+            return missing
+
+        for content_hash in hashes:
+            try:
+                parse_blob_hash(content_hash)
+            except ValueError as e:
+                raise BadRequestException(str(e))
+        missing = await asyncio.to_thread(async_missing)
+        return FileBlobMissingResult(missing=missing, present=len(set(hashes)) - len(missing))
+
+    async def upload_blob(self, content_hash: str, chunks: AsyncIterator[bytes]) -> FileBlobUploadResult:
+        """
+        把请求体保存为blob
+        1.blob已存在时直接返回，不读取请求体
+        2.数据写入存储的临时文件并同时计算哈希，与content_hash一致才发布为blob，超出容量时淘汰最久未使用的blob
+        """
+        # 1.解析哈希并检查blob是否已存在
+        try:
+            hash_algorithm, _ = parse_blob_hash(content_hash)
+            blob_path = self.blob_store.blob_path(content_hash)
+        except ValueError as e:
+            raise BadRequestException(str(e))
+        try:
+            st = await asyncio.to_thread(os.stat, blob_path)
+            return FileBlobUploadResult(content_hash=content_hash, size=st.st_size, existed=True)
+        except FileNotFoundError:
+            pass
+
+        # 2.边接收边写入临时文件并计算哈希
+        hasher = new_hasher(hash_algorithm)
+        try:
+            fd, temp_path = await asyncio.to_thread(self.blob_store.new_temp)
+        except OSError as e:
+            logger.error(f"创建blob临时文件出错: {str(e)}")
+            raise AppException(f"创建blob临时文件出错: {str(e)}")
+        temp_file = os.fdopen(fd, "wb")
+
+        def write_buffer(data: bytes, _offset: int) -> None:
+            temp_file.write(data)
+            hasher.update(data)
+
+        try:
+            size = await pump_stream(chunks, write_buffer)
+            await asyncio.to_thread(temp_file.close)
+
+            # 3.校验哈希后发布
+            actual_hash = f"{hash_algorithm}:{hasher.hexdigest()}"
+            if actual_hash != content_hash:
+                raise BadRequestException(f"blob内容校验失败，实际哈希为{actual_hash}")
+            existed = not await asyncio.to_thread(self.blob_store.publish, temp_path, content_hash)
+        except BaseException as e:
+            temp_file.close()
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            if isinstance(e, AppException) or not isinstance(e, Exception):
+                raise
+            logger.error(f"上传blob出错: {str(e)}")
+            raise AppException(f"上传blob出错: {str(e)}")
+
+        # 4.缓存blob的哈希，物化前的校验无需重新读取；超出容量时淘汰
+        try:
+            self.hash_cache.store(os.stat(blob_path), content_hash, hash_algorithm)
+            await asyncio.to_thread(self.blob_store.evict)
+        except OSError as e:
+            logger.warning(f"淘汰blob出错: {str(e)}")
+        return FileBlobUploadResult(content_hash=content_hash, size=size, existed=existed)
+
+    def _materialize_blob(self, item: FileBlobMaterializeItem, mode: str) -> FileBlobMaterializeItemResult:
+        """物化单个blob，物化前校验blob内容(签名未变化时直接使用哈希缓存)，损坏的blob会被删除"""
+        result = FileBlobMaterializeItemResult(content_hash=item.content_hash, file_path=item.file_path, success=False)
+        try:
+            # 1.校验blob
+            hash_algorithm, _ = parse_blob_hash(item.content_hash)
+            blob_path = self.blob_store.blob_path(item.content_hash)
+            try:
+                actual_hash, _ = self.hash_cache.hash_file(blob_path, hash_algorithm)
+            except FileNotFoundError:
+                result.error = "blob不存在，需要先上传"
+                return result
+            if actual_hash != item.content_hash:
+                self.blob_store.remove(item.content_hash)
+                result.error = "blob内容已损坏并被删除，需要重新上传"
+                return result
+
+            # 2.物化到目标路径
+            with self._write_lock(item.file_path):
+                result.method = self.blob_store.materialize(blob_path, item.file_path, mode)
+            result.success = True
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            self.content_cache.invalidate(item.file_path)
+        return result
+
+    async def materialize_blobs(
+            self,
+            items: List[FileBlobMaterializeItem],
+            mode: str = "copy",
+    ) -> FileBlobMaterializeResult:
+        """使用批量线程池并发把blob物化到目标路径，单个条目失败不影响其他条目"""
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._batch_executor, self._materialize_blob, item, mode) for item in items)
+        )
+        succeeded = sum(1 for result in results if result.success)
+
+        return FileBlobMaterializeResult(items=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+    @classmethod
+    def _operation_result(cls, operation: FileOperation) -> FileOperationResult:
+        """把操作进度转换为返回结果"""
+        return FileOperationResult(
+            operation_id=operation.operation_id,
+            op=operation.op,
+            src_path=operation.src_path,
+            dst_path=operation.dst_path,
+            state=operation.state,
+            total_entries=operation.total_entries,
+            done_entries=operation.done_entries,
+            failed_entries=operation.failed_entries,
+            total_bytes=operation.total_bytes,
+            done_bytes=operation.done_bytes,
+            errors=list(operation.errors),
+            started_at=operation.started_at,
+            finished_at=operation.finished_at,
+        )
+
+    async def _run_operation(self, operation: FileOperation, func, wait: bool) -> FileOperationResult:
+        """
+        在工作线程中执行操作
+        1.wait为True时等待操作结束后返回最终结果，否则立即返回操作id，通过get_operation查询进度
+        2.等待期间客户端断开不会中断操作，需要中断时调用cancel_operation
+        """
+
+        def async_run() -> None:
+            try:
+                func(operation)
+            except BaseException as e:
+                operation.finish(e)
+                if not isinstance(e, Exception):
+                    raise
+            else:
+                operation.finish()
+
+        task = asyncio.ensure_future(asyncio.to_thread(async_run))
+        self._operation_tasks.add(task)
+        task.add_done_callback(self._operation_tasks.discard)
+        if wait:
+            await asyncio.shield(task)
+        return self._operation_result(operation)
+
+    @classmethod
+    def _check_operation_paths(cls, src_path: str, dst_path: str, overwrite: bool) -> bool:
+        """校验复制/移动的源路径与目标路径，返回源路径是否为文件夹"""
+        if not os.path.lexists(src_path):
+            raise NotFoundException(f"源路径不存在: {src_path}")
+        is_dir = os.path.isdir(src_path)
+        if os.path.lexists(dst_path):
+            if not overwrite:
+                raise ConflictException(f"目标路径已存在: {dst_path}")
+            if is_dir != os.path.isdir(dst_path):
+                raise BadRequestException(f"源路径与目标路径的类型不一致(文件/文件夹): {dst_path}")
+        if is_dir:
+            src_real, dst_real = os.path.realpath(src_path), os.path.realpath(dst_path)
+            if dst_real == src_real or dst_real.startswith(src_real.rstrip(os.sep) + os.sep):
+                raise BadRequestException(f"不能把文件夹复制或移动到其自身内部: {dst_path}")
+        return is_dir
+
+    async def copy_path(
+            self,
+            src_path: str,
+            dst_path: str,
+            overwrite: bool = False,
+            preserve_metadata: bool = True,
+            wait: bool = True,
+    ) -> FileOperationResult:
+        """
+        复制文件或文件夹(不启动子进程)
+        1.文件数据通过copy_file_range/sendfile在内核中复制，每个文件写入临时文件后原子替换
+        2.文件夹先扫描再由多个工作线程并行复制文件，进度可以通过操作id查询
+        3.overwrite为True时目标文件被替换、目标文件夹与源文件夹合并
+        """
+        is_dir = await asyncio.to_thread(self._check_operation_paths, src_path, dst_path, overwrite)
+        operation = self.file_operations.create("copy", src_path, dst_path)
+
+        def async_copy(op: FileOperation) -> None:
+            if is_dir:
+                copy_tree(src_path, dst_path, op, self._copy_executor, self._copy_workers, preserve_metadata)
+            else:
+                st = os.stat(src_path)
+                op.add_total(1, st.st_size)
+                os.makedirs(os.path.dirname(os.path.abspath(dst_path)), exist_ok=True)
+                op.advance(1, copy_file(src_path, dst_path, preserve_metadata, st))
+            self.content_cache.invalidate(dst_path)
+
+        return await self._run_operation(operation, async_copy, wait)
+
+    async def move_path(
+            self,
+            src_path: str,
+            dst_path: str,
+            overwrite: bool = False,
+            wait: bool = True,
+    ) -> FileOperationResult:
+        """
+        移动文件或文件夹
+        1.同一文件系统内直接重命名，目标文件被原子替换；目标文件夹已存在时先删除
+        2.跨文件系统时先并行复制(保留元数据)，全部成功后再删除源路径
+        3.软链接(包括指向文件夹的软链接)只移动链接本身
+        """
+        is_dir = await asyncio.to_thread(self._check_operation_paths, src_path, dst_path, overwrite)
+        operation = self.file_operations.create("move", src_path, dst_path)
+
+        def async_move(op: FileOperation) -> None:
+            os.makedirs(os.path.dirname(os.path.abspath(dst_path)), exist_ok=True)
+            if os.path.islink(dst_path):
+                os.unlink(dst_path)
+            elif is_dir and os.path.lexists(dst_path):
+                remove_tree(dst_path, op, self._copy_executor, self._copy_workers)
+                if op.failed_entries:
+                    return
+            try:
+                os.replace(src_path, dst_path)
+                op.add_total(1)
+                op.advance()
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # 跨文件系统：复制后删除源路径，软链接作为单个条目复制链接本身，不会跟随到其指向的内容
+                if os.path.islink(src_path):
+                    op.add_total(1)
+                    copy_symlink(src_path, dst_path, True)
+                    os.unlink(src_path)
+                    op.advance()
+                elif is_dir:
+                    copy_tree(src_path, dst_path, op, self._copy_executor, self._copy_workers)
+                    if not op.failed_entries:
+                        remove_tree(src_path, op, self._copy_executor, self._copy_workers)
+                else:
+                    st = os.stat(src_path)
+                    op.add_total(1, st.st_size)
+                    op.advance(1, copy_file(src_path, dst_path, True, st))
+                    os.unlink(src_path)
+            finally:
+                self.content_cache.invalidate(src_path)
+                self.content_cache.invalidate(dst_path)
+
+        return await self._run_operation(operation, async_move, wait)
+
+    async def remove_dir(self, dir_path: str, wait: bool = True) -> FileOperationResult:
+        """递归删除文件夹(不启动子进程)，文件由多个工作线程并行删除，软链接只删除链接本身"""
+        if not os.path.lexists(dir_path):
+            raise NotFoundException(f"当前文件夹不存在: {dir_path}")
+        if os.path.islink(dir_path) or not os.path.isdir(dir_path):
+            raise BadRequestException(f"该路径不是文件夹，请使用删除文件接口: {dir_path}")
+        if os.path.realpath(dir_path) == os.sep:
+            raise BadRequestException("不能删除根目录")
+        operation = self.file_operations.create("rmtree", dir_path)
+
+        def async_remove(op: FileOperation) -> None:
+            remove_tree(dir_path, op, self._copy_executor, self._copy_workers)
+
+        return await self._run_operation(operation, async_remove, wait)
+
+    async def make_dir(self, dir_path: str, parents: bool = True, exist_ok: bool = True) -> FileMkdirResult:
+        """创建文件夹，parents为True时同时创建不存在的父文件夹"""
+
+        def async_mkdir() -> bool:
+            try:
+                if parents:
+                    os.makedirs(dir_path)
+                else:
+                    os.mkdir(dir_path)
+                return True
+            except FileExistsError:
+                if exist_ok and os.path.isdir(dir_path):
+                    return False
+                raise ConflictException(f"该路径已存在: {dir_path}")
+            except FileNotFoundError:
+                raise NotFoundException(f"父文件夹不存在: {os.path.dirname(dir_path)}")
+
+        try:
+            created = await asyncio.to_thread(async_mkdir)
+        except AppException:
+            raise
+        except OSError as e:
+            raise AppException(f"创建文件夹{dir_path}失败: {str(e)}")
+        return FileMkdirResult(dir_path=dir_path, created=created)
+
+    async def get_operation(self, operation_id: str) -> FileOperationResult:
+        """查询复制/移动/删除操作的进度"""
+        return self._operation_result(self.file_operations.get(operation_id))
+
+    async def cancel_operation(self, operation_id: str) -> FileOperationResult:
+        """取消进行中的操作，已经完成的条目不会回滚"""
+        operation = self.file_operations.get(operation_id)
+        operation.cancel()
+        return self._operation_result(operation)
+
+    @classmethod
+    def _snapshot_info(cls, info: SnapshotInfo) -> FileSnapshotInfo:
+        """把快照概要转换为返回结果"""
+        return FileSnapshotInfo(**info._asdict())
+
+    async def create_snapshot(
+            self,
+            dir_path: str,
+            label: Optional[str] = None,
+            exclude: Optional[List[str]] = None,
+    ) -> FileSnapshotInfo:
+        """
+        为文件夹创建增量快照
+        1.与上一个快照相比未变化的文件硬链接到上一个快照，只复制变化的文件，变化很少时创建快照只需扫描与创建链接
+        2.exclude为gitignore语法的排除规则，例如node_modules/，恢复时被排除的条目保持不变
+        """
+        if not os.path.isdir(dir_path):
+            raise NotFoundException(f"当前文件夹不存在: {dir_path}")
+
+        def async_create() -> SnapshotInfo:
+            with self.snapshot_store.lock(dir_path):
+                return self.snapshot_store.create(
+                    dir_path,
+                    label,
+                    exclude,
+                    self._copy_executor,
+                    self._copy_workers,
+                    FileOperation("snapshot", dir_path),
+                )
+
+        try:
+            info = await asyncio.to_thread(async_create)
+        except AppException:
+            raise
+        except OSError as e:
+            logger.error(f"创建快照出错: {str(e)}")
+            raise AppException(f"创建快照出错: {str(e)}")
+        return self._snapshot_info(info)
+
+    async def list_snapshots(self, dir_path: str) -> FileSnapshotListResult:
+        """按创建时间顺序列出文件夹的快照及其大小"""
+        infos = await asyncio.to_thread(self.snapshot_store.list, dir_path)
+        return FileSnapshotListResult(
+            dir_path=dir_path,
+            snapshots=[self._snapshot_info(info) for info in infos],
+        )
+
+    async def restore_snapshot(
+            self,
+            dir_path: str,
+            snapshot_id: str,
+            delete_extra: bool = True,
+    ) -> FileSnapshotRestoreResult:
+        """
+        把文件夹恢复为快照时的状态
+        1.只复制大小、修改时间或权限与快照不一致的文件，未变化的文件不会被读取或写入
+        2.delete_extra为True时删除快照之后新增的文件与文件夹
+        """
+        if not os.path.isdir(dir_path):
+            raise NotFoundException(f"当前文件夹不存在: {dir_path}")
+
+        def async_restore():
+            with self.snapshot_store.lock(dir_path):
+                return self.snapshot_store.restore(
+                    dir_path,
+                    snapshot_id,
+                    delete_extra,
+                    self._copy_executor,
+                    self._copy_workers,
+                    FileOperation("restore", dir_path),
+                )
+
+        try:
+            stats = await asyncio.to_thread(async_restore)
+        except AppException:
+            raise
+        except OSError as e:
+            logger.error(f"恢复快照出错: {str(e)}")
+            raise AppException(f"恢复快照出错: {str(e)}")
+
+        return FileSnapshotRestoreResult(
+            dir_path=dir_path,
+            snapshot_id=snapshot_id,
+            **stats._asdict(),
+        )
+
+    async def delete_snapshot(self, dir_path: str, snapshot_id: str) -> FileSnapshotInfo:
+        """删除快照，其他快照共享的文件不受影响"""
+
+        def async_delete() -> SnapshotInfo:
+            with self.snapshot_store.lock(dir_path):
+                return self.snapshot_store.delete(dir_path, snapshot_id)
+
+        try:
+            info = await asyncio.to_thread(async_delete)
+        except AppException:
+            raise
+        except OSError as e:
+            logger.error(f"删除快照出错: {str(e)}")
+            raise AppException(f"删除快照出错: {str(e)}")
+        return self._snapshot_info(info)
+
+    async def disk_usage(
+            self,
+            dir_path: str,
+            refresh: bool = False,
+            top: int = 20,
+            max_children: int = 100,
+    ) -> FileDiskUsageResult:
+        """
+        统计文件夹的占用空间(不启动du进程)
+        1.目录在批量线程池中并行扫描，每个目录的扫描结果按目录修改时间缓存，重复统计时只扫描有变化的目录
+        2.已有文件原地变大不会改变目录修改时间，缓存超过有效期或refresh为True时重新扫描
+        3.软链接按链接本身统计，同一个文件的多个硬链接只计算一次(与du一致)
+        """
+        if not os.path.isdir(dir_path):
+            raise NotFoundException(f"当前文件夹不存在: {dir_path}")
+
+        def to_entry(usage: DirUsage) -> FileDiskUsageEntry:
+            return FileDiskUsageEntry(
+                path=usage.path,
+                type="dir" if usage.is_dir else "file",
+                bytes=usage.bytes,
+                disk_bytes=usage.disk_bytes,
+                file_count=usage.file_count,
+                dir_count=usage.dir_count,
+            )
+
+        try:
+            result = await asyncio.to_thread(
+                self.usage_cache.usage,
+                dir_path,
+                self._batch_executor,
+                self._batch_workers,
+                refresh,
+                top,
+            )
+        except FileNotFoundError:
+            raise NotFoundException(f"当前文件夹不存在: {dir_path}")
+        except OSError as e:
+            logger.error(f"统计占用空间出错: {str(e)}")
+            raise AppException(f"统计占用空间出错: {str(e)}")
+
+        return FileDiskUsageResult(
+            dir_path=dir_path,
+            bytes=result.total.bytes,
+            disk_bytes=result.total.disk_bytes,
+            file_count=result.total.file_count,
+            dir_count=result.total.dir_count,
+            children=[to_entry(child) for child in result.children[:max_children]],
+            largest_files=[to_entry(item) for item in result.largest_files],
+            scanned_dirs=result.scanned_dirs,
+            cached_dirs=result.cached_dirs,
+            errors=result.errors,
+        )
 
     @classmethod
     async def ensure_file(cls, file_path: str) -> None:
@@ -298,23 +2225,220 @@ class FileService:
         if not os.path.exists(file_path):
             raise NotFoundException(f"该文件不存在: {file_path}")
 
-    @classmethod
-    async def check_file_exists(cls, file_path: str) -> FileCheckResult:
-        """根据传递的路径判断文件是否存在"""
+    def _exists(self, file_path: str) -> bool:
+        """判断路径是否存在，优先查询内存索引，软链接需要跟随判断目标是否存在"""
+        covered, st = self.file_index.lookup(file_path)
+        if covered and (st is None or not stat.S_ISLNK(st.st_mode)):
+            return st is not None
+        return os.path.exists(file_path)
+
+    async def check_file_exists(self, file_path: str) -> FileCheckResult:
+        """根据传递的路径判断文件是否存在(被监听的目录直接从内存索引读取)"""
         return FileCheckResult(
             file_path=file_path,
-            exists=os.path.exists(file_path),
+            exists=self._exists(file_path),
+        )
+
+    def _run_batch_operation(self, operation: FileBatchOperation) -> FileBatchItemResult:
+        """在批量线程池中同步执行单个非sudo操作"""
+        result = FileBatchItemResult(op=operation.op, file_path=operation.file_path, success=True)
+        try:
+            if operation.op == "exists":
+                result.exists = self._exists(operation.file_path)
+            elif operation.op == "stat":
+                covered, st = self.file_index.lookup(operation.file_path)
+                if not covered:
+                    st = os.lstat(operation.file_path)
+                if st is None:
+                    raise NotFoundException(f"该文件不存在: {operation.file_path}")
+                result.entry = FileEntry(
+                    path=operation.file_path,
+                    type=stat_file_type(st),
+                    size=st.st_size,
+                    mtime=st.st_mtime,
+                )
+            else:
+                if not os.path.exists(operation.file_path):
+                    raise NotFoundException(f"要读取的文件不存在或无权限: {operation.file_path}")
+                content, result.content_hash = self._read_text(
+                    operation.file_path,
+                    if_none_match=operation.if_none_match,
+                )
+                if content is None:
+                    result.not_modified = True
+                else:
+                    result.content = self._slice_content(
+                        content,
+                        operation.start_line,
+                        operation.end_line,
+                        operation.max_length,
+                    )
+        except AppException as e:
+            result.success, result.error = False, e.msg
+        except Exception as e:
+            result.success, result.error = False, str(e)
+        return result
+
+    async def batch(self, operations: List[FileBatchOperation]) -> FileBatchResult:
+        """在一次请求中并发执行多个read/stat/exists操作，单个操作失败不影响其他操作"""
+        loop = asyncio.get_running_loop()
+
+        # 1.定义单个操作的执行函数，sudo读取通过特权助手进程完成，其余操作交给有界线程池
+        async def run(operation: FileBatchOperation) -> FileBatchItemResult:
+            if operation.op == "read" and operation.sudo:
+                try:
+                    read_result = await self.read_file(
+                        file_path=operation.file_path,
+                        start_line=operation.start_line,
+                        end_line=operation.end_line,
+                        sudo=True,
+                        max_length=operation.max_length,
+                        if_none_match=operation.if_none_match,
+                    )
+                except AppException as e:
+                    return FileBatchItemResult(op=operation.op, file_path=operation.file_path, success=False,
+                                               error=e.msg)
+                return FileBatchItemResult(
+                    op=operation.op,
+                    file_path=operation.file_path,
+                    success=True,
+                    content=None if read_result.not_modified else read_result.content,
+                    content_hash=read_result.content_hash,
+                    not_modified=read_result.not_modified,
+                )
+            return await loop.run_in_executor(self._batch_executor, self._run_batch_operation, operation)
+
+        # 2.并发执行所有操作，结果顺序与请求顺序一致
+        results = await asyncio.gather(*(run(operation) for operation in operations))
+        succeeded = sum(1 for result in results if result.success)
+
+        return FileBatchResult(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+    async def watch_dir(self, dir_path: str) -> FileWatchResult:
+        """监听指定目录并建立文件元数据内存索引"""
+        # 1.检测下传递进来的目录是否存在
+        if not os.path.isdir(dir_path):
+            raise NotFoundException(f"当前文件夹不存在: {dir_path}")
+
+        # 2.首次扫描可能较慢，使用asyncio子线程完成
+        dir_count, file_count, degraded = await asyncio.to_thread(self.file_index.watch, dir_path)
+
+        return FileWatchResult(
+            dir_path=dir_path,
+            watching=True,
+            dir_count=dir_count,
+            file_count=file_count,
+            degraded=degraded,
+        )
+
+    async def get_changes(self, dir_path: str, cursor: Optional[str] = None, limit: int = 1000) -> FileChangesResult:
+        """根据传递的目录+游标获取游标之后的文件变更"""
+        # 1.检测下传递进来的目录是否存在，未监听时先开始监听
+        if not os.path.isdir(dir_path):
+            raise NotFoundException(f"当前文件夹不存在: {dir_path}")
+        if not self.file_index.covers(dir_path):
+            await asyncio.to_thread(self.file_index.watch, dir_path)
+
+        # 2.解析游标，来自服务重启前的游标视为失效
+        after_seq = None
+        if cursor:
+            try:
+                after_seq = self.file_index.journal.decode_cursor(cursor)
+            except ValueError as e:
+                raise BadRequestException(str(e))
+
+        # 3.读取变更日志，游标失效时返回内存索引中的全量条目
+        records, seq, has_more = self.file_index.changes(dir_path, after_seq, limit)
+        if records is None:
+            files = [
+                FileEntry(path=path, type=stat_file_type(st), size=st.st_size, mtime=st.st_mtime)
+                for path, st in self.file_index.snapshot(dir_path)
+            ]
+            return FileChangesResult(
+                dir_path=dir_path,
+                cursor=self.file_index.journal.encode_cursor(seq),
+                reset=True,
+                files=files,
+            )
+
+        # 4.合并同一路径的多次变更，先新建后修改仍视为新建
+        merged: Dict[str, FileChange] = {}
+        for record in records:
+            previous = merged.pop(record.path, None)
+            change = record.kind
+            if previous is not None and previous.change == CHANGE_CREATED and change == CHANGE_MODIFIED:
+                change = CHANGE_CREATED
+            merged[record.path] = FileChange(path=record.path, change=change, is_dir=record.is_dir)
+
+        # 5.补充未删除条目的最新元数据
+        for item in merged.values():
+            if item.change != CHANGE_DELETED:
+                _, st = self.file_index.lookup(item.path)
+                if st is not None:
+                    item.size, item.mtime = st.st_size, st.st_mtime
+
+        return FileChangesResult(
+            dir_path=dir_path,
+            cursor=self.file_index.journal.encode_cursor(seq),
+            has_more=has_more,
+            changes=list(merged.values()),
         )
 
-    async def delete_file(self, file_path: str) -> FileDeleteResult:
+    async def unwatch_dir(self, dir_path: str) -> FileWatchResult:
+        """取消监听指定目录并释放内存索引"""
+        if not self.file_index.unwatch(dir_path):
+            raise NotFoundException(f"当前文件夹未被监听: {dir_path}")
+
+        return FileWatchResult(dir_path=dir_path, watching=False)
+
+    async def delete_file(self, file_path: str, sudo: bool = False) -> FileDeleteResult:
         """根据传递的路径+sudo删除指定文件"""
-        # 1.判断文件是否存在
+        # 1.sudo模式下通过特权助手进程删除
+        if sudo:
+            try:
+                await self.sudo_helper.delete(file_path)
+            except FileNotFoundError:
+                raise NotFoundException(f"该文件不存在: {file_path}")
+            except OSError as e:
+                raise AppException(f"删除文件{file_path}失败: {str(e)}")
+            self.content_cache.invalidate(file_path)
+            return FileDeleteResult(file_path=file_path, deleted=True)
+
+        # 2.判断文件是否存在
         await self.ensure_file(file_path)
 
         try:
-            # 2.调用命令删除文件
-            os.remove(file_path)
+            # 3.在工作线程中删除文件
+            await asyncio.to_thread(os.remove, file_path)
+            self.content_cache.invalidate(file_path)
             return FileDeleteResult(file_path=file_path, deleted=True)
         except Exception as e:
             logger.error(f"删除文件{file_path}失败: {str(e)}")
             raise AppException(f"删除文件{file_path}失败: {str(e)}")
+
+    async def checksum(
+            self,
+            file_paths: List[str],
+            hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+    ) -> FileChecksumResult:
+        """使用批量线程池并发计算多个文件的内容哈希(签名未变化的文件直接使用缓存)"""
+        loop = asyncio.get_running_loop()
+
+        # 1.定义单个文件的哈希计算函数
+        def hash_one(file_path: str) -> FileChecksumItem:
+            try:
+                content_hash, st = self.hash_cache.hash_file(file_path, hash_algorithm)
+                return FileChecksumItem(file_path=file_path, content_hash=content_hash, size=st.st_size)
+            except Exception as e:
+                return FileChecksumItem(file_path=file_path, error=str(e))
+
+        # 2.并发执行，结果顺序与请求顺序一致
+        items = await asyncio.gather(
+            *(loop.run_in_executor(self._batch_executor, hash_one, file_path) for file_path in file_paths)
+        )
+
+        return FileChecksumResult(hash_algorithm=hash_algorithm, items=items)
+
+    async def get_cache_stats(self) -> FileCacheStatsResult:
+        """获取文件内容缓存的统计信息"""
+        return FileCacheStatsResult(**self.content_cache.stats())
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 19:40
+@Author : YangFei
+@File   : file_archive.py
+@Desc   : tar归档的流式导入(边接收边解压)与流式导出(边打包边发送)
+"""
+import glob
+import os
+import queue
+import re
+import tarfile
+import threading
+from typing import Callable, Iterable, IO, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.services.file_compress import ZSTD_MAGIC, zstd_reader, zstd_writer
+from app.services.file_edit import CHUNK_SIZE
+from app.services.file_walker import GitIgnore, scan_dir_sorted
+
+# 支持的导出格式与对应的tarfile模式(zst由外层包装压缩)
+ARCHIVE_FORMATS = {
+    "tar": "w|",
+    "tar.gz": "w|gz",
+    "tar.zst": "w|",
+}
+
+# 导出格式对应的媒体类型
+ARCHIVE_MEDIA_TYPES = {
+    "tar": "application/x-tar",
+    "tar.gz": "application/gzip",
+    "tar.zst": "application/zstd",
+}
+
+# 队列中表示数据流结束的标记
+END_OF_STREAM = None
+
+# 阻塞在队列上时检查是否已取消的间隔，单位：秒
+_POLL_INTERVAL = 0.5
+
+
+class StreamCancelled(Exception):
+    """数据流的另一端已经停止"""
+
+
+class ChunkQueue:
+    """
+    在协程与工作线程之间传递数据块的有界队列
+    1.队列满/空时阻塞的一方会定期检查取消标记，任何一端停止后另一端都不会永久阻塞
+    2.队列容量即为在途数据的上限，提供背压
+    """
+
+    def __init__(self, max_chunks: int = 8) -> None:
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_chunks)
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """标记数据流已停止"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def put(self, chunk: Optional[bytes]) -> None:
+        """放入数据块(END_OF_STREAM表示结束)，另一端已停止时抛出StreamCancelled"""
+        while True:
+            if self._cancelled.is_set():
+                raise StreamCancelled()
+            try:
+                self._queue.put(chunk, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def get(self) -> Optional[bytes]:
+        """取出数据块，另一端已停止时抛出StreamCancelled"""
+        while True:
+            try:
+                return self._queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self._cancelled.is_set():
+                    raise StreamCancelled()
+
+
+class QueueReader:
+    """从ChunkQueue读取数据的只读文件对象，供tarfile在工作线程中流式读取"""
+
+    def __init__(self, chunks: ChunkQueue) -> None:
+        self.chunks = chunks
+        self._current = b""
+        self._pos = 0
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size != 0:
+            if self._pos >= len(self._current):
+                if self._eof:
+                    break
+                try:
+                    chunk = self.chunks.get()
+                except StreamCancelled:
+                    raise EOFError("上传数据流已中断")
+                if chunk is END_OF_STREAM:
+                    self._eof = True
+                    break
+                self._current, self._pos = chunk, 0
+                continue
+            available = len(self._current) - self._pos
+            count = available if size < 0 else min(size, available)
+            parts.append(self._current[self._pos:self._pos + count])
+            self._pos += count
+            if size > 0:
+                size -= count
+        return b"".join(parts)
+
+
+class QueueWriter:
+    """写入ChunkQueue的只写文件对象，小块写入合并为chunk_size大小后再放入队列"""
+
+    def __init__(self, chunks: ChunkQueue, chunk_size: int = CHUNK_SIZE) -> None:
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            self.chunks.put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        """放入剩余数据与结束标记"""
+        if self._buffer:
+            self.chunks.put(bytes(self._buffer))
+            self._buffer.clear()
+        self.chunks.put(END_OF_STREAM)
+
+
+class _PrefixReader:
+    """把已经读取的前缀与剩余数据拼接为一个只读文件对象"""
+
+    def __init__(self, prefix: bytes, fileobj: IO[bytes]) -> None:
+        self.prefix = prefix
+        self.fileobj = fileobj
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.prefix:
+            return self.fileobj.read(size)
+        if 0 <= size <= len(self.prefix):
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+            return data
+        data, self.prefix = self.prefix, b""
+        return data + self.fileobj.read(-1 if size < 0 else size - len(data))
+
+    def readable(self) -> bool:
+        return True
+
+
+class ArchiveImportStats(NamedTuple):
+    """导入归档的统计"""
+    file_count: int
+    dir_count: int
+    link_count: int
+    total_bytes: int
+    skipped: List[Tuple[str, str]]
+
+
+def _strip_name(name: str, strip_components: int) -> str:
+    """去掉路径开头的若干段(与tar --strip-components一致)"""
+    parts = [part for part in name.split("/") if part and part != "."]
+    return "/".join(parts[strip_components:])
+
+
+def extract_tar_stream(
+        fileobj: IO[bytes],
+        dest_dir: str,
+        strip_components: int = 0,
+        on_file: Optional[Callable[[str], None]] = None,
+) -> ArchiveImportStats:
+    """
+    从可读文件对象流式解压tar/tar.gz/tar.bz2/tar.xz/tar.zst到dest_dir，每个条目读到即写入，不需要先保存归档
+    1.压缩格式根据开头的魔数自动识别
+    2.使用tarfile的data过滤器：拒绝绝对路径、..越界、指向目标目录之外的链接与设备文件，去掉setuid等权限位
+    3.被拒绝的条目记录原因后跳过，不影响其他条目
+    4.on_file在每个普通文件写入后调用，参数为文件的绝对路径
+    """
+    # 1.识别zstd压缩，其他压缩格式交给tarfile的流式自动识别
+    prefix = fileobj.read(len(ZSTD_MAGIC))
+    source = _PrefixReader(prefix, fileobj)
+    if prefix == ZSTD_MAGIC:
+        source = zstd_reader(source)
+
+    file_count = dir_count = link_count = total_bytes = 0
+    skipped: List[Tuple[str, str]] = []
+    os.makedirs(dest_dir, exist_ok=True)
+    with tarfile.open(fileobj=source, mode="r|*", copybufsize=CHUNK_SIZE) as tar:
+        for member in tar:
+            # 2.按strip_components去掉路径前缀，链接的目标同样需要处理
+            name = _strip_name(member.name, strip_components)
+            if not name:
+                continue
+            changes = {"name": name}
+            if member.islnk():
+                changes["linkname"] = _strip_name(member.linkname, strip_components)
+            member = member.replace(**changes, deep=False)
+
+            # 3.通过data过滤器解压单个条目
+            try:
+                tar.extract(member, dest_dir, set_attrs=True, filter="data")
+            except tarfile.FilterError as e:
+                skipped.append((name, str(e)))
+                continue
+
+            if member.isdir():
+                dir_count += 1
+            elif member.issym() or member.islnk():
+                link_count += 1
+            else:
+                file_count += 1
+                total_bytes += member.size
+                if on_file is not None:
+                    on_file(os.path.join(dest_dir, name))
+
+        # 4.读完tar结束块后，读取剩余的填充数据，保证发送方不会因为背压阻塞
+        while source.read(CHUNK_SIZE):
+            pass
+    return ArchiveImportStats(file_count, dir_count, link_count, total_bytes, skipped)
+
+
+def iter_archive_entries(
+        root: str,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        ignore_names: Iterable[str] = (),
+) -> Iterator[Tuple[str, str]]:
+    """
+    按字典序深度优先遍历root，产出需要打包的(绝对路径, 相对路径)
+    1.exclude为gitignore语法的排除规则，被排除的文件夹整体剪枝
+    2.include为glob规则(**匹配多层，包含隐藏文件)，为空时打包全部条目；
+      指定include时只打包匹配的文件与文件夹，父文件夹由解压方自动创建
+    """
+    ignores = GitIgnore("", exclude) if exclude else None
+    includes = [re.compile(glob.translate(pattern, recursive=True, include_hidden=True))
+                for pattern in include or []]
+    ignore_names = frozenset(ignore_names)
+
+    stack: List[Tuple[str, str]] = [(root, "")]
+    while stack:
+        abs_dir, rel_dir = stack.pop()
+        children = []
+        for entry in scan_dir_sorted(abs_dir):
+            if entry.name in ignore_names:
+                continue
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if ignores is not None and ignores.match(rel_path, is_dir):
+                continue
+            if not includes or any(pattern.match(rel_path) for pattern in includes):
+                yield entry.path, rel_path
+            if is_dir:
+                children.append((entry.path, rel_path))
+        stack.extend(reversed(children))
+
+
+def write_tar_stream(
+        fileobj: IO[bytes],
+        entries: Iterable[Tuple[str, str]],
+        archive_format: str = "tar",
+) -> int:
+    """
+    把entries依次打包写入可写文件对象，返回打包的条目数
+    1.每个条目只添加自身(不递归)，文件内容按CHUNK_SIZE分块读取，软链接按链接本身打包
+    2.无法读取的条目(例如打包过程中被删除)直接跳过
+    """
+    target = zstd_writer(fileobj) if archive_format == "tar.zst" else fileobj
+    count = 0
+    try:
+        with tarfile.open(fileobj=target, mode=ARCHIVE_FORMATS[archive_format], copybufsize=CHUNK_SIZE) as tar:
+            for abs_path, rel_path in entries:
+                try:
+                    tar.add(abs_path, arcname=rel_path, recursive=False)
+                except (FileNotFoundError, PermissionError):
+                    continue
+                count += 1
+    finally:
+        if target is not fileobj:
+            target.close()
+    return count
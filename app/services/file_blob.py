@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 20:50
+@Author : YangFei
+@File   : file_blob.py
+@Desc   : 按内容哈希寻址的本地blob存储，相同内容只需上传一次
+"""
+import errno
+import fcntl
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from app.services.file_edit import AtomicWriter, copy_range
+from app.services.file_hash import HASH_ALGORITHMS, new_hasher
+
+# 物化方式
+MATERIALIZE_COPY = "copy"
+MATERIALIZE_REFLINK = "reflink"
+
+# FICLONE ioctl(linux/fs.h)：目标文件与源文件共享数据块，任一方写入时才复制
+_FICLONE = 0x40049409
+
+# 淘汰时清理到容量上限的比例，避免每次写入都触发淘汰
+_EVICT_RATIO = 0.9
+
+_HEX = re.compile(r"^[0-9a-f]+$")
+
+
+def parse_blob_hash(content_hash: str) -> Tuple[str, str]:
+    """解析"算法:十六进制摘要"格式的blob哈希，返回(算法, 摘要)，格式不合法时抛出ValueError"""
+    algorithm, _, digest = content_hash.partition(":")
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"blob哈希格式错误: {content_hash}，应为\"算法:十六进制摘要\"")
+    if len(digest) != new_hasher(algorithm).digest_size * 2 or not _HEX.match(digest):
+        raise ValueError(f"blob哈希摘要格式错误: {content_hash}")
+    return algorithm, digest
+
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    """通过FICLONE克隆整个文件，文件系统不支持或跨文件系统时返回False"""
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.EBADF):
+            raise
+        return False
+
+
+class BlobStore:
+    """
+    按内容哈希寻址的blob存储
+    1.blob保存为root/算法/摘要前两位/摘要，只读权限，写入后内容不再变化
+    2.上传先写入root/tmp下的临时文件，哈希校验通过后通过硬链接发布，并发上传同一blob时只保留第一个
+    3.总大小超过max_bytes时按最后使用时间淘汰最久未使用的blob，已物化的文件不受影响，最后使用时间记录在atime中
+    4.物化的文件都是独立的inode，之后原地修改(追加写入、按行编辑等)不会影响blob
+    """
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def blob_path(self, content_hash: str) -> str:
+        """blob在存储中的路径"""
+        algorithm, digest = parse_blob_hash(content_hash)
+        return os.path.join(self.root, algorithm, digest[:2], digest)
+
+    def exists(self, content_hash: str) -> bool:
+        return os.path.isfile(self.blob_path(content_hash))
+
+    def new_temp(self) -> Tuple[int, str]:
+        """在存储的临时目录创建上传用的临时文件，返回(文件描述符, 路径)"""
+        temp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+        return tempfile.mkstemp(dir=temp_dir, suffix=".blob")
+
+    def publish(self, temp_path: str, content_hash: str) -> bool:
+        """把哈希已校验的临时文件发布为blob并删除临时文件，blob已存在时返回False"""
+        blob_path = self.blob_path(content_hash)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.chmod(temp_path, 0o444)
+        try:
+            os.link(temp_path, blob_path)
+            created = True
+        except FileExistsError:
+            created = False
+        finally:
+            os.unlink(temp_path)
+        if created:
+            self._add_bytes(os.stat(blob_path).st_size)
+        return created
+
+    def remove(self, content_hash: str) -> None:
+        """删除blob(例如校验发现内容已损坏)"""
+        blob_path = self.blob_path(content_hash)
+        try:
+            size = os.stat(blob_path).st_size
+            os.unlink(blob_path)
+        except FileNotFoundError:
+            return
+        self._add_bytes(-size)
+
+    def touch(self, blob_path: str) -> None:
+        """更新blob的最后使用时间(只修改atime)"""
+        try:
+            st = os.stat(blob_path)
+            os.utime(blob_path, ns=(time.time_ns(), st.st_mtime_ns))
+        except OSError:
+            pass
+
+    def materialize(self, blob_path: str, file_path: str, mode: str = MATERIALIZE_COPY) -> str:
+        """
+        把blob物化到file_path(原子替换已有文件)，返回实际使用的方式
+        写入临时文件后原子替换，保留原文件的权限与属主，目标文件不会与blob共享inode
+        1.reflink：通过FICLONE克隆，不复制数据(与blob共享数据块，写入时才复制)，文件系统不支持或跨文件系统时退化为copy
+        2.copy：通过copy_range复制(支持reflink的文件系统上同样只共享数据块)
+        """
+        target = os.path.realpath(file_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            st = os.stat(target)
+        except FileNotFoundError:
+            st = None
+        with open(blob_path, "rb") as src, AtomicWriter(target, mode="wb", preserve_from=st) as writer:
+            if mode == MATERIALIZE_REFLINK and _reflink(src.fileno(), writer.file.fileno()):
+                method = MATERIALIZE_REFLINK
+            else:
+                method = MATERIALIZE_COPY
+                size = os.fstat(src.fileno()).st_size
+                if copy_range(src.fileno(), writer.file.fileno(), 0, size) != size:
+                    raise OSError(errno.EIO, f"blob在复制过程中被截断: {blob_path}")
+        self.touch(blob_path)
+        return method
+
+    def _iter_blobs(self) -> List[Tuple[float, int, str]]:
+        """列出全部blob的(最后使用时间, 大小, 路径)"""
+        blobs = []
+        for algorithm in HASH_ALGORITHMS:
+            algorithm_dir = os.path.join(self.root, algorithm)
+            if not os.path.isdir(algorithm_dir):
+                continue
+            for prefix in os.scandir(algorithm_dir):
+                if not prefix.is_dir(follow_symlinks=False):
+                    continue
+                for entry in os.scandir(prefix.path):
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    blobs.append((st.st_atime, st.st_size, entry.path))
+        return blobs
+
+    def _add_bytes(self, delta: int) -> None:
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += delta
+
+    def total_bytes(self) -> int:
+        """存储的总字节数，第一次调用时扫描存储目录"""
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._iter_blobs())
+            return self._total_bytes
+
+    def evict(self) -> int:
+        """总大小超过上限时淘汰最久未使用的blob，返回淘汰的数量"""
+        if self.total_bytes() <= self.max_bytes:
+            return 0
+        with self._lock:
+            blobs = sorted(self._iter_blobs())
+            total = sum(size for _, size, _ in blobs)
+            evicted = 0
+            # 刚刚上传的blob(一分钟内)不淘汰，避免客户端查询缺失后上传、物化之前被清理
+            deadline = time.time() - 60
+            for atime, size, path in blobs:
+                if total <= self.max_bytes * _EVICT_RATIO or atime > deadline:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+            self._total_bytes = total
+            return evicted
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 19:30
+@Author : YangFei
+@File   : file_compress.py
+@Desc   : 可选的zstd压缩支持(Python 3.14标准库或zstandard包)
+"""
+from typing import IO
+
+# zstd帧的魔数
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# 默认压缩级别
+ZSTD_LEVEL = 3
+
+# 优先使用Python 3.14标准库，其次使用zstandard包，都不可用时ZSTD_AVAILABLE为False
+try:
+    from compression import zstd as _zstd
+
+    _ZSTD_STDLIB = True
+except ImportError:
+    try:
+        import zstandard as _zstd
+    except ImportError:
+        _zstd = None
+    _ZSTD_STDLIB = False
+
+ZSTD_AVAILABLE = _zstd is not None
+
+
+def _ensure_zstd() -> None:
+    if _zstd is None:
+        raise ValueError("当前环境不支持zstd压缩(需要Python 3.14或安装zstandard)")
+
+
+def new_zstd_compressor():
+    """创建增量压缩器，提供compress(data)与flush()两个方法"""
+    _ensure_zstd()
+    if _ZSTD_STDLIB:
+        return _zstd.ZstdCompressor(level=ZSTD_LEVEL)
+    return _zstd.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+
+def zstd_reader(fileobj: IO[bytes]) -> IO[bytes]:
+    """把zstd压缩的可读文件对象包装为解压后的可读文件对象"""
+    _ensure_zstd()
+    if _ZSTD_STDLIB:
+        return _zstd.ZstdFile(fileobj, mode="rb")
+    return _zstd.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True)
+
+
+def zstd_writer(fileobj: IO[bytes]) -> IO[bytes]:
+    """把可写文件对象包装为写入时压缩的文件对象，关闭时写入帧尾但不关闭fileobj"""
+    _ensure_zstd()
+    if _ZSTD_STDLIB:
+        return _zstd.ZstdFile(fileobj, mode="wb", level=ZSTD_LEVEL)
+    return _zstd.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(fileobj, closefd=False)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 15:02
+@Author : YangFei
+@File   : file_content_cache.py
+@Desc   : 按内存预算淘汰的热点文件内容LRU缓存
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.services.file_hash import file_signature
+
+
+class _CachedContent(NamedTuple):
+    """缓存的文件内容"""
+    signature: Tuple[int, int, int, int]
+    content: str
+    hashes: Dict[str, str]
+    size: int
+
+
+class FileContentCache:
+    """
+    进程级的文件内容缓存
+    1.以文件绝对路径为key，读取时比对文件签名(设备, inode, 大小, 修改时间)，签名变化则视为失效
+    2.所有条目占用的内存不超过max_bytes，超出时淘汰最久未使用的条目，超过max_entry_bytes的文件不缓存
+    3.通过本服务写入/替换/上传/删除文件时主动失效
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 1024 * 1024) -> None:
+        """构造函数，max_bytes为内存预算，max_entry_bytes为单个文件的缓存上限"""
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, _CachedContent]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, file_path: str, st: os.stat_result, hash_algorithm: str) -> Optional[Tuple[str, str]]:
+        """获取签名一致的缓存内容，返回(内容, 哈希)，未命中返回None"""
+        key = os.path.abspath(file_path)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached.signature != file_signature(st) or hash_algorithm not in cached.hashes:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached.content, cached.hashes[hash_algorithm]
+
+    def put(self, file_path: str, st: os.stat_result, content: str, hash_algorithm: str, content_hash: str) -> None:
+        """写入缓存，超出内存预算时按LRU淘汰"""
+        size = sys.getsizeof(content)
+        if size > self.max_entry_bytes or size > self.max_bytes:
+            return
+
+        key = os.path.abspath(file_path)
+        signature = file_signature(st)
+        with self._lock:
+            # 1.同一签名的内容已存在时只补充哈希
+            previous = self._entries.pop(key, None)
+            hashes = {hash_algorithm: content_hash}
+            if previous is not None:
+                self._bytes -= previous.size
+                if previous.signature == signature:
+                    hashes = {**previous.hashes, **hashes}
+            self._entries[key] = _CachedContent(signature, content, hashes, size)
+            self._bytes += size
+
+            # 2.超出内存预算时淘汰最久未使用的条目
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def invalidate(self, file_path: str) -> None:
+        """文件被修改后主动失效"""
+        key = os.path.abspath(file_path)
+        with self._lock:
+            cached = self._entries.pop(key, None)
+            if cached is not None:
+                self._bytes -= cached.size
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 20:20
+@Author : YangFei
+@File   : file_delta.py
+@Desc   : rsync风格的增量同步：块签名、增量生成与增量重建
+"""
+import base64
+import hashlib
+import math
+import os
+import struct
+import zlib
+from typing import Callable, Dict, IO, List, NamedTuple, Optional, Tuple
+
+from app.services.file_edit import CHUNK_SIZE, copy_range
+
+# 签名格式：头部为魔数+块大小(>I)+文件大小(>Q)，之后每个块依次为adler32弱校验(>I)与blake2b强校验
+SIGNATURE_MAGIC = b"NSIG"
+_SIGNATURE_HEADER = struct.Struct(">4sIQ")
+_WEAK = struct.Struct(">I")
+
+# 增量格式：头部为魔数，之后为指令流，以END指令结束
+# COPY指令复制基准文件[offset, offset + length)，LITERAL指令直接写入后续的length字节
+DELTA_MAGIC = b"NDLT"
+OP_END = 0
+OP_COPY = 1
+OP_LITERAL = 2
+_COPY = struct.Struct(">QQ")
+_LITERAL = struct.Struct(">I")
+
+# 强校验的字节数
+STRONG_SIZE = 16
+
+# 块大小的取值范围，默认取文件大小的平方根并按1KB对齐
+MIN_BLOCK_SIZE = 1024
+MAX_BLOCK_SIZE = 128 * 1024
+DEFAULT_MIN_BLOCK_SIZE = 2048
+
+# 单条LITERAL指令的最大长度
+MAX_LITERAL_SIZE = CHUNK_SIZE
+
+# 逐字节滚动查找时每次加载的最大窗口
+SCAN_WINDOW = 4 * CHUNK_SIZE
+
+# adler32的模数
+_ADLER_MOD = 65521
+
+
+class DeltaError(ValueError):
+    """签名或增量数据格式错误，或者增量与基准文件不匹配"""
+
+
+def default_block_size(file_size: int) -> int:
+    """根据文件大小选择块大小：文件大小的平方根，按1KB对齐并限制在[2KB, 128KB]"""
+    block_size = math.isqrt(file_size) // 1024 * 1024
+    return min(max(block_size, DEFAULT_MIN_BLOCK_SIZE), MAX_BLOCK_SIZE)
+
+
+def strong_hash(data: bytes) -> bytes:
+    """块的强校验"""
+    return hashlib.blake2b(data, digest_size=STRONG_SIZE).digest()
+
+
+def compute_signature(fd: int, file_size: int, block_size: int) -> bytes:
+    """按块读取文件并计算每个块的弱校验与强校验，返回二进制签名"""
+    parts = [_SIGNATURE_HEADER.pack(SIGNATURE_MAGIC, block_size, file_size)]
+    read_size = max(CHUNK_SIZE // block_size, 1) * block_size
+    offset = 0
+    while offset < file_size:
+        data = os.pread(fd, min(read_size, file_size - offset), offset)
+        if not data:
+            break
+        view = memoryview(data)
+        for start in range(0, len(data), block_size):
+            block = view[start:start + block_size]
+            parts.append(_WEAK.pack(zlib.adler32(block)))
+            parts.append(strong_hash(block))
+        offset += len(data)
+    return b"".join(parts)
+
+
+class Signature:
+    """解析后的块签名，弱校验映射到块序号用于查找(最后一个不足一块的块只在文件末尾匹配)"""
+
+    def __init__(self, data: bytes) -> None:
+        if len(data) < _SIGNATURE_HEADER.size:
+            raise DeltaError("签名数据不完整")
+        magic, self.block_size, self.file_size = _SIGNATURE_HEADER.unpack_from(data)
+        if magic != SIGNATURE_MAGIC:
+            raise DeltaError("签名数据格式错误")
+        if not MIN_BLOCK_SIZE <= self.block_size <= MAX_BLOCK_SIZE:
+            raise DeltaError(f"块大小必须在{MIN_BLOCK_SIZE}到{MAX_BLOCK_SIZE}之间")
+        self.block_count = -(-self.file_size // self.block_size)
+        entry_size = _WEAK.size + STRONG_SIZE
+        if len(data) != _SIGNATURE_HEADER.size + self.block_count * entry_size:
+            raise DeltaError("签名数据长度与文件大小不符")
+
+        self.weak: List[int] = []
+        self.strong: List[bytes] = []
+        self.table: Dict[int, List[int]] = {}
+        full_blocks = self.file_size // self.block_size
+        offset = _SIGNATURE_HEADER.size
+        for index in range(self.block_count):
+            weak, = _WEAK.unpack_from(data, offset)
+            self.weak.append(weak)
+            self.strong.append(data[offset + _WEAK.size:offset + entry_size])
+            if index < full_blocks:
+                self.table.setdefault(weak, []).append(index)
+            offset += entry_size
+
+    @classmethod
+    def from_base64(cls, signature: str) -> "Signature":
+        try:
+            data = base64.b64decode(signature, validate=True)
+        except ValueError:
+            raise DeltaError("签名不是合法的base64数据")
+        return cls(data)
+
+    def block_length(self, index: int) -> int:
+        return min(self.block_size, self.file_size - index * self.block_size)
+
+    def match(self, weak: int, block: bytes) -> Optional[int]:
+        """查找弱校验与强校验都一致的完整块，返回块序号"""
+        indexes = self.table.get(weak)
+        if not indexes:
+            return None
+        digest = strong_hash(block)
+        for index in indexes:
+            if self.strong[index] == digest:
+                return index
+        return None
+
+
+class DeltaStats(NamedTuple):
+    """增量的统计：复制自基准文件的字节数、直接传输的字节数"""
+    copied_bytes: int
+    literal_bytes: int
+
+
+class _DeltaEmitter:
+    """
+    输出增量指令
+    1.相邻的COPY合并为一条指令
+    2.未匹配的字节只记录起始位置，遇到下一个匹配或累计超过MAX_LITERAL_SIZE时再从文件读取并输出
+    """
+
+    def __init__(self, fd: int, write: Callable[[bytes], object]) -> None:
+        self.fd = fd
+        self.write = write
+        self.literal_start = 0
+        self.copy_offset = 0
+        self.copy_length = 0
+        self.copied_bytes = 0
+        self.literal_bytes = 0
+        write(DELTA_MAGIC)
+
+    def _flush_copy(self) -> None:
+        if self.copy_length:
+            self.write(bytes([OP_COPY]) + _COPY.pack(self.copy_offset, self.copy_length))
+            self.copied_bytes += self.copy_length
+            self.copy_length = 0
+
+    def literal_until(self, position: int) -> None:
+        """输出[literal_start, position)之间的未匹配字节"""
+        while self.literal_start < position:
+            length = min(position - self.literal_start, MAX_LITERAL_SIZE)
+            data = os.pread(self.fd, length, self.literal_start)
+            if len(data) != length:
+                raise DeltaError("文件在生成增量的过程中被截断")
+            self._flush_copy()
+            self.write(bytes([OP_LITERAL]) + _LITERAL.pack(length))
+            self.write(data)
+            self.literal_start += length
+            self.literal_bytes += length
+
+    def skip_to(self, position: int) -> None:
+        """position之前的字节都是未匹配字节，足够一条完整指令时先输出"""
+        if position - self.literal_start >= MAX_LITERAL_SIZE:
+            self.literal_until(self.literal_start + (position - self.literal_start) // MAX_LITERAL_SIZE * MAX_LITERAL_SIZE)
+
+    def copy(self, position: int, base_offset: int, length: int) -> None:
+        """position处的length字节与基准文件base_offset处的内容一致"""
+        self.literal_until(position)
+        if self.copy_length and self.copy_offset + self.copy_length == base_offset:
+            self.copy_length += length
+        else:
+            self._flush_copy()
+            self.copy_offset, self.copy_length = base_offset, length
+        self.literal_start = position + length
+
+    def finish(self, file_size: int) -> DeltaStats:
+        self.literal_until(file_size)
+        self._flush_copy()
+        self.write(bytes([OP_END]))
+        return DeltaStats(self.copied_bytes, self.literal_bytes)
+
+
+def _rolling_search(data: bytes, block_size: int, signature: Signature) -> Optional[Tuple[int, int]]:
+    """
+    在data中逐字节滚动计算adler32，查找从偏移1开始第一个与签名匹配的完整块，返回(偏移, 块序号)
+    偏移0的窗口已由调用方检查过，这里直接从它的校验值开始滚动
+    """
+    table = signature.table
+    checksum = zlib.adler32(data[:block_size])
+    a, b = checksum & 0xFFFF, checksum >> 16
+    k = 0
+    for out_byte, in_byte in zip(data, data[block_size:]):
+        a = (a - out_byte + in_byte) % _ADLER_MOD
+        b = (b - block_size * out_byte + a - 1) % _ADLER_MOD
+        k += 1
+        weak = b << 16 | a
+        if weak in table:
+            index = signature.match(weak, data[k:k + block_size])
+            if index is not None:
+                return k, index
+    return None
+
+
+def generate_delta(fd: int, file_size: int, signature: Signature, write: Callable[[bytes], object]) -> DeltaStats:
+    """
+    根据基准文件的签名生成把基准文件重建为fd对应文件的增量，指令依次通过write输出
+    1.先用强校验比对基准文件中的下一个块，文件大部分未修改时不需要计算滚动校验
+    2.再按当前位置的adler32查表，最后才在有限的窗口内逐字节滚动查找，滚动查找的开销只与修改过的字节数成正比
+    3.基准文件最后一个不足一块的块只与当前文件的末尾比对
+    """
+    block_size = signature.block_size
+    emitter = _DeltaEmitter(fd, write)
+    position = 0
+    expected = 0
+    while position + block_size <= file_size:
+        block = os.pread(fd, block_size, position)
+        if len(block) != block_size:
+            raise DeltaError("文件在生成增量的过程中被截断")
+
+        # 1.比对基准文件中紧接着的下一个块
+        if (expected < signature.block_count and signature.block_length(expected) == block_size
+                and strong_hash(block) == signature.strong[expected]):
+            emitter.copy(position, expected * block_size, block_size)
+            position += block_size
+            expected += 1
+            continue
+
+        # 2.当前位置查表
+        index = signature.match(zlib.adler32(block), block)
+        if index is not None:
+            emitter.copy(position, index * block_size, block_size)
+            position += block_size
+            expected = index + 1
+            continue
+
+        # 3.在窗口内滚动查找，窗口内没有匹配时整个窗口都是未匹配字节
+        end = min(file_size - block_size + 1, position + SCAN_WINDOW)
+        window = os.pread(fd, end - position + block_size - 1, position)
+        found = _rolling_search(window, block_size, signature)
+        if found is None:
+            position = end
+            emitter.skip_to(position)
+            continue
+        k, index = found
+        emitter.copy(position + k, index * block_size, block_size)
+        position += k + block_size
+        expected = index + 1
+
+    # 4.比对末尾不足一块的部分
+    last = signature.block_count - 1
+    tail_length = file_size - position
+    if 0 < tail_length < block_size and last >= 0 and signature.block_length(last) == tail_length:
+        tail = os.pread(fd, tail_length, position)
+        if zlib.adler32(tail) == signature.weak[last] and strong_hash(tail) == signature.strong[last]:
+            emitter.copy(position, last * block_size, tail_length)
+    return emitter.finish(file_size)
+
+
+def _read_exact(source: IO[bytes], size: int) -> bytes:
+    data = source.read(size)
+    if len(data) != size:
+        raise DeltaError("增量数据不完整")
+    return data
+
+
+def apply_delta(source: IO[bytes], base_fd: int, base_size: int, out: IO[bytes]) -> DeltaStats:
+    """
+    从source读取增量指令并写入out：COPY从基准文件复制(优先copy_file_range，数据不经过用户态)，LITERAL直接写入
+    COPY越过基准文件末尾或指令未知时抛出DeltaError
+    """
+    if _read_exact(source, len(DELTA_MAGIC)) != DELTA_MAGIC:
+        raise DeltaError("增量数据格式错误")
+    copied_bytes = literal_bytes = 0
+    while True:
+        op = _read_exact(source, 1)[0]
+        if op == OP_END:
+            break
+        if op == OP_COPY:
+            offset, length = _COPY.unpack(_read_exact(source, _COPY.size))
+            if offset + length > base_size:
+                raise DeltaError(f"复制区间[{offset}, {offset + length})超出基准文件大小{base_size}")
+            out.flush()
+            if copy_range(base_fd, out.fileno(), offset, length) != length:
+                raise DeltaError("基准文件在应用增量的过程中被截断")
+            copied_bytes += length
+        elif op == OP_LITERAL:
+            length, = _LITERAL.unpack(_read_exact(source, _LITERAL.size))
+            while length > 0:
+                data = _read_exact(source, min(length, CHUNK_SIZE))
+                out.write(data)
+                length -= len(data)
+                literal_bytes += len(data)
+        else:
+            raise DeltaError(f"未知的增量指令: {op}")
+    out.flush()
+    return DeltaStats(copied_bytes, literal_bytes)
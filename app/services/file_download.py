@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 18:10
+@Author : YangFei
+@File   : file_download.py
+@Desc   : 文件下载响应(Range断点续传、多段Range、条件请求、gzip/zstd按需压缩)
+"""
+import asyncio
+import mimetypes
+import os
+import re
+import secrets
+import stat
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.interface.errors.exceptions import BadRequestException, NotFoundException
+from app.services.file_compress import ZSTD_AVAILABLE, new_zstd_compressor
+from app.services.file_hash import file_signature
+
+# 每次从文件读取的字节数
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 小于该大小的文件不压缩
+COMPRESS_MIN_SIZE = 1024
+
+# 合并相邻区间后最多允许的Range数量，超出时忽略Range返回完整文件
+MAX_RANGES = 64
+
+# 可以压缩的非text/*类型
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-yaml",
+    "application/yaml",
+    "application/toml",
+    "application/x-sh",
+    "application/sql",
+    "application/csv",
+    "application/x-ndjson",
+    "image/svg+xml",
+}
+
+# 支持的压缩编码与对应的压缩器工厂(按优先级排列)
+ENCODINGS: List[Tuple[str, Callable]] = [
+    *([("zstd", new_zstd_compressor)] if ZSTD_AVAILABLE else []),
+    ("gzip", lambda: zlib.compressobj(6, zlib.DEFLATED, 31)),
+]
+
+_RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+def make_etag(st: os.stat_result, encoding: Optional[str] = None) -> str:
+    """根据文件签名生成强ETag，压缩后的表示追加编码后缀"""
+    tag = "-".join(f"{value:x}" for value in file_signature(st))
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def is_compressible(file_path: str) -> bool:
+    """根据文件扩展名判断内容是否适合压缩"""
+    media_type, _ = mimetypes.guess_type(file_path)
+    if media_type is None:
+        return False
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES or media_type.endswith(("+json", "+xml"))
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """根据Accept-Encoding选择压缩编码，权重相同时按ENCODINGS中的顺序优先"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name, _ in ENCODINGS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def parse_range(range_header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    解析Range请求头，返回按起始位置排序并合并后的[start, end)区间列表
+    1.格式不合法或不是bytes单位时返回None(忽略Range，返回完整文件)
+    2.所有区间都无法满足时返回空列表(416)
+    3.重叠或相邻的区间合并为一个，合并后数量超过MAX_RANGES时返回None
+    """
+    unit, _, specs = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+
+    # 1.解析每个区间：a-b、a-(到文件末尾)、-n(最后n个字节)
+    ranges: List[Tuple[int, int]] = []
+    for spec in specs.split(","):
+        match = _RANGE_SPEC.match(spec)
+        if match is None or match.group(1) == match.group(2) == "":
+            return None
+        first, last = match.group(1), match.group(2)
+        if first == "":
+            suffix = int(last)
+            if suffix > 0 and size > 0:
+                ranges.append((max(size - suffix, 0), size))
+            continue
+        start = int(first)
+        end = size if last == "" else int(last) + 1
+        if last != "" and end <= start:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size)))
+
+    # 2.排序后合并重叠或相邻的区间
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged if len(merged) <= MAX_RANGES else None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """弱比较If-None-Match中的ETag列表"""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(item.strip().removeprefix("W/") == opaque for item in header.split(","))
+
+
+def _parse_http_date(value: str) -> Optional[float]:
+    """解析HTTP日期，失败时返回None"""
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class FileDownloadResponse(Response):
+    """
+    文件下载响应
+    1.ETag由文件签名(设备, inode, 大小, 修改时间)生成，支持If-None-Match/If-Modified-Since返回304
+    2.支持单段/多段Range(multipart/byteranges)，If-Range与当前ETag或修改时间不一致时返回完整文件
+    3.不带Range的可压缩文本按Accept-Encoding流式压缩(zstd/gzip)，压缩在工作线程中完成
+    4.完整文件且服务器支持http.response.pathsend扩展时交给服务器零拷贝发送，否则在工作线程中按大块pread读取
+    5.所有响应头都基于打开后的fstat结果生成，保证头部与发送的内容一致
+    """
+
+    def __init__(
+            self,
+            file_path: str,
+            filename: Optional[str] = None,
+            media_type: str = "application/octet-stream",
+            compress: bool = True,
+    ) -> None:
+        """构造函数，compress为False时始终返回原始内容"""
+        self.file_path = file_path
+        self.filename = filename if filename is not None else os.path.basename(file_path)
+        self.media_type = media_type
+        self.compress = compress
+        self.status_code = 200
+        self.background = None
+        self.raw_headers = []
+
+    def _base_headers(self, st: os.stat_result, compressible: bool) -> dict:
+        """生成所有响应共用的头部"""
+        headers = {
+            "accept-ranges": "bytes",
+            "last-modified": formatdate(st.st_mtime, usegmt=True),
+            "content-type": self.media_type,
+        }
+        quoted = quote(self.filename)
+        if quoted != self.filename:
+            headers["content-disposition"] = f"attachment; filename*=utf-8''{quoted}"
+        else:
+            headers["content-disposition"] = f'attachment; filename="{self.filename}"'
+        if compressible:
+            headers["vary"] = "Accept-Encoding"
+        return headers
+
+    @classmethod
+    def _not_modified(cls, request_headers: Headers, st: os.stat_result, etags: List[str]) -> bool:
+        """判断条件请求是否可以返回304，If-None-Match存在时忽略If-Modified-Since"""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return any(_etag_matches(if_none_match, etag) for etag in etags)
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since is not None:
+            since = _parse_http_date(if_modified_since)
+            return since is not None and int(st.st_mtime) <= since
+        return False
+
+    @classmethod
+    def _if_range_matches(cls, if_range: Optional[str], st: os.stat_result) -> bool:
+        """If-Range只接受强ETag或与修改时间一致的日期"""
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith("W/"):
+            return False
+        if if_range.startswith('"'):
+            return if_range == make_etag(st)
+        since = _parse_http_date(if_range)
+        return since is not None and int(st.st_mtime) == since
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        head_only = scope["method"].upper() == "HEAD"
+
+        # 1.打开文件并基于fstat生成头部，后续全部通过该文件描述符读取
+        try:
+            fd = await asyncio.to_thread(os.open, self.file_path, os.O_RDONLY | os.O_CLOEXEC)
+        except FileNotFoundError:
+            raise NotFoundException(f"该文件不存在: {self.file_path}")
+        except OSError as e:
+            raise BadRequestException(f"文件打开失败: {str(e)}")
+        try:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                raise BadRequestException(f"该路径不是文件: {self.file_path}")
+
+            # 2.确定压缩编码(只对不带Range的可压缩文件生效)
+            compressible = self.compress and st.st_size >= COMPRESS_MIN_SIZE and is_compressible(self.filename)
+            encoding = negotiate_encoding(request_headers.get("accept-encoding")) if compressible else None
+            headers = self._base_headers(st, compressible)
+
+            # 3.条件请求命中时返回304
+            etags = [make_etag(st)] + ([make_etag(st, encoding)] if encoding else [])
+            if self._not_modified(request_headers, st, etags):
+                headers.pop("content-type")
+                headers["etag"] = etags[-1]
+                await self._send_start(send, 304, headers)
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            # 4.解析Range，If-Range不一致时忽略Range
+            ranges = None
+            range_header = request_headers.get("range")
+            if range_header is not None and self._if_range_matches(request_headers.get("if-range"), st):
+                ranges = parse_range(range_header, st.st_size)
+            if ranges is not None and not ranges:
+                headers["content-range"] = f"bytes */{st.st_size}"
+                headers["content-length"] = "0"
+                await self._send_start(send, 416, headers)
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            # 5.根据是否有Range与压缩编码选择发送方式
+            headers["etag"] = etags[0]
+            if ranges is not None and len(ranges) == 1:
+                start, end = ranges[0]
+                headers["content-range"] = f"bytes {start}-{end - 1}/{st.st_size}"
+                headers["content-length"] = str(end - start)
+                await self._send_start(send, 206, headers)
+                body = self._send_range(send, fd, start, end, more_body=False)
+            elif ranges is not None:
+                boundary = secrets.token_hex(13)
+                parts = [(
+                    f"--{boundary}\r\ncontent-type: {self.media_type}\r\n"
+                    f"content-range: bytes {start}-{end - 1}/{st.st_size}\r\n\r\n"
+                ).encode("latin-1") for start, end in ranges]
+                closing = f"--{boundary}--\r\n".encode("latin-1")
+                length = sum(len(part) + end - start + 2 for part, (start, end) in zip(parts, ranges)) + len(closing)
+                headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+                headers["content-length"] = str(length)
+                await self._send_start(send, 206, headers)
+                body = self._send_multipart(send, fd, ranges, parts, closing)
+            elif encoding is not None:
+                headers["etag"] = etags[1]
+                headers["content-encoding"] = encoding
+                await self._send_start(send, 200, headers)
+                body = self._send_compressed(send, fd, st.st_size, encoding)
+            else:
+                headers["content-length"] = str(st.st_size)
+                await self._send_start(send, 200, headers)
+                if "http.response.pathsend" in scope.get("extensions", {}) and not head_only:
+                    await send({"type": "http.response.pathsend", "path": os.path.abspath(self.file_path)})
+                    return
+                body = self._send_range(send, fd, 0, st.st_size, more_body=False)
+
+            if head_only:
+                body.close()
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            await self._run_until_disconnect(scope, receive, body)
+        finally:
+            os.close(fd)
+
+    async def _send_start(self, send: Send, status_code: int, headers: dict) -> None:
+        """发送响应状态与头部"""
+        self.status_code = status_code
+        raw_headers = [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()]
+        await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+
+    @classmethod
+    async def _run_until_disconnect(cls, scope: Scope, receive: Receive, body) -> None:
+        """发送响应内容，ASGI 2.4之前的服务器在客户端断开后不会报错，需要同时监听断开事件以便及时停止读取文件"""
+        spec_version = tuple(map(int, scope.get("asgi", {}).get("spec_version", "2.0").split(".")))
+        if spec_version >= (2, 4):
+            await body
+            return
+
+        async def wait_disconnect() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        body_task = asyncio.ensure_future(body)
+        disconnect_task = asyncio.ensure_future(wait_disconnect())
+        try:
+            await asyncio.wait([body_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (body_task, disconnect_task):
+                task.cancel()
+            await asyncio.gather(body_task, disconnect_task, return_exceptions=True)
+        if body_task.done() and not body_task.cancelled() and body_task.exception() is not None:
+            raise body_task.exception()
+
+    @classmethod
+    async def _send_range(cls, send: Send, fd: int, start: int, end: int, more_body: bool) -> None:
+        """在工作线程中按大块pread读取[start, end)并发送"""
+        if start >= end and not more_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        while start < end:
+            chunk = await asyncio.to_thread(os.pread, fd, min(DOWNLOAD_CHUNK_SIZE, end - start), start)
+            if not chunk:
+                raise RuntimeError("文件在发送过程中被截断")
+            start += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body or start < end})
+
+    @classmethod
+    async def _send_multipart(
+            cls,
+            send: Send,
+            fd: int,
+            ranges: List[Tuple[int, int]],
+            parts: List[bytes],
+            closing: bytes,
+    ) -> None:
+        """按multipart/byteranges格式依次发送每个区间"""
+        for part, (start, end) in zip(parts, ranges):
+            await send({"type": "http.response.body", "body": part, "more_body": True})
+            await cls._send_range(send, fd, start, end, more_body=True)
+            await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
+
+    @classmethod
+    async def _send_compressed(cls, send: Send, fd: int, size: int, encoding: str) -> None:
+        """在工作线程中读取并压缩每个分块后发送"""
+        compressor = dict(ENCODINGS)[encoding]()
+
+        def compress_chunk(offset: int) -> Tuple[bytes, int]:
+            data = os.pread(fd, min(DOWNLOAD_CHUNK_SIZE, size - offset), offset)
+            if not data or offset + len(data) >= size:
+                return compressor.compress(data) + compressor.flush(), len(data)
+            return compressor.compress(data), len(data)
+
+        offset = 0
+        while True:
+            compressed, read = await asyncio.to_thread(compress_chunk, offset)
+            offset += read
+            done = read == 0 or offset >= size
+            if compressed or done:
+                await send({"type": "http.response.body", "body": compressed, "more_body": not done})
+            if done:
+                break
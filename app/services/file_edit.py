@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 15:40
+@Author : YangFei
+@File   : file_edit.py
+@Desc   : 文件编辑工具(原子写入、流式替换、多处编辑)
+"""
+import errno
+import os
+import re
+import shutil
+import stat
+import tempfile
+from typing import Optional, IO, List, Tuple, Union, Callable
+
+# 流式处理时每次读取的字符数
+CHUNK_SIZE = 1024 * 1024
+
+# 正则模式下单个匹配允许跨越的最大字符数(分块边界需要保留的重叠区域)
+REGEX_OVERLAP = 64 * 1024
+
+# 落盘策略
+FSYNC_NONE = "none"
+FSYNC_DATA = "data"
+FSYNC_FULL = "full"
+
+# 无法原子替换时退化为直接覆盖原文件的错误(所在目录不可写、绑定挂载的文件无法被替换、跨文件系统)
+ATOMIC_FALLBACK_ERRNOS = (errno.EACCES, errno.EPERM, errno.EBUSY, errno.EXDEV)
+
+
+def sync_file(fd: int, policy: str) -> None:
+    """按落盘策略同步文件：data只同步数据(fdatasync)，full同步数据与元数据(fsync)"""
+    if policy == FSYNC_DATA:
+        os.fdatasync(fd)
+    elif policy == FSYNC_FULL:
+        os.fsync(fd)
+
+
+def sync_dir(dir_path: str) -> None:
+    """同步目录，保证目录中的新建/重命名操作落盘"""
+    fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class AtomicWriter:
+    """
+    原子写入器
+    1.在目标文件所在目录创建临时文件(保证与目标文件位于同一文件系统)
+    2.写入完成且没有异常时，按落盘策略同步数据，复制原文件的权限与属主，再通过os.replace原子替换目标文件
+    3.出现异常或调用discard()时删除临时文件，目标文件保持不变
+    4.fallback_in_place为True时，替换失败(绑定挂载、跨文件系统等)后把临时文件的内容直接覆盖写入目标文件
+    """
+
+    def __init__(
+            self,
+            file_path: str,
+            mode: str = "wb",
+            encoding: Optional[str] = None,
+            errors: Optional[str] = None,
+            newline: Optional[str] = None,
+            preserve_from: Optional[os.stat_result] = None,
+            preserve_mode: bool = True,
+            preserve_owner: bool = True,
+            fsync: str = FSYNC_NONE,
+            fallback_in_place: bool = False,
+    ) -> None:
+        """
+        构造函数
+        preserve_from为原文件的stat结果，preserve_mode/preserve_owner控制是否保留其权限与属主
+        fsync为落盘策略: none(交给操作系统)/data(替换前fdatasync)/full(替换前fsync并在替换后fsync所在目录)
+        """
+        self.file_path = file_path
+        self.mode = mode
+        self.encoding = encoding
+        self.errors = errors
+        self.newline = newline
+        self.preserve_from = preserve_from
+        self.preserve_mode = preserve_mode
+        self.preserve_owner = preserve_owner
+        self.fsync = fsync
+        self.fallback_in_place = fallback_in_place
+        self.temp_path: Optional[str] = None
+        self.file: Optional[IO] = None
+        self._discarded = False
+
+    def __enter__(self) -> "AtomicWriter":
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, self.temp_path = tempfile.mkstemp(
+            dir=directory,
+            prefix=f".{os.path.basename(self.file_path)}.",
+            suffix=".tmp",
+        )
+        self.file = os.fdopen(fd, self.mode, encoding=self.encoding, errors=self.errors, newline=self.newline)
+        return self
+
+    def discard(self) -> None:
+        """放弃本次写入，退出时删除临时文件"""
+        self._discarded = True
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            commit = exc_type is None and not self._discarded
+            if commit:
+                # 1.按落盘策略同步临时文件的数据
+                self.file.flush()
+                sync_file(self.file.fileno(), self.fsync)
+            self.file.close()
+            if commit:
+                # 2.保留原文件的权限与属主(非root用户修改属主会失败，忽略即可)
+                if self.preserve_from is not None and self.preserve_mode:
+                    os.chmod(self.temp_path, stat.S_IMODE(self.preserve_from.st_mode))
+                else:
+                    # 3.新文件(或不保留权限时)使用与open()一致的默认权限
+                    umask = os.umask(0)
+                    os.umask(umask)
+                    os.chmod(self.temp_path, 0o666 & ~umask)
+                if self.preserve_from is not None and self.preserve_owner:
+                    try:
+                        os.chown(self.temp_path, self.preserve_from.st_uid, self.preserve_from.st_gid)
+                    except PermissionError:
+                        pass
+
+                # 4.原子替换目标文件，full策略下同步目录项保证重命名本身落盘
+                try:
+                    os.replace(self.temp_path, self.file_path)
+                except OSError as e:
+                    if not self.fallback_in_place or e.errno not in ATOMIC_FALLBACK_ERRNOS:
+                        raise
+                    self._copy_in_place()
+                else:
+                    self.temp_path = None
+                    if self.fsync == FSYNC_FULL:
+                        sync_dir(os.path.dirname(os.path.abspath(self.file_path)))
+        finally:
+            if self.temp_path is not None:
+                try:
+                    os.unlink(self.temp_path)
+                except OSError:
+                    pass
+
+    def _copy_in_place(self) -> None:
+        """把临时文件的内容直接覆盖写入目标文件(无法原子替换时的退化方式)"""
+        with open(self.temp_path, "rb") as src, open(self.file_path, "wb") as dst:
+            copy_range(src.fileno(), dst.fileno(), 0, os.fstat(src.fileno()).st_size)
+            sync_file(dst.fileno(), self.fsync)
+
+
+def replace_file_bytes(
+        file_path: str,
+        data: bytes,
+        preserve_from: Optional[os.stat_result] = None,
+        preserve_mode: bool = True,
+        preserve_owner: bool = True,
+        fsync: str = FSYNC_NONE,
+) -> bool:
+    """
+    用data覆盖文件内容(file_path需已解析软链接)，返回是否为原子替换
+    1.优先写入临时文件后原子替换
+    2.原文件存在多个硬链接时，替换会使其他链接仍指向旧内容，直接覆盖原文件
+    3.创建临时文件或者替换失败(目录不可写、绑定挂载、跨文件系统)时退化为直接覆盖原文件
+    """
+    if preserve_from is None or preserve_from.st_nlink <= 1:
+        try:
+            with AtomicWriter(
+                    file_path,
+                    mode="wb",
+                    preserve_from=preserve_from,
+                    preserve_mode=preserve_mode,
+                    preserve_owner=preserve_owner,
+                    fsync=fsync,
+            ) as writer:
+                writer.file.write(data)
+            return True
+        except OSError as e:
+            if e.errno not in ATOMIC_FALLBACK_ERRNOS:
+                raise
+    with open(file_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        sync_file(f.fileno(), fsync)
+    return False
+
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """
+    把src_fd中[offset, offset + count)的内容写入dst_fd的当前位置，返回实际复制的字节数
+    优先使用os.copy_file_range(数据不经过用户态，支持reflink的文件系统上几乎没有开销)，
+    不支持时依次回退到os.sendfile(同样在内核中复制)与pread/write
+    """
+    copied_total = 0
+    use_copy_file_range = hasattr(os, "copy_file_range")
+    use_sendfile = hasattr(os, "sendfile")
+    while count > 0:
+        if use_copy_file_range:
+            try:
+                copied = os.copy_file_range(src_fd, dst_fd, count, offset)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                    raise
+                use_copy_file_range = False
+                continue
+        elif use_sendfile:
+            try:
+                copied = os.sendfile(dst_fd, src_fd, offset, count)
+            except OSError as e:
+                if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+                use_sendfile = False
+                continue
+        else:
+            data = memoryview(os.pread(src_fd, min(count, CHUNK_SIZE), offset))
+            copied = len(data)
+            while data:
+                data = data[os.write(dst_fd, data):]
+        if copied == 0:
+            break
+        offset += copied
+        count -= copied
+        copied_total += copied
+    return copied_total
+
+
+def stream_replace(
+        src: IO[str],
+        dst: IO[str],
+        pattern: re.Pattern,
+        replacement: Union[str, Callable[[re.Match], str]],
+        regex: bool = False,
+        max_replacements: Optional[int] = None,
+        overlap: Optional[int] = None,
+        chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """
+    分块读取src并把替换后的内容写入dst，返回替换次数
+    1.每个分块末尾overlap个字符暂不输出，与下一个分块拼接后再匹配，处理跨越分块边界的匹配
+    2.起始位置在安全边界之前、但一直延伸到缓冲区末尾的匹配可能还会变长，需要继续读取后再判断
+    3.已输出的末尾overlap个字符作为上下文保留在缓冲区开头(只参与匹配不再输出)，保证^与后行断言在边界处的语义
+    4.达到max_replacements后剩余内容原样复制
+    5.replacement可以是根据匹配结果生成替换内容的函数，只会对最终确定的匹配调用一次
+    """
+    if overlap is None:
+        overlap = REGEX_OVERLAP if regex else max(len(pattern.pattern), 1)
+    count = 0
+    context = ""
+    carry = ""
+    eof = False
+
+    while not eof:
+        # 1.读取下一个分块并与上一轮的上下文、剩余内容拼接
+        chunk = src.read(chunk_size)
+        eof = not chunk
+        buffer = context + carry + chunk
+        pos = len(context)
+        boundary = len(buffer) if eof else len(buffer) - overlap
+
+        # 2.依次处理可以确定的匹配
+        pending_start = len(buffer)
+        for match in pattern.finditer(buffer, pos):
+            if max_replacements is not None and count >= max_replacements:
+                break
+            if not eof and (match.start() >= boundary or match.end() >= len(buffer)):
+                pending_start = match.start()
+                break
+            dst.write(buffer[pos:match.start()])
+            if callable(replacement):
+                dst.write(replacement(match))
+            else:
+                dst.write(match.expand(replacement) if regex else replacement)
+            pos = match.end()
+            count += 1
+
+        # 3.达到替换上限时剩余内容原样复制
+        if max_replacements is not None and count >= max_replacements:
+            dst.write(buffer[pos:])
+            while chunk := src.read(chunk_size):
+                dst.write(chunk)
+            break
+
+        # 4.输出安全边界之前的内容，剩余内容留到下一轮
+        safe = len(buffer) if eof else max(pos, min(boundary, pending_start))
+        dst.write(buffer[pos:safe])
+        context = buffer[max(safe - overlap, 0):safe]
+        carry = buffer[safe:]
+
+    return count
+
+
+class _LineReader:
+    """从文本文件中最多读取指定行数的只读包装，供按行切分的分段流式处理使用"""
+
+    def __init__(self, src: IO[str], max_lines: int) -> None:
+        self.src = src
+        self.remaining = max_lines
+        self.lines_read = 0
+        self.last_line = ""
+
+    def read(self, size: int = -1) -> str:
+        parts = []
+        length = 0
+        while self.remaining > 0 and (size < 0 or length < size):
+            line = self.src.readline()
+            if not line:
+                self.remaining = 0
+                break
+            parts.append(line)
+            length += len(line)
+            self.remaining -= 1
+            self.lines_read += 1
+            self.last_line = line
+        return "".join(parts)
+
+
+def apply_edits(
+        src: IO[str],
+        dst: IO[str],
+        literal_edits: List[Tuple[int, str, str]],
+        line_edits: List[Tuple[int, int, int, str]],
+        chunk_size: int = CHUNK_SIZE,
+) -> List[int]:
+    """
+    单次遍历src，同时应用多个编辑并写入dst，返回每个编辑的生效次数(按编辑序号)
+    1.literal_edits为(序号, 原始字符串, 新字符串)，所有原始字符串合并为一个按顺序排列的分支正则，
+      同一位置有多个原始字符串可以匹配时排在前面的编辑优先
+    2.line_edits为(序号, 起始行, 结束行, 新内容)，行号相对原文件且从0开始(不包含结束行)，
+      起始行等于结束行表示在该行之前插入，区间之间不能重叠
+    3.字面量替换只作用于行编辑区间之外的原文件内容
+    4.文件行数不足时抛出ValueError
+    """
+    counts = [0] * (len(literal_edits) + len(line_edits))
+
+    # 1.把所有字面量合并为一个分支正则，通过命中的分组定位编辑序号
+    pattern = None
+    overlap = 1
+    if literal_edits:
+        pattern = re.compile("|".join(f"({re.escape(old)})" for _, old, _ in literal_edits))
+        overlap = max(len(old) for _, old, _ in literal_edits)
+
+    def replacement(match: re.Match) -> str:
+        index, _, new = literal_edits[match.lastindex - 1]
+        counts[index] += 1
+        return new
+
+    def copy_segment(segment: IO[str]) -> None:
+        if pattern is None:
+            shutil.copyfileobj(segment, dst, chunk_size)
+        else:
+            stream_replace(segment, dst, pattern, replacement, overlap=overlap, chunk_size=chunk_size)
+
+    # 2.按起始行依次处理行编辑：复制(并替换)区间之前的内容，跳过被替换的行，写入新内容
+    line_no = 0
+    for index, start_line, end_line, new in sorted(line_edits, key=lambda edit: edit[1]):
+        segment = _LineReader(src, start_line - line_no)
+        copy_segment(segment)
+        if segment.lines_read < start_line - line_no:
+            raise ValueError(f"第{index}个编辑的起始行{start_line}超出文件行数{line_no + segment.lines_read}")
+        line_no = start_line
+
+        for _ in range(end_line - start_line):
+            if not src.readline():
+                raise ValueError(f"第{index}个编辑的结束行{end_line}超出文件行数{line_no}")
+            line_no += 1
+
+        # 3.在没有换行结尾的最后一行之后插入内容时先补充换行
+        if new and segment.last_line and not segment.last_line.endswith(("\n", "\r")):
+            dst.write("\n")
+        dst.write(new)
+        counts[index] += 1
+
+    # 4.复制(并替换)剩余内容
+    copy_segment(src)
+    return counts
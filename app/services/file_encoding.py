@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 23:30
+@Author : YangFei
+@File   : file_encoding.py
+@Desc   : 文件内容的二进制嗅探与文本编码检测(只读取文件开头的少量字节)
+"""
+import codecs
+from typing import Optional, Tuple
+
+# 嗅探与编码检测使用的样本大小
+SNIFF_BYTES = 8192
+
+# 控制字符占比超过该值时视为二进制(制表、换行、回车、换页、退格、ESC除外)
+_BINARY_CONTROL_RATIO = 0.3
+_TEXT_CONTROL = {0x08, 0x09, 0x0a, 0x0c, 0x0d, 0x1b}
+
+# 带BOM的编码，按BOM长度从长到短匹配(UTF-32LE的BOM以UTF-16LE的BOM开头)
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# 常见二进制格式的文件头
+_MAGIC_NUMBERS = (
+    (b"\x7fELF", "elf"),
+    (b"PAR1", "parquet"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"%PDF-", "pdf"),
+    (b"PK\x03\x04", "zip"),
+    (b"PK\x05\x06", "zip"),
+    (b"\x1f\x8b", "gzip"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"BZh", "bzip2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"7z\xbc\xaf\x27\x1c", "7z"),
+    (b"SQLite format 3\x00", "sqlite"),
+    (b"\x93NUMPY", "npy"),
+    (b"\xca\xfe\xba\xbe", "java-class"),
+    (b"\x00asm", "wasm"),
+    (b"MZ", "pe"),
+)
+
+# 依次尝试的编码，gb18030兼容GBK/GB2312，latin-1可以解码任意字节作为兜底
+_FALLBACK_ENCODINGS = ("utf-8", "gb18030", "latin-1")
+
+
+def detect_bom(sample: bytes) -> Optional[str]:
+    """根据BOM判断编码，没有BOM时返回None"""
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    return None
+
+
+def detect_magic(sample: bytes) -> Optional[str]:
+    """根据文件头判断常见的二进制格式，无法识别时返回None"""
+    for magic, kind in _MAGIC_NUMBERS:
+        if sample.startswith(magic):
+            return kind
+    if sample[257:262] == b"ustar":
+        return "tar"
+    return None
+
+
+def sniff_binary(sample: bytes) -> Tuple[bool, Optional[str]]:
+    """
+    根据文件开头的样本判断是否为二进制文件，返回(是否二进制, 识别出的格式)
+    1.带BOM的文本(包括含有大量NUL字节的UTF-16/32)视为文本
+    2.能识别文件头、含有NUL字节或者控制字符占比过高时视为二进制
+    """
+    if not sample or detect_bom(sample) is not None:
+        return False, None
+    kind = detect_magic(sample)
+    if kind is not None and kind != "pe":
+        return True, kind
+    if b"\x00" in sample:
+        return True, kind
+    controls = sum(1 for byte in sample if byte < 0x20 and byte not in _TEXT_CONTROL)
+    return controls / len(sample) > _BINARY_CONTROL_RATIO, None
+
+
+def _decodes(sample: bytes, encoding: str) -> bool:
+    """样本能否按encoding严格解码(样本末尾被截断的多字节字符不算错误)"""
+    try:
+        codecs.getincrementaldecoder(encoding)("strict").decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(sample: bytes) -> str:
+    """根据样本检测文本编码：优先BOM，其次依次尝试utf-8、gb18030，都失败时使用latin-1"""
+    encoding = detect_bom(sample)
+    if encoding is not None:
+        return encoding
+    for encoding in _FALLBACK_ENCODINGS:
+        if _decodes(sample, encoding):
+            return encoding
+    return "latin-1"
+
+
+def decode_text(data: bytes, encoding: str = "utf-8") -> str:
+    """按文本模式解码全部内容并统一换行符，不是合法的encoding时根据开头的样本检测编码，无法解码的字节替换为U+FFFD"""
+    try:
+        content = data.decode(encoding)
+    except UnicodeDecodeError:
+        content = data.decode(detect_encoding(data[:SNIFF_BYTES]), errors="replace")
+    return content.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def normalize_encoding(encoding: str) -> str:
+    """校验并规范化编码名称，未知编码抛出LookupError"""
+    return codecs.lookup(encoding).name
+
+
+def range_encoding(encoding: str, sample: bytes, start: int) -> str:
+    """
+    确定从start开始解码时使用的编码
+    utf-16/utf-32要求数据以BOM开头，不从文件开头读取时根据文件开头的BOM换成对应字节序的编码(没有BOM时按小端)
+    """
+    name = codecs.lookup(encoding).name
+    if start == 0 or name not in ("utf-16", "utf-32"):
+        return name
+    big_endian = sample.startswith(codecs.BOM_UTF32_BE if name == "utf-32" else codecs.BOM_UTF16_BE)
+    return f"{name}-be" if big_endian else f"{name}-le"
+
+
+def decode_range(data: bytes, encoding: str, start: int, at_eof: bool) -> Tuple[str, int, int]:
+    """
+    解码文件中从start开始的一段字节，返回(文本, 跳过的开头字节数, 实际解码的字节数)
+    1.范围不在文件开头时跳过开头不完整的字符：UTF-8跳过最多3个续字节，UTF-16/32对齐到码元边界
+    2.范围不在文件末尾时，末尾不完整的多字节字符留给下一次读取，不会产生乱码
+    3.其余无法解码的字节替换为U+FFFD
+    """
+    name = codecs.lookup(encoding).name
+    skipped = 0
+    if start > 0:
+        if name == "utf-8":
+            while skipped < min(3, len(data)) and 0x80 <= data[skipped] <= 0xbf:
+                skipped += 1
+        elif name.startswith(("utf-16", "utf-32")):
+            unit = 2 if name.startswith("utf-16") else 4
+            skipped = min(-start % unit, len(data))
+    decoder = codecs.getincrementaldecoder(encoding)("replace")
+    text = decoder.decode(data[skipped:], final=at_eof)
+    pending = len(decoder.getstate()[0]) if not at_eof else 0
+    return text, skipped, len(data) - skipped - pending
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 22:50
+@Author : YangFei
+@File   : file_follow.py
+@Desc   : 跟踪持续增长的文件(类似tail -F)，通过inotify感知变化，不可用时退化为stat轮询
+"""
+import asyncio
+import codecs
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.inotify import Inotify, InotifyError, inotify_available, IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, \
+    IN_CREATE, IN_MOVED_TO, IN_DELETE_SELF, IN_MOVE_SELF, IN_IGNORED, IN_Q_OVERFLOW, IN_ONLYDIR
+
+logger = logging.getLogger(__name__)
+
+# 被跟踪文件需要关注的事件(追加写入、截断、被删除或被重命名)
+FOLLOW_FILE_EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+# 所在文件夹需要关注的事件(轮转后在原路径创建新文件)
+FOLLOW_DIR_EVENTS = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+
+# 跟踪事件类型
+FOLLOW_DATA = "data"
+FOLLOW_TRUNCATED = "truncated"
+FOLLOW_ROTATED = "rotated"
+FOLLOW_DELETED = "deleted"
+
+# 向前查找最后N行时每次读取的字节数
+_TAIL_BLOCK = 64 * 1024
+
+
+def tail_offset(fd: int, size: int, lines: int) -> int:
+    """从文件末尾向前查找，返回最后lines行的起始字节偏移(末尾的换行符不算作新的一行)"""
+    if lines <= 0 or size == 0:
+        return size
+    need = lines + 1 if os.pread(fd, 1, size - 1) == b"\n" else lines
+    found = 0
+    position = size
+    while position > 0:
+        start = max(0, position - _TAIL_BLOCK)
+        block = os.pread(fd, position - start, start)
+        index = len(block)
+        while True:
+            index = block.rfind(b"\n", 0, index)
+            if index < 0:
+                break
+            found += 1
+            if found == need:
+                return start + index + 1
+        position = start
+    return 0
+
+
+class FollowEvent(NamedTuple):
+    """一次跟踪事件，offset为事件发生后的读取位置"""
+    event: str
+    offset: int
+    data: str = ""
+
+
+def sse_message(event: str, event_id: Optional[int], payload: dict) -> str:
+    """格式化为一条SSE消息，id为读取位置，客户端断线重连时通过Last-Event-ID从该位置继续"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class FollowWatcher:
+    """
+    所有跟踪共享的inotify实例
+    1.inotify实例数量有系统上限(max_user_instances)，因此全部跟踪共用一个实例，在事件循环中通过add_reader读取事件
+    2.同一个inode在一个实例中只有一个watch，按watch记录订阅者，最后一个订阅者退订时才移除watch
+    3.文件夹watch的订阅者只关心特定文件名，其他文件的创建不会唤醒
+    """
+
+    def __init__(self) -> None:
+        self._inotify: Optional[Inotify] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[int, List[Tuple[asyncio.Event, Optional[str]]]] = {}
+
+    def _ensure_inotify(self) -> Optional[Inotify]:
+        if self._inotify is not None and self._loop is not asyncio.get_running_loop():
+            # 事件循环已更换(例如应用重启)，旧循环上的监听全部作废
+            self.close()
+        if self._inotify is None and inotify_available():
+            try:
+                self._inotify = Inotify()
+            except InotifyError as e:
+                logger.warning(f"创建inotify实例失败, 文件跟踪退化为轮询: {str(e)}")
+                return None
+            self._loop = asyncio.get_running_loop()
+            self._loop.add_reader(self._inotify.fd, self._on_readable)
+        return self._inotify
+
+    def subscribe(self, path: str, mask: int, wake: asyncio.Event, name: Optional[str] = None) -> Optional[int]:
+        """监听path，有事件时设置wake，返回watch描述符，无法监听时返回None(调用方需要轮询)"""
+        inotify = self._ensure_inotify()
+        if inotify is None:
+            return None
+        try:
+            wd = inotify.add_watch(path, mask)
+        except InotifyError as e:
+            logger.debug(f"添加跟踪监听失败, 退化为轮询: {str(e)}")
+            return None
+        self._subscribers.setdefault(wd, []).append((wake, name))
+        return wd
+
+    def unsubscribe(self, wd: Optional[int], wake: asyncio.Event) -> None:
+        """退订watch，没有订阅者时移除watch"""
+        subscribers = self._subscribers.get(wd)
+        if not subscribers:
+            return
+        subscribers[:] = [item for item in subscribers if item[0] is not wake]
+        if not subscribers:
+            del self._subscribers[wd]
+            if self._inotify is not None:
+                self._inotify.rm_watch(wd)
+
+    def _on_readable(self) -> None:
+        """事件循环回调: 读取就绪的事件并唤醒对应的订阅者"""
+        for event in self._inotify.read_events():
+            if event.mask & IN_Q_OVERFLOW:
+                # 事件丢失时唤醒全部订阅者重新检查
+                for subscribers in self._subscribers.values():
+                    for wake, _ in subscribers:
+                        wake.set()
+                continue
+            for wake, name in self._subscribers.get(event.wd, ()):
+                if name is None or not event.name or event.name == name:
+                    wake.set()
+            if event.mask & IN_IGNORED:
+                # watch已被内核移除(文件被删除)，描述符之后可能被复用
+                self._subscribers.pop(event.wd, None)
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        self._subscribers.clear()
+
+
+class FileFollower:
+    """
+    单个文件的跟踪状态
+    1.记录已打开文件的(设备, inode)与读取位置，每次检查只读取新增的字节
+    2.文件大小小于读取位置时视为被截断(copytruncate)，从头开始读取
+    3.读完旧文件后路径指向了新的inode时视为被轮转，切换到新文件从头读取；路径不存在时等待文件重新创建
+    4.字节按UTF-8增量解码，多字节字符被拆分在两次读取之间时不会产生乱码
+    """
+
+    def __init__(self, file_path: str, max_read: int) -> None:
+        self.file_path = file_path
+        self.max_read = max_read
+        self.position = 0
+        self.identity: Optional[Tuple[int, int]] = None
+        self.deleted = False
+        self._fd: Optional[int] = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def open(self, offset: Optional[int], lines: int) -> Tuple[int, int, bool]:
+        """
+        打开文件并确定起始位置，返回(起始位置, 文件大小, 是否已截断)
+        offset优先；offset超过文件大小说明客户端断线期间文件被截断，从头开始读取
+        """
+        fd = os.open(self.file_path, os.O_RDONLY | os.O_CLOEXEC)
+        st = os.fstat(fd)
+        self._fd = fd
+        self.identity = (st.st_dev, st.st_ino)
+        truncated = False
+        if offset is None:
+            self.position = tail_offset(fd, st.st_size, lines)
+        elif offset > st.st_size:
+            self.position = 0
+            truncated = True
+        else:
+            self.position = offset
+        return self.position, st.st_size, truncated
+
+    def _reset(self, fd: Optional[int], st: Optional[os.stat_result]) -> None:
+        if self._fd is not None and self._fd != fd:
+            os.close(self._fd)
+        self._fd = fd
+        self.identity = (st.st_dev, st.st_ino) if st is not None else None
+        self.position = 0
+        self._decoder.reset()
+
+    def _read(self, events: List[FollowEvent]) -> bool:
+        """读取新增的字节(最多max_read)，返回是否还有未读取的数据"""
+        st = os.fstat(self._fd)
+        if st.st_size < self.position:
+            self.position = 0
+            self._decoder.reset()
+            events.append(FollowEvent(FOLLOW_TRUNCATED, 0))
+        if st.st_size == self.position:
+            return False
+        data = os.pread(self._fd, min(self.max_read, st.st_size - self.position), self.position)
+        if not data:
+            return False
+        self.position += len(data)
+        text = self._decoder.decode(data)
+        if text:
+            # 事件位置不包含解码器中尚未组成完整字符的字节，从该位置续传不会拆分字符
+            events.append(FollowEvent(FOLLOW_DATA, self.position - len(self._decoder.getstate()[0]), text))
+        return self.position < st.st_size
+
+    def check(self) -> Tuple[List[FollowEvent], bool, bool]:
+        """
+        检查一次文件变化，返回(事件列表, 是否还有未读取的数据, 是否切换了文件)
+        在工作线程中执行，读取量受max_read限制，避免单次占用过久
+        """
+        events: List[FollowEvent] = []
+        if self._fd is not None and self._read(events):
+            return events, True, False
+
+        # 旧文件已读完，检查路径是否指向了新的文件
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            if not self.deleted:
+                self.deleted = True
+                events.append(FollowEvent(FOLLOW_DELETED, self.position))
+            return events, False, False
+        if self._fd is not None and (st.st_dev, st.st_ino) == self.identity:
+            return events, False, False
+        try:
+            fd = os.open(self.file_path, os.O_RDONLY | os.O_CLOEXEC)
+        except FileNotFoundError:
+            return events, False, False
+        self._reset(fd, os.fstat(fd))
+        self.deleted = False
+        events.append(FollowEvent(FOLLOW_ROTATED, 0))
+        return events, self._read(events), True
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 14:20
+@Author : YangFei
+@File   : file_hash.py
+@Desc   : 文件内容哈希与按文件签名缓存的LRU
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# 支持的哈希算法，默认使用标准库中速度较快的blake2b(128位)
+HASH_ALGORITHMS = ("blake2b", "sha256")
+DEFAULT_HASH_ALGORITHM = "blake2b"
+
+
+def new_hasher(algorithm: str):
+    """根据算法名字创建哈希对象"""
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    if algorithm == "sha256":
+        return hashlib.sha256()
+    raise ValueError(f"不支持的哈希算法: {algorithm}")
+
+
+def file_signature(st: os.stat_result) -> Tuple[int, int, int, int]:
+    """根据stat结果生成文件签名(设备, inode, 大小, 修改时间)，签名不变则认为内容不变"""
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class FileHashCache:
+    """以(文件签名, 算法)为key的内容哈希LRU缓存"""
+
+    def __init__(self, max_entries: int = 8192) -> None:
+        """构造函数，max_entries为最多缓存的哈希数量"""
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def hash_bytes(cls, data: bytes, algorithm: str = DEFAULT_HASH_ALGORITHM) -> str:
+        """计算字节内容的哈希，返回"算法:十六进制摘要"格式"""
+        hasher = new_hasher(algorithm)
+        hasher.update(data)
+        return f"{algorithm}:{hasher.hexdigest()}"
+
+    def lookup(self, st: os.stat_result, algorithm: str = DEFAULT_HASH_ALGORITHM) -> Optional[str]:
+        """根据文件签名查询已缓存的哈希"""
+        key = (file_signature(st), algorithm)
+        with self._lock:
+            digest = self._cache.get(key)
+            if digest is not None:
+                self._cache.move_to_end(key)
+            return digest
+
+    def store(self, st: os.stat_result, digest: str, algorithm: str = DEFAULT_HASH_ALGORITHM) -> None:
+        """缓存文件签名对应的哈希，超出容量时淘汰最久未使用的记录"""
+        key = (file_signature(st), algorithm)
+        with self._lock:
+            self._cache[key] = digest
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def hash_file(self, file_path: str, algorithm: str = DEFAULT_HASH_ALGORITHM) -> Tuple[str, os.stat_result]:
+        """计算文件内容的哈希(签名未变时直接使用缓存)，返回(哈希, stat结果)"""
+        # 1.签名未变化时直接返回缓存
+        st = os.stat(file_path)
+        digest = self.lookup(st, algorithm)
+        if digest is not None:
+            return digest, st
+
+        # 2.分块读取文件计算哈希
+        with open(file_path, "rb") as f:
+            hasher = hashlib.file_digest(f, lambda: new_hasher(algorithm))
+        digest = f"{algorithm}:{hasher.hexdigest()}"
+
+        # 3.读取期间文件未被修改时才写入缓存
+        after = os.stat(file_path)
+        if file_signature(after) == file_signature(st):
+            self.store(st, digest, algorithm)
+        return digest, after
@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 11:32
+@Author : YangFei
+@File   : file_index.py
+@Desc   : 基于inotify维护的文件元数据内存索引
+"""
+import logging
+import os
+import select
+import stat
+import threading
+from typing import Dict, List, Optional, Tuple, Set
+
+from app.services.file_journal import ChangeJournal, ChangeRecord, CHANGE_CREATED, CHANGE_MODIFIED, CHANGE_DELETED
+from app.services.file_walker import DEFAULT_IGNORE_NAMES
+from app.services.inotify import Inotify, InotifyError, inotify_available, IN_CREATE, IN_DELETE, IN_MOVED_FROM, \
+    IN_MOVED_TO, IN_Q_OVERFLOW, IN_IGNORED, IN_DELETE_SELF, IN_MOVE_SELF, IN_ISDIR
+
+logger = logging.getLogger(__name__)
+
+"""
+1.每个被监听的根目录会完整扫描一次，记录每个文件夹的子条目及其lstat结果
+2.每个文件夹注册一个inotify watch，事件线程根据事件增量更新内存中的条目
+3.inotify事件队列溢出或者watch数量达到系统上限时，相关文件夹退化为mtime校验模式:
+  读取前先比对文件夹的mtime，发生变化则重新扫描该文件夹
+4.默认忽略的目录(node_modules、.git等)不建立索引，查询时直接回退到磁盘
+5.事件线程同时把创建/修改/删除写入变更日志，供变更订阅按游标增量读取
+"""
+
+
+class CachedEntry:
+    """内存索引中的目录条目，接口与os.DirEntry保持一致，可直接交给目录遍历器使用"""
+    __slots__ = ("name", "path", "_stat")
+
+    def __init__(self, name: str, path: str, st: os.stat_result) -> None:
+        self.name = name
+        self.path = path
+        self._stat = st
+
+    def is_symlink(self) -> bool:
+        return stat.S_ISLNK(self._stat.st_mode)
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        if follow_symlinks and self.is_symlink():
+            return os.path.isdir(self.path)
+        return stat.S_ISDIR(self._stat.st_mode)
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        if follow_symlinks and self.is_symlink():
+            return os.path.isfile(self.path)
+        return stat.S_ISREG(self._stat.st_mode)
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        if follow_symlinks and self.is_symlink():
+            return os.stat(self.path)
+        return self._stat
+
+    def inode(self) -> int:
+        return self._stat.st_ino
+
+
+class _DirNode:
+    """索引中的单个文件夹"""
+    __slots__ = ("entries", "mtime_ns", "wd", "stale", "sorted_entries")
+
+    def __init__(self, mtime_ns: int, wd: Optional[int]) -> None:
+        self.entries: Dict[str, os.stat_result] = {}
+        self.mtime_ns = mtime_ns
+        self.wd = wd  # 为None表示没有watch，需要通过mtime校验
+        self.stale = False  # 事件溢出后置为True，下次读取前需要校验mtime
+        self.sorted_entries: Optional[List[CachedEntry]] = None
+
+
+class FileIndex:
+    """监听根目录的文件元数据内存索引"""
+
+    def __init__(self, journal_size: int = 10000) -> None:
+        """构造函数，inotify与事件线程在首次监听时才创建"""
+        self._lock = threading.RLock()
+        self._roots: Dict[str, int] = {}  # 根目录 -> 开始监听时变更日志的序号
+        self._dirs: Dict[str, _DirNode] = {}
+        self._wd_paths: Dict[int, str] = {}
+        self._inotify: Optional[Inotify] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._unwatched_dirs: Set[str] = set()  # 无法添加watch的文件夹，变更日志无法覆盖
+        self.journal = ChangeJournal(journal_size)
+
+    def _ensure_inotify(self) -> Optional[Inotify]:
+        """惰性创建inotify实例与事件线程，系统不支持时返回None(全部使用mtime校验)"""
+        if self._inotify is None and inotify_available():
+            try:
+                self._inotify = Inotify()
+            except InotifyError as e:
+                logger.warning(f"inotify不可用, 文件索引将使用mtime校验: {str(e)}")
+                return None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._event_loop, name="file-index-inotify", daemon=True)
+            self._thread.start()
+        return self._inotify
+
+    def _find_root(self, path: str) -> Optional[str]:
+        """获取包含该路径的监听根目录"""
+        for root in self._roots:
+            if path == root or path.startswith(root.rstrip("/") + "/"):
+                return root
+        return None
+
+    def _add_watch(self, path: str) -> Optional[int]:
+        """为文件夹添加watch，失败(例如达到watch上限)时返回None"""
+        if self._inotify is None:
+            self._unwatched_dirs.add(path)
+            return None
+        try:
+            wd = self._inotify.add_watch(path)
+        except InotifyError as e:
+            logger.warning(f"文件夹[{path}]无法添加inotify监听, 退化为mtime校验: {str(e)}")
+            self._unwatched_dirs.add(path)
+            return None
+        self._wd_paths[wd] = path
+        return wd
+
+    def _scan_dir(self, path: str, node: Optional[_DirNode] = None) -> Optional[_DirNode]:
+        """扫描单个文件夹(先添加watch再读取，避免遗漏扫描期间的变更)，返回文件夹节点"""
+        try:
+            dir_stat = os.stat(path)
+        except OSError:
+            return None
+        if node is None:
+            node = _DirNode(dir_stat.st_mtime_ns, self._add_watch(path))
+        node.mtime_ns = dir_stat.st_mtime_ns
+
+        entries = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        entries[entry.name] = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        node.entries = entries
+        node.stale = False
+        node.sorted_entries = None
+        self._dirs[path] = node
+        return node
+
+    def _scan_tree(self, path: str, report: bool = False) -> None:
+        """递归扫描文件夹树，跳过默认忽略的目录，report为True时把扫描到的条目记录为新建"""
+        pending = [path]
+        while pending:
+            dir_path = pending.pop()
+            node = self._scan_dir(dir_path, self._dirs.get(dir_path))
+            if node is None:
+                continue
+            for name, st in node.entries.items():
+                is_dir = stat.S_ISDIR(st.st_mode)
+                if report:
+                    self.journal.record(CHANGE_CREATED, os.path.join(dir_path, name), is_dir)
+                if is_dir and name not in DEFAULT_IGNORE_NAMES:
+                    pending.append(os.path.join(dir_path, name))
+
+    def _drop_tree(self, path: str) -> None:
+        """从索引中移除文件夹树并释放对应的watch"""
+        prefix = path.rstrip("/") + "/"
+        for dir_path in [p for p in self._dirs if p == path or p.startswith(prefix)]:
+            node = self._dirs.pop(dir_path)
+            self._unwatched_dirs.discard(dir_path)
+            if node.wd is not None:
+                self._wd_paths.pop(node.wd, None)
+                if self._inotify is not None:
+                    self._inotify.rm_watch(node.wd)
+
+    def watch(self, root: str) -> Tuple[int, int, bool]:
+        """监听根目录并建立索引，返回(文件夹数, 文件数, 是否存在退化为mtime校验的文件夹)"""
+        root = os.path.abspath(root)
+        with self._lock:
+            # 1.已经被其他根目录覆盖时直接返回，包含已有根目录时先合并
+            if self._find_root(root) is None:
+                for existing in [r for r in self._roots if r.startswith(root.rstrip("/") + "/")]:
+                    self._roots.pop(existing)
+                self._ensure_inotify()
+                self._scan_tree(root)
+                self._roots[root] = self.journal.last_seq
+            return self.stats(root)
+
+    def unwatch(self, root: str) -> bool:
+        """取消根目录的监听并释放索引"""
+        root = os.path.abspath(root)
+        with self._lock:
+            if root not in self._roots:
+                return False
+            self._roots.pop(root)
+            self._drop_tree(root)
+            return True
+
+    def stats(self, root: str) -> Tuple[int, int, bool]:
+        """统计根目录索引中的文件夹数、文件数以及是否存在mtime校验的文件夹"""
+        prefix = root.rstrip("/") + "/"
+        dirs = files = 0
+        degraded = self._inotify is None
+        with self._lock:
+            for dir_path, node in self._dirs.items():
+                if dir_path == root or dir_path.startswith(prefix):
+                    dirs += 1
+                    files += sum(1 for st in node.entries.values() if not stat.S_ISDIR(st.st_mode))
+                    degraded = degraded or node.wd is None or node.stale
+        return dirs, files, degraded
+
+    def _get_node(self, path: str) -> Optional[_DirNode]:
+        """获取文件夹节点，对没有watch或已过期的节点先进行mtime校验"""
+        node = self._dirs.get(path)
+        if node is None or self._find_root(path) is None:
+            return None
+        if node.wd is None or node.stale:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                self._drop_tree(path)
+                return None
+            if mtime_ns != node.mtime_ns:
+                node = self._scan_dir(path, node)
+        return node
+
+    def list_dir(self, path: str) -> Optional[List[CachedEntry]]:
+        """返回文件夹按名字排序的子条目，不在索引中时返回None(调用方应回退到磁盘)"""
+        path = os.path.abspath(path)
+        with self._lock:
+            node = self._get_node(path)
+            if node is None:
+                return None
+            if node.sorted_entries is None:
+                node.sorted_entries = [
+                    CachedEntry(name, os.path.join(path, name), node.entries[name]) for name in sorted(node.entries)
+                ]
+            return node.sorted_entries
+
+    def lookup(self, path: str) -> Tuple[bool, Optional[os.stat_result]]:
+        """查询路径的lstat结果，返回(是否被索引覆盖, stat结果或None表示不存在)"""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._roots:
+                node = self._get_node(path)
+                return node is not None, None if node is None else os.lstat(path)
+            parent, name = os.path.split(path)
+            node = self._get_node(parent)
+            if node is None:
+                return False, None
+            return True, node.entries.get(name)
+
+    def covers(self, path: str) -> bool:
+        """判断路径是否位于监听的根目录之下"""
+        with self._lock:
+            return self._find_root(os.path.abspath(path)) is not None
+
+    def changes(
+            self,
+            path: str,
+            after_seq: Optional[int],
+            limit: int,
+    ) -> Tuple[Optional[List[ChangeRecord]], int, bool]:
+        """
+        读取目录在after_seq之后的变更，返回(记录列表, 新的序号, 是否还有更多)
+        记录列表为None表示需要全量同步: 没有游标、游标早于开始监听或已被环形缓冲区覆盖、存在无法监听的文件夹
+        """
+        path = os.path.abspath(path)
+        prefix = path.rstrip("/") + "/"
+        with self._lock:
+            root = self._find_root(path)
+            if root is None or after_seq is None or after_seq < self._roots[root] \
+                    or any(p == path or p.startswith(prefix) for p in self._unwatched_dirs):
+                return None, self.journal.last_seq, False
+            return self.journal.read(after_seq, path, limit)
+
+    def snapshot(self, path: str) -> List[Tuple[str, os.stat_result]]:
+        """获取目录下所有已索引条目的(路径, lstat结果)，按路径排序"""
+        path = os.path.abspath(path)
+        prefix = path.rstrip("/") + "/"
+        with self._lock:
+            items = [
+                (os.path.join(dir_path, name), st)
+                for dir_path, node in self._dirs.items() if dir_path == path or dir_path.startswith(prefix)
+                for name, st in node.entries.items()
+            ]
+        items.sort(key=lambda item: item[0])
+        return items
+
+    def _handle_event(self, dir_path: str, mask: int, name: str) -> None:
+        """根据单个inotify事件增量更新索引"""
+        node = self._dirs.get(dir_path)
+        if node is None:
+            return
+
+        # 1.文件夹自身被删除或移走，移除整棵子树
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and not name:
+            self._drop_tree(dir_path)
+            return
+        if not name:
+            return
+
+        path = os.path.join(dir_path, name)
+        node.sorted_entries = None
+
+        # 2.删除或移出事件，移除条目(文件夹需要同时移除子树)
+        existed = name in node.entries
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            node.entries.pop(name, None)
+            if existed:
+                self.journal.record(CHANGE_DELETED, path, bool(mask & IN_ISDIR))
+            if mask & IN_ISDIR:
+                self._drop_tree(path)
+            return
+
+        # 3.创建、移入、修改、属性变更事件，重新获取lstat结果
+        try:
+            st = os.lstat(path)
+        except OSError:
+            if node.entries.pop(name, None) is not None:
+                self.journal.record(CHANGE_DELETED, path, bool(mask & IN_ISDIR))
+            return
+        node.entries[name] = st
+        is_dir = stat.S_ISDIR(st.st_mode)
+        if not existed:
+            self.journal.record(CHANGE_CREATED, path, is_dir)
+        elif not is_dir:
+            self.journal.record(CHANGE_MODIFIED, path, is_dir)
+
+        # 4.新出现的文件夹需要扫描并添加watch，其中已有的条目同样记录为新建
+        if mask & (IN_CREATE | IN_MOVED_TO) and is_dir and name not in DEFAULT_IGNORE_NAMES:
+            self._scan_tree(path, report=True)
+
+    def _rebuild(self) -> None:
+        """事件队列溢出后逐个文件夹重新扫描，每个文件夹单独加锁，重建期间查询走mtime校验"""
+        with self._lock:
+            pending = list(self._roots)
+        while pending:
+            dir_path = pending.pop()
+            with self._lock:
+                if self._find_root(dir_path) is None:
+                    continue
+                node = self._dirs.get(dir_path)
+                if node is None or node.stale:
+                    node = self._scan_dir(dir_path, node)
+                if node is None:
+                    continue
+                pending.extend(
+                    os.path.join(dir_path, name) for name, st in node.entries.items()
+                    if stat.S_ISDIR(st.st_mode) and name not in DEFAULT_IGNORE_NAMES
+                )
+
+    def _event_loop(self) -> None:
+        """事件线程: 读取inotify事件并更新索引"""
+        inotify = self._inotify
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([inotify.fd], [], [], 1.0)
+            except (OSError, ValueError):
+                break
+            if not ready:
+                continue
+
+            events = inotify.read_events()
+            overflow = False
+            with self._lock:
+                for event in events:
+                    if event.mask & IN_Q_OVERFLOW:
+                        # 事件队列溢出，所有文件夹标记为过期
+                        logger.warning("inotify事件队列溢出, 文件索引将重新扫描")
+                        for node in self._dirs.values():
+                            node.stale = True
+                        self.journal.invalidate()
+                        overflow = True
+                        continue
+                    dir_path = self._wd_paths.get(event.wd)
+                    if event.mask & IN_IGNORED:
+                        # watch已失效(文件夹被删除或主动移除)
+                        if dir_path is not None and self._dirs.get(dir_path) is not None \
+                                and self._dirs[dir_path].wd == event.wd:
+                            self._dirs[dir_path].wd = None
+                        self._wd_paths.pop(event.wd, None)
+                        continue
+                    if dir_path is not None:
+                        self._handle_event(dir_path, event.mask, event.name)
+            if overflow:
+                self._rebuild()
+
+    def close(self) -> None:
+        """停止事件线程并释放全部索引"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        with self._lock:
+            self._roots.clear()
+            self._dirs.clear()
+            self._unwatched_dirs.clear()
+            self._wd_paths.clear()
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
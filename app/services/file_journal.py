@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 13:10
+@Author : YangFei
+@File   : file_journal.py
+@Desc   : 文件变更日志(定长环形缓冲区)
+"""
+import base64
+import binascii
+import json
+import threading
+import uuid
+from typing import List, NamedTuple, Optional, Tuple
+
+# 变更类型
+CHANGE_CREATED = "created"
+CHANGE_MODIFIED = "modified"
+CHANGE_DELETED = "deleted"
+
+
+class ChangeRecord(NamedTuple):
+    """单条变更记录"""
+    seq: int
+    kind: str
+    path: str
+    is_dir: bool
+
+
+class ChangeJournal:
+    """
+    定长环形缓冲区实现的文件变更日志
+    1.每条记录分配一个单调递增的序号，序号为seq的记录存放在seq % size的位置，按游标读取的代价只与变更数量相关
+    2.缓冲区写满后最旧的记录被覆盖，游标早于最旧记录时调用方需要重新全量同步
+    3.epoch在每个日志实例创建时随机生成，服务重启后旧游标全部失效
+    """
+
+    def __init__(self, size: int = 10000) -> None:
+        """构造函数，size为环形缓冲区能保留的最大记录数"""
+        self.size = max(size, 1)
+        self.epoch = uuid.uuid4().hex[:12]
+        self._buffer: List[Optional[ChangeRecord]] = [None] * self.size
+        self._next_seq = 1
+        self._reset_seq = 0  # 小于该序号的游标都需要全量同步(事件溢出时占用一个新序号)
+        self._lock = threading.Lock()
+
+    @property
+    def last_seq(self) -> int:
+        """最近一条记录的序号"""
+        return self._next_seq - 1
+
+    def record(self, kind: str, path: str, is_dir: bool = False) -> None:
+        """追加一条变更记录，与上一条完全相同的修改记录直接合并"""
+        with self._lock:
+            last = self._buffer[(self._next_seq - 1) % self.size]
+            if kind == CHANGE_MODIFIED and last is not None and last.seq == self._next_seq - 1 \
+                    and last.kind == kind and last.path == path:
+                return
+            self._buffer[self._next_seq % self.size] = ChangeRecord(self._next_seq, kind, path, is_dir)
+            self._next_seq += 1
+
+    def invalidate(self) -> None:
+        """事件丢失(例如inotify队列溢出)后使当前所有游标失效"""
+        with self._lock:
+            # 占用一个空记录的序号，溢出前发出的游标都小于它，全量同步后得到的游标等于它而不会再次失效
+            self._buffer[self._next_seq % self.size] = None
+            self._reset_seq = self._next_seq
+            self._next_seq += 1
+
+    def read(self, after_seq: int, prefix: str, limit: int) -> Tuple[Optional[List[ChangeRecord]], int, bool]:
+        """
+        读取序号大于after_seq且位于prefix目录下的记录
+        返回(记录列表, 新的序号, 是否还有更多记录)，记录列表为None表示游标已失效需要全量同步
+        """
+        with self._lock:
+            oldest_seq = max(1, self._next_seq - self.size)
+            if after_seq < self._reset_seq or after_seq + 1 < oldest_seq or after_seq > self.last_seq:
+                return None, self.last_seq, False
+
+            records = []
+            seq = after_seq
+            while seq < self.last_seq and len(records) < limit:
+                seq += 1
+                record = self._buffer[seq % self.size]
+                if record is not None and (record.path == prefix or record.path.startswith(prefix.rstrip("/") + "/")):
+                    records.append(record)
+            return records, seq, seq < self.last_seq
+
+    def encode_cursor(self, seq: int) -> str:
+        """将序号编码为不透明游标"""
+        raw = json.dumps({"epoch": self.epoch, "seq": seq}).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, cursor: str) -> Optional[int]:
+        """解析游标，返回序号，来自其他日志实例(例如服务重启前)的游标返回None"""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            epoch, seq = data["epoch"], int(data["seq"])
+        except (binascii.Error, ValueError, KeyError, TypeError, UnicodeError) as e:
+            raise ValueError(f"无效的变更游标: {cursor}") from e
+        return seq if epoch == self.epoch else None
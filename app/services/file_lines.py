@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 17:20
+@Author : YangFei
+@File   : file_lines.py
+@Desc   : 文件行号到字节偏移的稀疏索引
+"""
+import bisect
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.services.file_hash import file_signature
+
+# 每读取多少字节记录一个检查点
+CHECKPOINT_BYTES = 1024 * 1024
+
+
+class _LineIndexEntry:
+    """单个文件的行索引，检查点i表示文件前offsets[i]个字节中共有counts[i]个换行符"""
+
+    def __init__(self, signature: Tuple[int, int, int, int]) -> None:
+        self.signature = signature
+        self.counts: List[int] = [0]
+        self.offsets: List[int] = [0]
+        self.complete = False
+
+
+class LineOffsetIndex:
+    """
+    行号到字节偏移的稀疏索引
+    1.每个文件按CHECKPOINT_BYTES记录(换行数, 字节偏移)检查点，查找任意行最多只需扫描一个检查点区间
+    2.索引只在需要时向后扩展，定位文件开头附近的行不会扫描整个文件
+    3.通过本服务按行编辑文件后，编辑位置之前的检查点原样保留、之后的检查点整体平移，不需要重新扫描
+    """
+
+    def __init__(self, max_files: int = 256) -> None:
+        """构造函数，max_files为最多缓存索引的文件数量"""
+        self.max_files = max_files
+        self._entries: "OrderedDict[str, _LineIndexEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, file_path: str, st: os.stat_result) -> _LineIndexEntry:
+        """获取与文件签名一致的索引，签名变化时重新创建"""
+        key = os.path.abspath(file_path)
+        signature = file_signature(st)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.signature != signature:
+                entry = _LineIndexEntry(signature)
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+            return entry
+
+    @classmethod
+    def _extend(cls, entry: _LineIndexEntry, fd: int) -> None:
+        """从最后一个检查点向后扫描一个区间并记录新的检查点"""
+        chunk = os.pread(fd, CHECKPOINT_BYTES, entry.offsets[-1])
+        if not chunk:
+            entry.complete = True
+            return
+        entry.counts.append(entry.counts[-1] + chunk.count(b"\n"))
+        entry.offsets.append(entry.offsets[-1] + len(chunk))
+
+    def offset_of(self, file_path: str, fd: int, st: os.stat_result, line: int) -> Optional[Tuple[int, int]]:
+        """
+        获取第line行(从0开始)起始位置的字节偏移，返回(字节偏移, 该偏移之前的换行数)
+        line等于总行数时返回文件末尾(用于追加)，超出时返回None
+        """
+        if line == 0:
+            return 0, 0
+        entry = self._entry(file_path, st)
+
+        # 1.第line行从第line个换行符之后开始，按需扩展索引直到覆盖该换行符
+        while not entry.complete and entry.counts[-1] < line:
+            self._extend(entry, fd)
+
+        # 2.换行符数量不足：最后一行没有换行结尾时允许定位到文件末尾，否则超出范围
+        if entry.counts[-1] < line:
+            size = entry.offsets[-1]
+            if line == entry.counts[-1] + 1 and size > 0 and os.pread(fd, 1, size - 1) != b"\n":
+                return size, entry.counts[-1]
+            return None
+
+        # 3.在前一个检查点与当前检查点之间扫描，定位到第line个换行符
+        idx = bisect.bisect_left(entry.counts, line)
+        count, offset = entry.counts[idx - 1], entry.offsets[idx - 1]
+        while True:
+            chunk = os.pread(fd, min(CHECKPOINT_BYTES, entry.offsets[idx] - offset), offset)
+            newlines = chunk.count(b"\n")
+            if count + newlines >= line:
+                pos = -1
+                for _ in range(line - count):
+                    pos = chunk.find(b"\n", pos + 1)
+                return offset + pos + 1, line
+            count += newlines
+            offset += len(chunk)
+
+    def update_after_edit(
+            self,
+            file_path: str,
+            old_st: os.stat_result,
+            new_st: os.stat_result,
+            start: int,
+            end: int,
+            removed_newlines: int,
+            added_newlines: int,
+            added_bytes: int,
+    ) -> None:
+        """文件的[start, end)字节区间被替换后，保留之前的检查点并平移之后的检查点"""
+        key = os.path.abspath(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.signature != file_signature(old_st):
+                return
+            updated = _LineIndexEntry(file_signature(new_st))
+            updated.complete = entry.complete
+            line_delta = added_newlines - removed_newlines
+            byte_delta = added_bytes - (end - start)
+            updated.counts, updated.offsets = [], []
+            for count, offset in zip(entry.counts, entry.offsets):
+                # 纯插入时恰好位于插入点的检查点(例如文件末尾)同时属于前后两部分
+                if offset <= start:
+                    updated.counts.append(count)
+                    updated.offsets.append(offset)
+                if offset >= end and offset + byte_delta != updated.offsets[-1]:
+                    updated.counts.append(count + line_delta)
+                    updated.offsets.append(offset + byte_delta)
+            self._entries[key] = updated
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 21:20
+@Author : YangFei
+@File   : file_ops.py
+@Desc   : 服务端复制/移动/递归删除，大目录在工作线程中并行处理并记录进度
+"""
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.interface.errors.exceptions import NotFoundException
+from app.services.file_edit import AtomicWriter, copy_range
+
+# 操作状态
+OPERATION_RUNNING = "running"
+OPERATION_SUCCEEDED = "succeeded"
+OPERATION_FAILED = "failed"
+OPERATION_CANCELLED = "cancelled"
+
+# 每个操作最多记录的错误数量
+MAX_OPERATION_ERRORS = 100
+
+# 每个工作线程同时排队的任务数，限制大目录一次性提交的任务数量
+_TASKS_PER_WORKER = 4
+
+
+class OperationCancelled(Exception):
+    """操作已被取消"""
+
+
+class FileOperation:
+    """
+    一次复制/移动/删除操作的进度
+    1.先扫描得到总条目数与总字节数，执行过程中工作线程累加已完成的数量
+    2.单个条目失败只记录错误，不影响其他条目
+    """
+
+    def __init__(self, op: str, src_path: str, dst_path: Optional[str] = None) -> None:
+        self.operation_id = uuid.uuid4().hex
+        self.op = op
+        self.src_path = src_path
+        self.dst_path = dst_path
+        self.state = OPERATION_RUNNING
+        self.total_entries = 0
+        self.done_entries = 0
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.failed_entries = 0
+        self.errors: List[str] = []
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise OperationCancelled()
+
+    def add_total(self, entries: int, size: int = 0) -> None:
+        with self._lock:
+            self.total_entries += entries
+            self.total_bytes += size
+
+    def advance(self, entries: int = 1, size: int = 0) -> None:
+        with self._lock:
+            self.done_entries += entries
+            self.done_bytes += size
+
+    def record_error(self, path: str, error: BaseException) -> None:
+        with self._lock:
+            self.failed_entries += 1
+            if len(self.errors) < MAX_OPERATION_ERRORS:
+                self.errors.append(f"{path}: {error}")
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """根据异常与失败条目数确定最终状态"""
+        with self._lock:
+            if isinstance(error, OperationCancelled):
+                self.state = OPERATION_CANCELLED
+            elif error is not None:
+                self.state = OPERATION_FAILED
+                if len(self.errors) < MAX_OPERATION_ERRORS:
+                    self.errors.append(str(error))
+            else:
+                self.state = OPERATION_FAILED if self.failed_entries else OPERATION_SUCCEEDED
+            self.finished_at = time.time()
+
+
+class FileOperationManager:
+    """记录进行中与最近完成的操作，完成超过ttl秒的操作在创建新操作时被清理"""
+
+    def __init__(self, ttl: int = 3600) -> None:
+        self.ttl = ttl
+        self._operations: Dict[str, FileOperation] = {}
+        self._lock = threading.Lock()
+
+    def create(self, op: str, src_path: str, dst_path: Optional[str] = None) -> FileOperation:
+        deadline = time.time() - self.ttl
+        operation = FileOperation(op, src_path, dst_path)
+        with self._lock:
+            for operation_id in [operation_id for operation_id, item in self._operations.items()
+                                 if item.finished_at is not None and item.finished_at < deadline]:
+                del self._operations[operation_id]
+            self._operations[operation.operation_id] = operation
+        return operation
+
+    def get(self, operation_id: str) -> FileOperation:
+        with self._lock:
+            operation = self._operations.get(operation_id)
+        if operation is None:
+            raise NotFoundException(f"操作不存在或已过期: {operation_id}")
+        return operation
+
+    def cancel_all(self) -> None:
+        """取消全部进行中的操作"""
+        with self._lock:
+            operations = list(self._operations.values())
+        for operation in operations:
+            operation.cancel()
+
+
+def copy_file(src_path: str, dst_path: str, preserve_metadata: bool = True,
+              src_st: Optional[os.stat_result] = None) -> int:
+    """
+    复制单个文件，返回复制的字节数
+    1.数据通过copy_range在内核中复制(copy_file_range/sendfile)，写入目标同目录的临时文件后原子替换
+    2.preserve_metadata时保留源文件的权限、属主、访问/修改时间与扩展属性，否则保留已有目标文件的权限
+    """
+    with open(src_path, "rb") as src:
+        st = src_st or os.fstat(src.fileno())
+        if preserve_metadata:
+            preserve_from = st
+        else:
+            try:
+                preserve_from = os.stat(dst_path)
+            except FileNotFoundError:
+                preserve_from = None
+        with AtomicWriter(dst_path, mode="wb", preserve_from=preserve_from) as writer:
+            copied = copy_range(src.fileno(), writer.file.fileno(), 0, st.st_size)
+            if copied != st.st_size:
+                raise OSError(errno.EIO, f"源文件在复制过程中被截断: {src_path}")
+    if preserve_metadata:
+        shutil.copystat(src_path, dst_path, follow_symlinks=False)
+    return copied
+
+
+def copy_symlink(src_path: str, dst_path: str, preserve_metadata: bool) -> None:
+    """复制软链接本身，已存在的目标先删除"""
+    target = os.readlink(src_path)
+    try:
+        os.symlink(target, dst_path)
+    except FileExistsError:
+        os.unlink(dst_path)
+        os.symlink(target, dst_path)
+    if preserve_metadata:
+        shutil.copystat(src_path, dst_path, follow_symlinks=False)
+
+
+def run_parallel(executor: Executor, workers: int, tasks, operation: FileOperation) -> None:
+    """
+    把(路径, 函数)任务提交到线程池并行执行，同时排队的任务数不超过workers * _TASKS_PER_WORKER
+    单个任务的异常记录到操作中，取消时等待已提交的任务结束后抛出OperationCancelled
+    """
+    pending: Set[Future] = set()
+    paths: Dict[Future, str] = {}
+
+    def collect(done) -> None:
+        for future in done:
+            path = paths.pop(future)
+            error = future.exception()
+            if error is not None:
+                operation.record_error(path, error)
+
+    try:
+        for path, task in tasks:
+            operation.check_cancelled()
+            if len(pending) >= workers * _TASKS_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(task)
+            paths[future] = path
+            pending.add(future)
+    finally:
+        done, _ = wait(pending)
+        collect(done)
+    operation.check_cancelled()
+
+
+def copy_tree(src_dir: str, dst_dir: str, operation: FileOperation, executor: Executor, workers: int,
+              preserve_metadata: bool = True) -> None:
+    """
+    并行复制目录树(已存在的目标目录会合并，同名文件被替换)
+    1.先扫描源目录得到全部条目，按从上到下的顺序创建目录
+    2.文件在线程池中并行复制，软链接按链接本身复制
+    3.最后从下到上恢复目录的元数据，保证目录的修改时间不会被后续写入改变
+    """
+    # 1.扫描源目录
+    dirs: List[str] = [""]
+    files: List[Tuple[str, os.stat_result]] = []
+    links: List[str] = []
+    index = 0
+    while index < len(dirs):
+        operation.check_cancelled()
+        rel_dir = dirs[index]
+        index += 1
+        try:
+            entries = list(os.scandir(os.path.join(src_dir, rel_dir)))
+        except OSError as e:
+            operation.record_error(os.path.join(src_dir, rel_dir), e)
+            continue
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name)
+            try:
+                if entry.is_symlink():
+                    links.append(rel_path)
+                elif entry.is_dir():
+                    dirs.append(rel_path)
+                else:
+                    files.append((rel_path, entry.stat()))
+            except OSError as e:
+                operation.record_error(entry.path, e)
+    operation.add_total(len(dirs) + len(files) + len(links), sum(st.st_size for _, st in files))
+
+    # 2.创建目录
+    for rel_dir in dirs:
+        os.makedirs(os.path.join(dst_dir, rel_dir), exist_ok=True)
+        operation.advance()
+
+    # 3.并行复制文件与软链接
+    def copy_one(rel_path: str, st: os.stat_result) -> Callable[[], None]:
+        def task() -> None:
+            operation.check_cancelled()
+            if stat.S_ISREG(st.st_mode):
+                size = copy_file(os.path.join(src_dir, rel_path), os.path.join(dst_dir, rel_path),
+                                 preserve_metadata, st)
+            else:
+                raise OSError(errno.EINVAL, "不支持复制设备文件、管道等特殊文件")
+            operation.advance(1, size)
+
+        return task
+
+    def link_one(rel_path: str) -> Callable[[], None]:
+        def task() -> None:
+            copy_symlink(os.path.join(src_dir, rel_path), os.path.join(dst_dir, rel_path), preserve_metadata)
+            operation.advance()
+
+        return task
+
+    tasks = [(os.path.join(src_dir, rel_path), copy_one(rel_path, st)) for rel_path, st in files]
+    tasks += [(os.path.join(src_dir, rel_path), link_one(rel_path)) for rel_path in links]
+    run_parallel(executor, workers, tasks, operation)
+
+    # 4.从下到上恢复目录元数据
+    if preserve_metadata:
+        for rel_dir in reversed(dirs):
+            try:
+                shutil.copystat(os.path.join(src_dir, rel_dir), os.path.join(dst_dir, rel_dir))
+            except OSError as e:
+                operation.record_error(os.path.join(dst_dir, rel_dir), e)
+
+
+def remove_tree(dir_path: str, operation: FileOperation, executor: Executor, workers: int) -> None:
+    """
+    并行删除目录树(软链接只删除链接本身，不会跟随)
+    1.先扫描得到全部条目，文件与软链接在线程池中并行删除
+    2.再从下到上删除目录，某个条目删除失败时其所在的目录会保留
+    """
+    # 1.扫描目录
+    dirs: List[str] = [dir_path]
+    files: List[str] = []
+    index = 0
+    while index < len(dirs):
+        operation.check_cancelled()
+        current = dirs[index]
+        index += 1
+        try:
+            entries = list(os.scandir(current))
+        except OSError as e:
+            operation.record_error(current, e)
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+            else:
+                files.append(entry.path)
+    operation.add_total(len(dirs) + len(files))
+
+    # 2.并行删除文件
+    def unlink_one(path: str) -> Callable[[], None]:
+        def task() -> None:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            operation.advance()
+
+        return task
+
+    run_parallel(executor, workers, [(path, unlink_one(path)) for path in files], operation)
+
+    # 3.从下到上删除目录(扫描顺序为广度优先，逆序即可保证子目录先于父目录)
+    for path in reversed(dirs):
+        try:
+            os.rmdir(path)
+            operation.advance()
+        except FileNotFoundError:
+            operation.advance()
+        except OSError as e:
+            operation.record_error(path, e)
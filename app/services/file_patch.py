@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 16:30
+@Author : YangFei
+@File   : file_patch.py
+@Desc   : unified diff解析与流式应用(支持偏移与模糊上下文匹配)
+"""
+import re
+from typing import List, NamedTuple, Optional, IO, Tuple
+
+# 表示文件不存在的路径(新建/删除文件)
+DEV_NULL = "/dev/null"
+
+# hunk头部，例如: @@ -12,7 +12,8 @@ def main():
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    """补丁格式错误"""
+
+
+class HunkLine(NamedTuple):
+    """hunk中的单行，tag为' '(上下文)/'-'(删除)/'+'(新增)"""
+    tag: str
+    text: str
+    has_eol: bool
+
+
+class Hunk(NamedTuple):
+    """补丁中的单个hunk"""
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    lines: List[HunkLine]
+
+
+class FilePatch(NamedTuple):
+    """补丁中单个文件的修改"""
+    old_path: str
+    new_path: str
+    hunks: List[Hunk]
+
+
+class HunkOutcome(NamedTuple):
+    """单个hunk的应用结果，offset为实际位置与补丁中行号的差值，fuzz为忽略的首尾上下文行数"""
+    applied: bool
+    offset: int = 0
+    fuzz: int = 0
+    error: Optional[str] = None
+
+
+def _parse_path(line: str) -> str:
+    """解析---/+++行中的路径，去掉时间戳等附加信息"""
+    path = line[4:].rstrip("\r\n").split("\t", 1)[0]
+    if len(path) >= 2 and path.startswith('"') and path.endswith('"'):
+        path = path[1:-1]
+    return path
+
+
+def parse_unified_diff(patch: str) -> List[FilePatch]:
+    """解析unified diff文本(兼容git diff格式)，返回每个文件的修改列表"""
+    lines = patch.splitlines()
+    patches: List[FilePatch] = []
+    idx = 0
+    while idx < len(lines):
+        # 1.跳过diff --git、index等头部信息，定位到---/+++文件头
+        if not (lines[idx].startswith("--- ") and idx + 1 < len(lines) and lines[idx + 1].startswith("+++ ")):
+            idx += 1
+            continue
+        old_path, new_path = _parse_path(lines[idx]), _parse_path(lines[idx + 1])
+        idx += 2
+
+        # 2.依次解析文件下的每个hunk，按照头部给出的行数读取hunk内容
+        hunks: List[Hunk] = []
+        while idx < len(lines) and lines[idx].startswith("@@"):
+            match = _HUNK_HEADER.match(lines[idx])
+            if match is None:
+                raise PatchError(f"无法解析的hunk头部: {lines[idx]}")
+            old_start, new_start = int(match.group(1)), int(match.group(3))
+            old_count = int(match.group(2)) if match.group(2) is not None else 1
+            new_count = int(match.group(4)) if match.group(4) is not None else 1
+            idx += 1
+
+            hunk_lines: List[HunkLine] = []
+            old_left, new_left = old_count, new_count
+            while idx < len(lines) and (old_left > 0 or new_left > 0 or lines[idx].startswith("\\")):
+                line = lines[idx]
+                idx += 1
+                if line.startswith("\\"):
+                    # 3."\ No newline at end of file"作用于上一行
+                    if hunk_lines:
+                        hunk_lines[-1] = hunk_lines[-1]._replace(has_eol=False)
+                    continue
+                tag, text = (line[0], line[1:]) if line else (" ", "")
+                if tag == " ":
+                    old_left -= 1
+                    new_left -= 1
+                elif tag == "-":
+                    old_left -= 1
+                elif tag == "+":
+                    new_left -= 1
+                else:
+                    raise PatchError(f"hunk内容与头部行数不一致: {lines[idx - 1]}")
+                hunk_lines.append(HunkLine(tag, text, True))
+            if old_left != 0 or new_left != 0:
+                raise PatchError(f"{new_path}的hunk内容不完整: @@ -{old_start},{old_count} +{new_start},{new_count} @@")
+            hunks.append(Hunk(old_start, old_count, new_start, new_count, hunk_lines))
+        patches.append(FilePatch(old_path, new_path, hunks))
+
+    if not patches:
+        raise PatchError("补丁中没有找到任何文件修改")
+    return patches
+
+
+def _strip_eol(line: str) -> str:
+    """去掉行尾换行符"""
+    return line.rstrip("\r\n")
+
+
+class _LineSource:
+    """带预读窗口的按行读取器，已输出或跳过的行会被丢弃，内存占用只与匹配窗口相关"""
+
+    def __init__(self, src: IO[str]) -> None:
+        self.src = src
+        self.buffer: List[str] = []
+        self.start = 0
+        self.eof = False
+        self.eol = "\n"
+        self._eol_detected = False
+
+    def get(self, index: int) -> Optional[str]:
+        """获取绝对行号index对应的行，超出文件末尾返回None"""
+        while not self.eof and index >= self.start + len(self.buffer):
+            line = self.src.readline()
+            if not line:
+                self.eof = True
+                break
+            if not self._eol_detected and line.endswith(("\n", "\r")):
+                self.eol = "\r\n" if line.endswith("\r\n") else line[len(line.rstrip("\r\n")):]
+                self._eol_detected = True
+            self.buffer.append(line)
+        offset = index - self.start
+        return self.buffer[offset] if 0 <= offset < len(self.buffer) else None
+
+    def take_until(self, index: int) -> List[str]:
+        """取出行号index之前的全部行并从窗口中丢弃"""
+        self.get(index - 1)
+        count = max(min(index - self.start, len(self.buffer)), 0)
+        taken = self.buffer[:count]
+        del self.buffer[:count]
+        self.start += count
+        return taken
+
+    def drain(self) -> List[str]:
+        """取出剩余的全部行"""
+        while not self.eof:
+            self.get(self.start + len(self.buffer))
+        return self.take_until(self.start + len(self.buffer))
+
+
+class _LineWriter:
+    """按行写入，上一行没有换行结尾而后面还有内容时自动补充换行"""
+
+    def __init__(self, dst: IO[str], eol: str) -> None:
+        self.dst = dst
+        self.eol = eol
+        self._pending_eol = False
+
+    def write(self, line: str) -> None:
+        if self._pending_eol:
+            self.dst.write(self.eol)
+        self.dst.write(line)
+        self._pending_eol = bool(line) and not line.endswith(("\n", "\r"))
+
+
+def apply_hunks(
+        src: Optional[IO[str]],
+        dst: IO[str],
+        hunks: List[Hunk],
+        max_fuzz: int = 2,
+        max_offset: int = 1000,
+) -> List[HunkOutcome]:
+    """
+    按顺序把hunk流式应用到src并写入dst，返回每个hunk的结果
+    1.hunk之间未修改的内容逐行复制，只在匹配窗口(±max_offset行)内缓存
+    2.优先在补丁行号(加上之前hunk累计的偏移)处精确匹配，再向两侧扩展搜索
+    3.仍找不到时依次忽略首尾最多max_fuzz行上下文再次搜索(与GNU patch的fuzz语义一致)
+    4.比较时忽略行尾换行符差异，新增行使用原文件的换行风格
+    5.无法应用的hunk记录失败原因并跳过，src为None表示新建文件
+    """
+    source = _LineSource(src) if src is not None else None
+    if source is not None:
+        source.get(0)
+    writer = _LineWriter(dst, source.eol if source is not None else "\n")
+    outcomes: List[HunkOutcome] = []
+    cursor = 0
+    drift = 0
+
+    for hunk in hunks:
+        # 1.计算hunk在原文件中的名义位置，old_count为0时表示在old_start行之后插入
+        nominal = hunk.old_start if hunk.old_count == 0 else hunk.old_start - 1
+        expected = nominal + drift
+        old_lines = [_strip_eol(line.text) for line in hunk.lines if line.tag in " -"]
+        leading = next((i for i, line in enumerate(hunk.lines) if line.tag != " "), len(hunk.lines))
+        trailing = next((i for i, line in enumerate(reversed(hunk.lines)) if line.tag != " "), len(hunk.lines))
+
+        # 2.按fuzz从小到大、偏移从近到远的顺序搜索匹配位置
+        found: Optional[Tuple[int, int, int, int]] = None
+        for fuzz in range(min(max_fuzz, max(leading, trailing)) + 1):
+            top, bottom = min(fuzz, leading), min(fuzz, trailing)
+            pattern = old_lines[top:len(old_lines) - bottom]
+            for delta in range(max_offset + 1):
+                for position in ((expected + top + delta,) if delta == 0 else
+                                 (expected + top - delta, expected + top + delta)):
+                    if position < cursor:
+                        continue
+                    if source is None:
+                        matched = not pattern and position == 0
+                    elif not pattern:
+                        # 纯插入的hunk只要求插入位置不超过文件末尾
+                        matched = position == 0 or source.get(position - 1) is not None
+                    else:
+                        matched = all(
+                            (line := source.get(position + i)) is not None and _strip_eol(line) == expected_line
+                            for i, expected_line in enumerate(pattern)
+                        )
+                    if matched:
+                        found = (position, top, bottom, fuzz)
+                        break
+                if found is not None:
+                    break
+            if found is not None:
+                break
+
+        if found is None:
+            outcomes.append(HunkOutcome(applied=False, error="未找到匹配的上下文"))
+            continue
+
+        # 3.复制匹配位置之前的未修改内容
+        position, top, bottom, fuzz = found
+        if source is not None:
+            for line in source.take_until(position):
+                writer.write(line)
+
+        # 4.写入hunk内容：上下文行保留原文件内容，删除行跳过，新增行写入补丁内容
+        for line in hunk.lines[top:len(hunk.lines) - bottom]:
+            if line.tag == " ":
+                writer.write(source.take_until(source.start + 1)[0])
+            elif line.tag == "-":
+                source.take_until(source.start + 1)
+            else:
+                writer.write(line.text + (writer.eol if line.has_eol else ""))
+
+        cursor = source.start if source is not None else 0
+        drift = position - top - nominal
+        outcomes.append(HunkOutcome(applied=True, offset=drift, fuzz=fuzz))
+
+    # 5.复制最后一个hunk之后的未修改内容
+    if source is not None:
+        for line in source.drain():
+            writer.write(line)
+    return outcomes
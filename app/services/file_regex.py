@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 23:55
+@Author : YangFei
+@File   : file_regex.py
+@Desc   : 在可终止的工作进程中执行用户正则，超出时间预算时终止进程并返回已得到的部分结果
+"""
+import functools
+import logging
+import multiprocessing
+import re
+import signal
+import threading
+import time
+from multiprocessing.connection import Connection
+from typing import List, NamedTuple, Optional, Tuple
+
+from app.services.file_encoding import decode_text
+
+logger = logging.getLogger(__name__)
+
+# 工作进程上报进度的最长间隔(秒)与每批最多携带的匹配数
+_PROGRESS_INTERVAL = 0.05
+_PROGRESS_BATCH = 1000
+
+# 任务来源：由工作进程读取的文件路径或者调用方已读取的文本
+SOURCE_PATH = "path"
+SOURCE_TEXT = "text"
+
+
+class RegexWorkerError(Exception):
+    """工作进程执行任务失败(读取文件出错或者进程意外退出)"""
+
+
+class RegexSearchOutcome(NamedTuple):
+    """一次搜索的结果，timed_out为True时matches只包含已扫描的scanned_lines行中的匹配"""
+    matches: List[Tuple[int, str]]
+    scanned_lines: int
+    total_lines: Optional[int]
+    timed_out: bool
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(pattern: str, flags: int) -> re.Pattern:
+    """工作进程内的编译缓存，同一个正则只编译一次"""
+    return re.compile(pattern, flags)
+
+
+def _search(conn: Connection, pattern: str, flags: int, kind: str, source: str) -> None:
+    """
+    在工作进程中逐行匹配，并按时间间隔把已扫描的行数与新增的匹配发送给调用方
+    单行匹配出现灾难性回溯时进程会一直停留在match中，调用方据此在超时后终止进程，已发送的部分结果不会丢失
+    """
+    regex = _compile(pattern, flags)
+    if kind == SOURCE_PATH:
+        with open(source, "rb") as f:
+            source = decode_text(f.read())
+    lines = source.splitlines()
+    conn.send(("start", len(lines)))
+
+    batch: List[Tuple[int, str]] = []
+    last_sent = time.monotonic()
+    for index, line in enumerate(lines):
+        if regex.match(line):
+            batch.append((index, line))
+        now = time.monotonic()
+        if now - last_sent >= _PROGRESS_INTERVAL or len(batch) >= _PROGRESS_BATCH:
+            conn.send(("progress", index + 1, batch))
+            batch = []
+            last_sent = now
+    conn.send(("done", len(lines), batch))
+
+
+def _worker_main(conn: Connection) -> None:
+    """工作进程入口：循环接收任务，连接关闭时退出"""
+    # 服务收到Ctrl+C时由主进程统一清理工作进程
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            _search(conn, *task)
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class _Worker:
+    """单个工作进程及其双向管道"""
+
+    def __init__(self, context) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), name="file-regex", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class RegexPool:
+    """
+    执行用户正则的工作进程池
+    1.用户正则可能出现灾难性回溯，占满CPU且无法在线程中中断，因此放到独立进程中执行，超时后直接终止进程
+    2.工作进程按需创建(spawn方式，不继承主进程的线程与文件描述符)，空闲进程复用，编译结果缓存在各自进程中
+    3.同时执行的任务数不超过workers，排队等待的时间同样计入时间预算
+    """
+
+    def __init__(self, workers: int = 4) -> None:
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(workers)
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self, deadline: float) -> Optional[_Worker]:
+        """获取空闲的工作进程(没有时创建)，在截止时间之前没有空位时返回None"""
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            return None
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.kill()
+        try:
+            return _Worker(self._context)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, worker: _Worker, healthy: bool) -> None:
+        if healthy:
+            with self._lock:
+                self._idle.append(worker)
+        else:
+            worker.kill()
+        self._slots.release()
+
+    def search(self, pattern: str, flags: int, kind: str, source: str, timeout: float) -> RegexSearchOutcome:
+        """
+        在工作进程中逐行匹配(re.match语义)，最多等待timeout秒
+        超时时终止工作进程，返回截止前收到的匹配与已扫描的行数
+        """
+        deadline = time.monotonic() + timeout
+        matches: List[Tuple[int, str]] = []
+        scanned, total = 0, None
+
+        # 1.获取工作进程，排队超时直接返回
+        worker = self._acquire(deadline)
+        if worker is None:
+            return RegexSearchOutcome(matches, scanned, total, True)
+
+        # 2.发送任务并接收进度，直到完成或者超时
+        healthy = False
+        try:
+            worker.conn.send((pattern, flags, kind, source))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not worker.conn.poll(remaining):
+                    logger.warning(f"正则执行超过{timeout}秒, 已终止工作进程: {pattern[:100]}")
+                    return RegexSearchOutcome(matches, scanned, total, True)
+                message = worker.conn.recv()
+                if message[0] == "start":
+                    total = message[1]
+                elif message[0] == "error":
+                    healthy = True
+                    raise RegexWorkerError(message[1])
+                else:
+                    scanned = message[1]
+                    matches.extend(message[2])
+                    if message[0] == "done":
+                        healthy = True
+                        return RegexSearchOutcome(matches, scanned, total, False)
+        except (EOFError, OSError) as e:
+            raise RegexWorkerError(f"正则工作进程异常退出: {str(e)}")
+        finally:
+            self._release(worker, healthy)
+
+    def close(self) -> None:
+        """终止全部空闲的工作进程(执行中的进程在任务结束或超时后被回收)"""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.kill()
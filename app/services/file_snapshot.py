@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 21:50
+@Author : YangFei
+@File   : file_snapshot.py
+@Desc   : 基于硬链接的增量目录快照与按差异恢复
+"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+import uuid
+from concurrent.futures import Executor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.interface.errors.exceptions import BadRequestException, NotFoundException
+from app.services.file_ops import FileOperation, copy_file, run_parallel
+from app.services.file_walker import GitIgnore
+
+# 条目类型
+KIND_FILE = "f"
+KIND_DIR = "d"
+KIND_LINK = "l"
+
+# 快照的清单文件与内容目录
+MANIFEST_NAME = "manifest.json"
+TREE_NAME = "tree"
+
+# 正在创建中的快照目录后缀，创建完成后重命名为快照id
+_PARTIAL_SUFFIX = ".partial"
+
+
+class SnapshotEntry(NamedTuple):
+    """快照中的单个条目：类型、权限、大小、修改时间、元数据修改时间、inode、软链接目标"""
+    kind: str
+    mode: int
+    size: int
+    mtime_ns: int
+    ctime_ns: int
+    ino: int
+    link: Optional[str] = None
+
+
+class SnapshotInfo(NamedTuple):
+    """快照的概要信息"""
+    snapshot_id: str
+    dir_path: str
+    label: Optional[str]
+    created_at: float
+    file_count: int
+    dir_count: int
+    link_count: int
+    total_bytes: int
+    copied_files: int
+    copied_bytes: int
+    linked_files: int
+    exclude: List[str]
+
+
+class RestoreStats(NamedTuple):
+    """恢复快照的统计"""
+    restored_files: int
+    restored_bytes: int
+    unchanged_files: int
+    deleted_entries: int
+    created_dirs: int
+    errors: List[str]
+
+
+def scan_tree(root: str, exclude: Optional[List[str]] = None) -> Dict[str, SnapshotEntry]:
+    """扫描目录树，返回相对路径到条目的映射(不跟随软链接，exclude为gitignore语法的排除规则)"""
+    ignores = GitIgnore("", exclude) if exclude else None
+    entries: Dict[str, SnapshotEntry] = {}
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            children = list(os.scandir(os.path.join(root, rel_dir)))
+        except FileNotFoundError:
+            continue
+        for child in children:
+            rel_path = f"{rel_dir}/{child.name}" if rel_dir else child.name
+            try:
+                st = child.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            if ignores is not None and ignores.match(rel_path, is_dir):
+                continue
+            if is_dir:
+                kind, link = KIND_DIR, None
+                stack.append(rel_path)
+            elif stat.S_ISLNK(st.st_mode):
+                kind, link = KIND_LINK, os.readlink(child.path)
+            elif stat.S_ISREG(st.st_mode):
+                kind, link = KIND_FILE, None
+            else:
+                # 设备文件、管道等不纳入快照
+                continue
+            entries[rel_path] = SnapshotEntry(kind, stat.S_IMODE(st.st_mode), st.st_size, st.st_mtime_ns,
+                                              st.st_ctime_ns, st.st_ino, link)
+    return entries
+
+
+def _group_by_dir(paths: List[str]) -> Dict[str, List[str]]:
+    """按所在目录分组，每个目录作为一个并行任务，减少任务调度的开销"""
+    groups: Dict[str, List[str]] = {}
+    for rel_path in paths:
+        groups.setdefault(os.path.dirname(rel_path), []).append(rel_path)
+    return groups
+
+
+class SnapshotStore:
+    """
+    目录快照存储，每个目录的快照保存在root/目录标识/快照id下，包含清单与内容目录
+    1.创建快照时与上一个快照的清单比较，(inode, 大小, 修改时间, 元数据修改时间)都未变化的文件直接硬链接到上一个快照中的文件，
+      其余文件复制(copy_file_range，支持reflink的文件系统上共享数据块)，快照之间共享inode，但从不与工作目录共享，
+      工作目录中的原地修改不会影响快照
+    2.恢复时比较工作目录与快照清单，只复制大小、修改时间或权限不一致的文件，删除快照之后新增的条目
+    3.快照先在.partial目录中创建，清单写入后再重命名，中途失败不会留下不完整的快照
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _dir_key(self, dir_path: str) -> str:
+        return hashlib.blake2b(os.path.realpath(dir_path).encode("utf-8", "surrogateescape"),
+                               digest_size=8).hexdigest()
+
+    def _snapshots_dir(self, dir_path: str) -> str:
+        return os.path.join(self.root, self._dir_key(dir_path))
+
+    def lock(self, dir_path: str) -> threading.Lock:
+        """同一目录的快照创建/恢复/删除互斥"""
+        key = self._dir_key(dir_path)
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _snapshot_path(self, dir_path: str, snapshot_id: str) -> str:
+        if not snapshot_id or "/" in snapshot_id or snapshot_id.startswith(".") \
+                or snapshot_id.endswith(_PARTIAL_SUFFIX):
+            raise BadRequestException(f"快照id格式错误: {snapshot_id}")
+        path = os.path.join(self._snapshots_dir(dir_path), snapshot_id)
+        if not os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+            raise NotFoundException(f"快照不存在: {snapshot_id}")
+        return path
+
+    @classmethod
+    def _load_manifest(cls, snapshot_path: str) -> Tuple[SnapshotInfo, Dict[str, SnapshotEntry]]:
+        with open(os.path.join(snapshot_path, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        entries = {rel_path: SnapshotEntry(*entry) for rel_path, entry in data.pop("entries").items()}
+        return SnapshotInfo(**data), entries
+
+    def list(self, dir_path: str) -> List[SnapshotInfo]:
+        """按创建时间顺序列出目录的全部快照"""
+        snapshots_dir = self._snapshots_dir(dir_path)
+        if not os.path.isdir(snapshots_dir):
+            return []
+        infos = []
+        for name in sorted(os.listdir(snapshots_dir)):
+            manifest_path = os.path.join(snapshots_dir, name, MANIFEST_NAME)
+            if name.endswith(_PARTIAL_SUFFIX) or not os.path.isfile(manifest_path):
+                continue
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data.pop("entries")
+            infos.append(SnapshotInfo(**data))
+        return infos
+
+    def create(self, dir_path: str, label: Optional[str], exclude: Optional[List[str]], executor: Executor,
+               workers: int, operation: FileOperation) -> SnapshotInfo:
+        """创建快照，未变化的文件硬链接到上一个快照，变化的文件复制"""
+        snapshots_dir = self._snapshots_dir(dir_path)
+        os.makedirs(snapshots_dir, exist_ok=True)
+
+        # 1.清理上次中断留下的不完整快照，读取上一个快照的清单
+        previous_tree: Optional[str] = None
+        previous: Dict[str, SnapshotEntry] = {}
+        for name in sorted(os.listdir(snapshots_dir)):
+            path = os.path.join(snapshots_dir, name)
+            if name.endswith(_PARTIAL_SUFFIX):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+                previous_tree = path
+        if previous_tree is not None:
+            previous_info, previous = self._load_manifest(previous_tree)
+            # 排除规则不同的快照之间不复用，避免遗漏新纳入的条目
+            if previous_info.exclude != (exclude or []):
+                previous_tree, previous = None, {}
+            else:
+                previous_tree = os.path.join(previous_tree, TREE_NAME)
+
+        # 2.扫描工作目录，区分可以硬链接与需要复制的文件
+        entries = scan_tree(dir_path, exclude)
+        files = [rel_path for rel_path, entry in entries.items() if entry.kind == KIND_FILE]
+        linked = {rel_path for rel_path in files
+                  if previous.get(rel_path) is not None and previous[rel_path][:6] == entries[rel_path][:6]}
+        operation.add_total(len(entries), sum(entries[rel_path].size for rel_path in files
+                                              if rel_path not in linked))
+
+        snapshot_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        partial = os.path.join(snapshots_dir, snapshot_id + _PARTIAL_SUFFIX)
+        tree = os.path.join(partial, TREE_NAME)
+        try:
+            # 3.创建目录与软链接
+            os.makedirs(tree)
+            for rel_path, entry in sorted(entries.items()):
+                operation.check_cancelled()
+                if entry.kind == KIND_DIR:
+                    os.mkdir(os.path.join(tree, rel_path))
+                    operation.advance()
+                elif entry.kind == KIND_LINK:
+                    os.symlink(entry.link, os.path.join(tree, rel_path))
+                    operation.advance()
+
+            # 4.按目录并行硬链接或复制文件，工作目录中已被删除的文件从清单中移除
+            vanished: List[str] = []
+
+            def snapshot_dir(rel_paths: List[str]):
+                def task() -> None:
+                    for rel_path in rel_paths:
+                        operation.check_cancelled()
+                        target = os.path.join(tree, rel_path)
+                        if rel_path in linked:
+                            try:
+                                os.link(os.path.join(previous_tree, rel_path), target)
+                                operation.advance()
+                                continue
+                            except OSError as e:
+                                # 硬链接数达到文件系统上限时改为复制
+                                if e.errno != errno.EMLINK:
+                                    raise
+                        try:
+                            size = copy_file(os.path.join(dir_path, rel_path), target, True)
+                        except FileNotFoundError:
+                            vanished.append(rel_path)
+                            size = 0
+                        operation.advance(1, size)
+
+                return task
+
+            groups = _group_by_dir(files)
+            run_parallel(executor, workers,
+                          [(os.path.join(dir_path, rel_dir), snapshot_dir(rel_paths))
+                           for rel_dir, rel_paths in groups.items()], operation)
+            if operation.failed_entries:
+                raise OSError(f"创建快照失败: {operation.errors[0]}")
+            for rel_path in vanished:
+                entries.pop(rel_path, None)
+
+            # 5.写入清单后重命名为正式快照
+            copied = [rel_path for rel_path in files if rel_path not in linked and rel_path in entries]
+            info = SnapshotInfo(
+                snapshot_id=snapshot_id,
+                dir_path=dir_path,
+                label=label,
+                created_at=time.time(),
+                file_count=len(files) - len(vanished),
+                dir_count=sum(1 for entry in entries.values() if entry.kind == KIND_DIR),
+                link_count=sum(1 for entry in entries.values() if entry.kind == KIND_LINK),
+                total_bytes=sum(entry.size for entry in entries.values() if entry.kind == KIND_FILE),
+                copied_files=len(copied),
+                copied_bytes=sum(entries[rel_path].size for rel_path in copied),
+                linked_files=len(linked),
+                exclude=exclude or [],
+            )
+            with open(os.path.join(partial, MANIFEST_NAME), "w", encoding="utf-8") as f:
+                json.dump({**info._asdict(), "entries": {rel_path: list(entry) for rel_path, entry in entries.items()}},
+                          f, ensure_ascii=False, separators=(",", ":"))
+            os.rename(partial, os.path.join(snapshots_dir, snapshot_id))
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+        return info
+
+    def restore(self, dir_path: str, snapshot_id: str, delete_extra: bool, executor: Executor, workers: int,
+                operation: FileOperation) -> RestoreStats:
+        """
+        把工作目录恢复为快照时的状态，只处理有差异的条目
+        1.大小、修改时间与权限都一致的文件视为未变化(与rsync的快速检查一致)
+        2.快照中没有的条目在delete_extra为True时删除，被快照排除规则忽略的条目保持不变
+        """
+        snapshot_path = self._snapshot_path(dir_path, snapshot_id)
+        info, wanted = self._load_manifest(snapshot_path)
+        tree = os.path.join(snapshot_path, TREE_NAME)
+        current = scan_tree(dir_path, info.exclude)
+
+        # 1.删除快照中不存在或类型不一致的条目(先删除外层，已删除的文件夹内部条目跳过)
+        deleted = 0
+        removed_dirs = set()
+        for rel_path in sorted(current):
+            entry = current[rel_path]
+            target = wanted.get(rel_path)
+            if target is not None and target.kind == entry.kind:
+                continue
+            if target is None and not delete_extra:
+                continue
+            parent = os.path.dirname(rel_path)
+            while parent and parent not in removed_dirs:
+                parent = os.path.dirname(parent)
+            if parent:
+                continue
+            path = os.path.join(dir_path, rel_path)
+            try:
+                if entry.kind == KIND_DIR:
+                    shutil.rmtree(path)
+                    removed_dirs.add(rel_path)
+                else:
+                    os.unlink(path)
+                deleted += 1
+            except OSError as e:
+                operation.record_error(path, e)
+
+        # 2.创建缺失的文件夹，重建不一致的软链接，找出需要复制的文件
+        created_dirs = 0
+        to_copy: List[str] = []
+        unchanged = 0
+        for rel_path, entry in sorted(wanted.items()):
+            path = os.path.join(dir_path, rel_path)
+            existing = current.get(rel_path)
+            if existing is not None and existing.kind != entry.kind:
+                existing = None
+            try:
+                if entry.kind == KIND_DIR:
+                    if existing is None:
+                        os.makedirs(path, exist_ok=True)
+                        created_dirs += 1
+                elif entry.kind == KIND_LINK:
+                    if existing is None or existing.link != entry.link:
+                        if existing is not None:
+                            os.unlink(path)
+                        os.symlink(entry.link, path)
+                elif existing is not None and (existing.size, existing.mtime_ns, existing.mode) == \
+                        (entry.size, entry.mtime_ns, entry.mode):
+                    unchanged += 1
+                else:
+                    to_copy.append(rel_path)
+            except OSError as e:
+                operation.record_error(path, e)
+        operation.add_total(len(to_copy), sum(wanted[rel_path].size for rel_path in to_copy))
+
+        # 3.按目录并行复制有差异的文件
+        def restore_dir(rel_paths: List[str]):
+            def task() -> None:
+                for rel_path in rel_paths:
+                    operation.check_cancelled()
+                    size = copy_file(os.path.join(tree, rel_path), os.path.join(dir_path, rel_path), True)
+                    operation.advance(1, size)
+
+            return task
+
+        run_parallel(executor, workers,
+                      [(os.path.join(dir_path, rel_dir), restore_dir(rel_paths))
+                       for rel_dir, rel_paths in _group_by_dir(to_copy).items()], operation)
+
+        # 4.从下到上恢复文件夹的权限与修改时间
+        for rel_path, entry in sorted(wanted.items(), reverse=True):
+            if entry.kind != KIND_DIR:
+                continue
+            path = os.path.join(dir_path, rel_path)
+            try:
+                os.chmod(path, entry.mode)
+                os.utime(path, ns=(entry.mtime_ns, entry.mtime_ns))
+            except OSError as e:
+                operation.record_error(path, e)
+
+        return RestoreStats(
+            restored_files=len(to_copy),
+            restored_bytes=sum(wanted[rel_path].size for rel_path in to_copy),
+            unchanged_files=unchanged,
+            deleted_entries=deleted,
+            created_dirs=created_dirs,
+            errors=list(operation.errors),
+        )
+
+    def delete(self, dir_path: str, snapshot_id: str) -> SnapshotInfo:
+        """删除快照，其他快照通过硬链接共享的文件不受影响"""
+        snapshot_path = self._snapshot_path(dir_path, snapshot_id)
+        info, _ = self._load_manifest(snapshot_path)
+        shutil.rmtree(snapshot_path)
+        return info
+
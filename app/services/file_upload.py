@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 18:50
+@Author : YangFei
+@File   : file_upload.py
+@Desc   : 流式上传与可断点续传的分片上传会话
+"""
+import asyncio
+import bisect
+import os
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.interface.errors.exceptions import BadRequestException, ConflictException, NotFoundException
+from app.services.file_edit import FSYNC_NONE, FSYNC_FULL, sync_file, sync_dir
+
+# 流式写入时合并请求分块的缓冲区大小
+UPLOAD_BUFFER_SIZE = 4 * 1024 * 1024
+
+# 会话状态
+SESSION_OPEN = "open"
+SESSION_COMPLETING = "completing"
+SESSION_CLOSED = "closed"
+
+
+async def pump_stream(
+        chunks: AsyncIterator[bytes],
+        write: Callable[[bytes, int], None],
+        buffer_size: int = UPLOAD_BUFFER_SIZE,
+) -> int:
+    """
+    把异步数据流合并为buffer_size大小的缓冲区，依次在工作线程中调用write(数据, 相对偏移)，返回总字节数
+    写入与接收重叠进行：工作线程写入当前缓冲区时继续接收下一个缓冲区，同一时间最多只有一个写入在执行
+    出错或被取消时会等待正在执行的写入结束后再抛出异常，保证调用方清理资源时不会有写入仍在进行
+    """
+    total = 0
+    pending: Optional[asyncio.Future] = None
+    buffer = bytearray()
+    try:
+        async for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= buffer_size:
+                if pending is not None:
+                    await pending
+                pending = asyncio.ensure_future(asyncio.to_thread(write, bytes(buffer), total))
+                total += len(buffer)
+                buffer.clear()
+        if pending is not None:
+            await pending
+            pending = None
+        if buffer:
+            await asyncio.to_thread(write, bytes(buffer), total)
+            total += len(buffer)
+        return total
+    finally:
+        if pending is not None and not pending.done():
+            await asyncio.gather(pending, return_exceptions=True)
+
+
+class UploadSession:
+    """
+    分片上传会话
+    1.初始化时在目标文件同目录创建按总大小预分配的临时文件，分片按偏移通过pwrite写入，可以乱序、并行、重复上传
+    2.只有完整写入的分片才会记录到已接收区间(按起始位置排序且互不相邻的区间列表)
+    3.正在写入的分片持有引用计数，会话关闭时等最后一个写入结束后才关闭文件描述符
+    """
+
+    def __init__(self, session_id: str, file_path: str, total_size: int, expected_hash: Optional[str],
+                 fsync: str) -> None:
+        self.session_id = session_id
+        self.file_path = file_path
+        self.target = os.path.realpath(file_path)
+        self.temp_path = os.path.join(
+            os.path.dirname(self.target),
+            f".{os.path.basename(self.target)}.{session_id}.upload",
+        )
+        self.total_size = total_size
+        self.expected_hash = expected_hash
+        self.fsync = fsync
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.state = SESSION_OPEN
+        self.fd: Optional[int] = None
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        """创建并预分配临时文件，文件系统不支持预分配时退化为设置文件大小"""
+        self.fd = os.open(self.temp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC, 0o600)
+        try:
+            if self.total_size > 0:
+                try:
+                    os.posix_fallocate(self.fd, 0, self.total_size)
+                except OSError:
+                    os.ftruncate(self.fd, self.total_size)
+        except BaseException:
+            self._close()
+            raise
+
+    @property
+    def received_bytes(self) -> int:
+        """已接收的字节数"""
+        with self._lock:
+            return sum(end - start for start, end in zip(self._starts, self._ends))
+
+    def missing_ranges(self, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """缺失的[start, end)区间列表"""
+        missing: List[Tuple[int, int]] = []
+        with self._lock:
+            position = 0
+            for start, end in zip(self._starts, self._ends):
+                if start > position:
+                    missing.append((position, start))
+                position = end
+            if position < self.total_size:
+                missing.append((position, self.total_size))
+        return missing[:limit] if limit is not None else missing
+
+    def acquire(self) -> None:
+        """开始写入一个分片"""
+        with self._lock:
+            if self.state != SESSION_OPEN:
+                raise ConflictException(f"上传会话已{'在合并中' if self.state == SESSION_COMPLETING else '关闭'}: {self.session_id}")
+            self._active += 1
+            self.updated_at = time.time()
+
+    def release(self) -> None:
+        """结束写入一个分片，会话已关闭且没有其他写入时关闭文件描述符"""
+        with self._lock:
+            self._active -= 1
+            self.updated_at = time.time()
+            if self.state == SESSION_CLOSED and self._active == 0:
+                self._close()
+
+    def write(self, data: bytes, offset: int) -> None:
+        """在指定偏移写入数据(工作线程中调用)"""
+        if offset + len(data) > self.total_size:
+            raise BadRequestException(f"分片超出文件总大小{self.total_size}")
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self.fd, view, offset)
+            view = view[written:]
+            offset += written
+
+    def mark_received(self, start: int, end: int) -> None:
+        """把[start, end)合并到已接收区间"""
+        if start >= end:
+            return
+        with self._lock:
+            # 找到所有与新区间重叠或相邻的区间并合并为一个
+            left = bisect.bisect_left(self._ends, start)
+            right = bisect.bisect_right(self._starts, end)
+            if left < right:
+                start = min(start, self._starts[left])
+                end = max(end, self._ends[right - 1])
+            self._starts[left:right] = [start]
+            self._ends[left:right] = [end]
+
+    def reset_received(self) -> None:
+        """清空已接收区间(整体校验失败时需要重新上传)"""
+        with self._lock:
+            self._starts, self._ends = [], []
+
+    def begin_complete(self) -> None:
+        """进入合并状态，期间拒绝新的分片写入"""
+        with self._lock:
+            if self.state != SESSION_OPEN:
+                raise ConflictException(f"上传会话已{'在合并中' if self.state == SESSION_COMPLETING else '关闭'}: {self.session_id}")
+            if self._active > 0:
+                raise ConflictException(f"上传会话还有{self._active}个分片正在写入")
+            self.state = SESSION_COMPLETING
+
+    def cancel_complete(self) -> None:
+        """合并失败时恢复为可上传状态"""
+        with self._lock:
+            if self.state == SESSION_COMPLETING:
+                self.state = SESSION_OPEN
+
+    def finish(self) -> None:
+        """合并完成，文件已经被重命名为目标文件，只需关闭文件描述符"""
+        with self._lock:
+            self.state = SESSION_CLOSED
+            self._close()
+
+    def abort(self) -> None:
+        """放弃上传并删除临时文件，正在写入的分片结束后再关闭文件描述符"""
+        with self._lock:
+            if self.state == SESSION_COMPLETING:
+                raise ConflictException(f"上传会话正在合并中: {self.session_id}")
+            self.state = SESSION_CLOSED
+            if self._active == 0:
+                self._close()
+        try:
+            os.unlink(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+    def _close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def commit(self, preserve_from: Optional[os.stat_result]) -> None:
+        """按落盘策略同步临时文件后重命名为目标文件，保留原文件的权限与属主"""
+        sync_file(self.fd, self.fsync)
+        if preserve_from is not None:
+            os.fchmod(self.fd, preserve_from.st_mode & 0o7777)
+            try:
+                os.fchown(self.fd, preserve_from.st_uid, preserve_from.st_gid)
+            except PermissionError:
+                pass
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.fchmod(self.fd, 0o666 & ~umask)
+        os.replace(self.temp_path, self.target)
+        if self.fsync == FSYNC_FULL:
+            sync_dir(os.path.dirname(self.target))
+
+
+class UploadSessionManager:
+    """分片上传会话管理，超过ttl秒没有活动的会话会在创建新会话时被清理"""
+
+    def __init__(self, ttl: int = 24 * 3600, max_sessions: int = 256) -> None:
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+
+    def create(self, file_path: str, total_size: int, expected_hash: Optional[str],
+               fsync: str = FSYNC_NONE) -> UploadSession:
+        """创建会话并预分配临时文件"""
+        self.expire()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise ConflictException(f"上传会话数量已达上限{self.max_sessions}")
+            session = UploadSession(uuid.uuid4().hex, file_path, total_size, expected_hash, fsync)
+            self._sessions[session.session_id] = session
+        try:
+            os.makedirs(os.path.dirname(session.target), exist_ok=True)
+            session.open()
+        except BaseException:
+            self.remove(session.session_id)
+            raise
+        return session
+
+    def get(self, session_id: str) -> UploadSession:
+        """根据会话id获取会话"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise NotFoundException(f"上传会话不存在或已过期: {session_id}")
+        return session
+
+    def remove(self, session_id: str) -> Optional[UploadSession]:
+        """移除会话(不删除临时文件)"""
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def expire(self) -> None:
+        """清理长时间没有活动的会话及其临时文件"""
+        deadline = time.time() - self.ttl
+        with self._lock:
+            expired = [session for session in self._sessions.values()
+                       if session.updated_at < deadline and session.state == SESSION_OPEN]
+            for session in expired:
+                del self._sessions[session.session_id]
+        for session in expired:
+            session.abort()
+
+    def close(self) -> None:
+        """放弃全部会话"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            try:
+                session.abort()
+            except ConflictException:
+                pass
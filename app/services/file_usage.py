@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 22:20
+@Author : YangFei
+@File   : file_usage.py
+@Desc   : 并行统计目录占用空间，按目录修改时间缓存每个目录的扫描结果
+"""
+import heapq
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, FIRST_COMPLETED, Future, wait
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+# 每个目录缓存的最大文件数量(用于返回最大的条目)
+LARGEST_PER_DIR = 50
+
+
+class DirScan(NamedTuple):
+    """单个目录的直接内容(不含子目录内部)，签名(设备, inode, 修改时间)不变时可以复用"""
+    signature: Tuple[int, int, int]
+    scanned_at: float
+    dir_bytes: int
+    dir_disk_bytes: int
+    file_bytes: int
+    file_disk_bytes: int
+    file_count: int
+    subdirs: List[str]
+    largest: List[Tuple[int, int, str]]
+    hardlinks: List[Tuple[int, int, int, int]]
+    errors: int
+
+
+class DirUsage(NamedTuple):
+    """目录(含全部子目录)的汇总"""
+    path: str
+    bytes: int
+    disk_bytes: int
+    file_count: int
+    dir_count: int
+    is_dir: bool = True
+
+
+def _dir_signature(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_dev, st.st_ino, st.st_mtime_ns
+
+
+def _scan_dir(path: str, st: os.stat_result, keep: Optional[int] = LARGEST_PER_DIR) -> DirScan:
+    """
+    扫描一个目录的直接内容：目录本身与文件(含软链接本身)的大小、文件数量、子目录名称、最大的keep个文件(None表示全部)
+    存在多个硬链接的文件单独记录(设备, inode, 大小, 占用)，由汇总时去重，不计入file_bytes与file_count
+    """
+    file_bytes = file_disk_bytes = file_count = errors = 0
+    subdirs: List[str] = []
+    largest: List[Tuple[int, int, str]] = []
+    hardlinks: List[Tuple[int, int, int, int]] = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    entry_st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    errors += 1
+                    continue
+                if stat.S_ISDIR(entry_st.st_mode):
+                    subdirs.append(entry.name)
+                    continue
+                disk_bytes = entry_st.st_blocks * 512
+                if entry_st.st_nlink > 1:
+                    hardlinks.append((entry_st.st_dev, entry_st.st_ino, entry_st.st_size, disk_bytes))
+                else:
+                    file_bytes += entry_st.st_size
+                    file_disk_bytes += disk_bytes
+                    file_count += 1
+                item = (entry_st.st_size, disk_bytes, entry.name)
+                if keep is None or len(largest) < keep:
+                    heapq.heappush(largest, item)
+                elif item > largest[0]:
+                    heapq.heapreplace(largest, item)
+    except OSError:
+        errors += 1
+    return DirScan(_dir_signature(st), time.time(), st.st_size, st.st_blocks * 512, file_bytes, file_disk_bytes, file_count, subdirs,
+                   sorted(largest, reverse=True), hardlinks, errors)
+
+
+class DiskUsageResult(NamedTuple):
+    """一次统计的结果"""
+    total: DirUsage
+    children: List[DirUsage]
+    largest_files: List[DirUsage]
+    scanned_dirs: int
+    cached_dirs: int
+    errors: int
+
+
+class DiskUsageCache:
+    """
+    目录占用空间统计
+    1.每个目录的直接内容按(设备, inode, 修改时间)缓存，目录中新增/删除/重命名条目会改变修改时间，此时才重新扫描该目录
+    2.目录修改时间不会因为已有文件原地变大而改变，因此缓存超过ttl秒的目录也会重新扫描
+    3.统计时按层并行：每个目录只需一次stat校验缓存，未命中的目录在线程池中扫描，子目录随扫描结果继续提交
+    """
+
+    def __init__(self, max_dirs: int = 100000, ttl: int = 300) -> None:
+        self.max_dirs = max_dirs
+        self.ttl = ttl
+        self._cache: "OrderedDict[str, DirScan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, path: str, st: os.stat_result) -> Optional[DirScan]:
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is None:
+                return None
+            if cached.signature != _dir_signature(st) or cached.scanned_at < time.time() - self.ttl:
+                del self._cache[path]
+                return None
+            self._cache.move_to_end(path)
+            return cached
+
+    def _store(self, path: str, scan: DirScan) -> None:
+        with self._lock:
+            self._cache[path] = scan
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.max_dirs:
+                self._cache.popitem(last=False)
+
+    def _visit(self, path: str, refresh: bool, keep_all: bool = False) -> Tuple[Optional[DirScan], bool]:
+        """
+        读取或扫描单个目录，返回(扫描结果, 是否命中缓存)，目录已不存在时返回None
+        keep_all为True时需要全部文件(统计的根目录)，只保留了最大若干个文件的缓存视为未命中
+        """
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except OSError:
+            return None, False
+        if not refresh:
+            cached = self._lookup(path, st)
+            if cached is not None and (not keep_all or len(cached.largest) >= cached.file_count + len(cached.hardlinks)):
+                return cached, True
+        scan = _scan_dir(path, st, None if keep_all else LARGEST_PER_DIR)
+        self._store(path, scan)
+        return scan, False
+
+    def usage(self, root: str, executor: Executor, workers: int, refresh: bool = False,
+              top: int = 20) -> DiskUsageResult:
+        """
+        统计root的占用空间
+        1.从root开始并行访问全部目录，同时在途的任务数不超过workers的4倍
+        2.从下到上汇总每个目录的大小，同一个inode的多个硬链接只计算一次(与du一致，计入路径排序最靠前的目录)
+        3.返回root的各个直接子目录与文件、整个目录树中最大的文件
+        """
+        root = os.path.abspath(root)
+        scans: Dict[str, DirScan] = {}
+        scanned = cached = 0
+
+        # 1.并行访问目录树
+        pending: Set[Future] = set()
+        paths: Dict[Future, str] = {}
+        queue: List[str] = [root]
+        while queue or pending:
+            while queue and len(pending) < workers * 4:
+                path = queue.pop()
+                future = executor.submit(self._visit, path, refresh, path == root)
+                paths[future] = path
+                pending.add(future)
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = paths.pop(future)
+                scan, hit = future.result()
+                if scan is None:
+                    continue
+                scans[path] = scan
+                if hit:
+                    cached += 1
+                else:
+                    scanned += 1
+                queue.extend(os.path.join(path, name) for name in scan.subdirs)
+
+        # 2.硬链接去重：每个inode只计入第一个包含它的目录
+        seen: Set[Tuple[int, int]] = set()
+        linked: Dict[str, Tuple[int, int, int]] = {}
+        for path in sorted(scans):
+            link_bytes = link_disk_bytes = link_count = 0
+            for dev, ino, size, disk in scans[path].hardlinks:
+                if (dev, ino) not in seen:
+                    seen.add((dev, ino))
+                    link_bytes += size
+                    link_disk_bytes += disk
+                    link_count += 1
+            linked[path] = (link_bytes, link_disk_bytes, link_count)
+
+        # 3.从下到上汇总(路径越长越先处理，子目录一定先于父目录)
+        totals: Dict[str, DirUsage] = {}
+        for path in sorted(scans, key=len, reverse=True):
+            scan = scans[path]
+            link_bytes, link_disk_bytes, link_count = linked[path]
+            usage_bytes = scan.dir_bytes + scan.file_bytes + link_bytes
+            disk_bytes = scan.dir_disk_bytes + scan.file_disk_bytes + link_disk_bytes
+            file_count, dir_count = scan.file_count + link_count, 0
+            for name in scan.subdirs:
+                child = totals.get(os.path.join(path, name))
+                if child is None:
+                    continue
+                usage_bytes += child.bytes
+                disk_bytes += child.disk_bytes
+                file_count += child.file_count
+                dir_count += child.dir_count + 1
+            totals[path] = DirUsage(path, usage_bytes, disk_bytes, file_count, dir_count)
+
+        # 4.整理root的直接子目录与文件、整个目录树中最大的文件
+        root_scan = scans.get(root)
+        if root_scan is None:
+            raise FileNotFoundError(root)
+        children = [totals[os.path.join(root, name)] for name in root_scan.subdirs
+                    if os.path.join(root, name) in totals]
+        children += [DirUsage(os.path.join(root, name), size, disk_bytes, 1, 0, False)
+                     for size, disk_bytes, name in root_scan.largest]
+        children.sort(key=lambda item: item.bytes, reverse=True)
+        largest = heapq.nlargest(
+            top,
+            ((size, disk_bytes, os.path.join(path, name)) for path, scan in scans.items()
+             for size, disk_bytes, name in scan.largest[:top]),
+        )
+        return DiskUsageResult(
+            total=totals[root],
+            children=children,
+            largest_files=[DirUsage(path, size, disk_bytes, 1, 0, False) for size, disk_bytes, path in largest],
+            scanned_dirs=scanned,
+            cached_dirs=cached,
+            errors=sum(scan.errors for scan in scans.values()),
+        )
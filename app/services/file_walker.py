@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 10:12
+@Author : YangFei
+@File   : file_walker.py
+@Desc   : 基于os.scandir的目录遍历器(支持深度/忽略规则/.gitignore/游标分页)
+"""
+import base64
+import binascii
+import glob
+import json
+import os
+import re
+import stat
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Tuple, Iterator, Iterable, Callable
+
+# 默认忽略的目录/文件名字(版本控制、依赖目录、缓存目录)
+DEFAULT_IGNORE_NAMES = frozenset({
+    ".git",
+    ".hg",
+    ".svn",
+    "node_modules",
+    "__pycache__",
+    ".venv",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    ".tox",
+})
+
+# glob中的通配字符
+_MAGIC_CHARS = re.compile(r"[*?\[]")
+
+# 已解析的.gitignore缓存, key为(文件路径, 基准目录, 修改时间, 大小)
+_GITIGNORE_CACHE: "OrderedDict[tuple, Optional[GitIgnore]]" = OrderedDict()
+_GITIGNORE_CACHE_SIZE = 512
+_GITIGNORE_CACHE_LOCK = threading.Lock()
+
+
+class GitIgnore:
+    """单个.gitignore文件(或一组同类规则)的匹配器"""
+
+    def __init__(self, base: str, patterns: Iterable[str]) -> None:
+        """构造函数，base为规则所在目录相对遍历根目录的路径(根目录为空字符串)"""
+        self.base = base + "/" if base else ""
+        self.rules: List[Tuple[re.Pattern, bool, bool, bool]] = []
+
+        for raw in patterns:
+            # 1.去除行尾空白并跳过空行与注释
+            line = raw.rstrip("\n\r")
+            if not line.strip() or line.startswith("#"):
+                continue
+            line = line.rstrip(" ")
+
+            # 2.解析取反规则(!)与转义
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+
+            # 3.以/结尾表示只匹配文件夹
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+
+            # 4.中间或开头包含/的规则相对.gitignore所在目录锚定，否则匹配任意层级的名字
+            anchored = "/" in line
+            line = line.lstrip("/")
+            regex = re.compile(glob.translate(line, recursive=True, include_hidden=True, seps="/"))
+            self.rules.append((regex, negate, dir_only, anchored))
+
+    @classmethod
+    def load(cls, dir_path: str, base: str) -> Optional["GitIgnore"]:
+        """读取指定目录下的.gitignore文件，不存在或无法读取时返回None，未变更的文件直接使用缓存"""
+        path = os.path.join(dir_path, ".gitignore")
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (path, base, st.st_mtime_ns, st.st_size)
+        with _GITIGNORE_CACHE_LOCK:
+            if key in _GITIGNORE_CACHE:
+                _GITIGNORE_CACHE.move_to_end(key)
+                return _GITIGNORE_CACHE[key]
+
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                rules = cls(base, f.readlines())
+        except OSError:
+            return None
+        result = rules if rules.rules else None
+        with _GITIGNORE_CACHE_LOCK:
+            _GITIGNORE_CACHE[key] = result
+            if len(_GITIGNORE_CACHE) > _GITIGNORE_CACHE_SIZE:
+                _GITIGNORE_CACHE.popitem(last=False)
+        return result
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """判断路径是否被忽略，返回True(忽略)/False(取反重新包含)/None(无匹配规则)"""
+        # 1.只处理位于规则目录之下的路径
+        if self.base and not rel_path.startswith(self.base):
+            return None
+        path = rel_path[len(self.base):]
+        name = path.rsplit("/", 1)[-1]
+
+        # 2.按照git语义，最后一条匹配的规则生效
+        for regex, negate, dir_only, anchored in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path if anchored else name):
+                return not negate
+        return None
+
+
+def encode_cursor(rel_path: str) -> str:
+    """将最后返回的相对路径编码为不透明的分页游标"""
+    raw = json.dumps({"after": rel_path}, ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> str:
+    """解析分页游标，返回上一页最后一个条目的相对路径"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(data["after"])
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+def entry_type(entry: os.DirEntry) -> str:
+    """根据DirEntry获取条目类型(不跟随软链接)"""
+    if entry.is_symlink():
+        return "symlink"
+    if entry.is_dir(follow_symlinks=False):
+        return "dir"
+    if entry.is_file(follow_symlinks=False):
+        return "file"
+    return "other"
+
+
+def stat_file_type(st: os.stat_result) -> str:
+    """根据stat结果获取条目类型"""
+    if stat.S_ISLNK(st.st_mode):
+        return "symlink"
+    if stat.S_ISDIR(st.st_mode):
+        return "dir"
+    if stat.S_ISREG(st.st_mode):
+        return "file"
+    return "other"
+
+
+def entry_metadata(entry: os.DirEntry) -> dict:
+    """从DirEntry提取类型、大小、修改时间(stat结果由DirEntry缓存)"""
+    try:
+        st = entry.stat(follow_symlinks=False)
+    except OSError:
+        return {"type": entry_type(entry), "size": None, "mtime": None}
+    return {"type": stat_file_type(st), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def scan_dir_sorted(path: str) -> List[os.DirEntry]:
+    """读取文件夹并按名字排序，无法读取时返回空列表"""
+    try:
+        with os.scandir(path) as it:
+            return sorted(it, key=lambda e: e.name)
+    except OSError:
+        return []
+
+
+def iter_glob_entries(
+        root: str,
+        glob_pattern: str,
+        max_depth: Optional[int] = None,
+        ignore_names: Iterable[str] = DEFAULT_IGNORE_NAMES,
+        ignore_patterns: Optional[List[str]] = None,
+        respect_gitignore: bool = True,
+        after: Optional[str] = None,
+        list_dir: Optional[Callable[[str], Optional[list]]] = None,
+) -> Iterator[Tuple[str, os.DirEntry]]:
+    """
+    按照稳定的字典序深度优先遍历root，逐个产出与glob匹配的(相对路径, DirEntry)
+    1.glob语义与glob.glob(recursive=True)一致，通配符不匹配以.开头的名字
+    2.pattern开头的固定路径段直接定位，不包含**时自动限制遍历深度
+    3.被忽略的文件夹整体剪枝，不会再进入其内部
+    4.after为上一页最后一个条目的相对路径，字典序不大于它的子树直接跳过
+    5.list_dir用于从内存索引获取已排序的子条目，返回None时回退到磁盘读取
+    """
+    # 1.拆分glob规则，得到开头不含通配符的固定路径段
+    parts = [p for p in glob_pattern.replace(os.sep, "/").split("/") if p and p != "."]
+    if not parts:
+        return
+    prefix = []
+    for part in parts[:-1]:
+        if _MAGIC_CHARS.search(part):
+            break
+        prefix.append(part)
+    pattern = "/".join(parts)
+    if glob_pattern.endswith("/"):
+        # 以/结尾的规则只匹配文件夹
+        matcher = None
+        dir_matcher = re.compile(glob.translate(pattern + "/", recursive=True, include_hidden=False))
+    else:
+        matcher = re.compile(glob.translate(pattern, recursive=True, include_hidden=False))
+        dir_matcher = None
+
+    # 2.不包含**时遍历深度不会超过规则的段数
+    if not any("**" in part for part in parts):
+        max_depth = len(parts) if max_depth is None else min(max_depth, len(parts))
+
+    # 3.剩余规则段都不以.或[开头时，隐藏条目不可能被匹配，可以直接剪枝
+    skip_hidden = not any(part.startswith((".", "[")) for part in parts[len(prefix):])
+
+    # 4.定位起始目录并加载沿途的忽略规则
+    ignore_names = frozenset(ignore_names)
+    ignores: Tuple[GitIgnore, ...] = ()
+    if ignore_patterns:
+        ignores += (GitIgnore("", ignore_patterns),)
+    for idx in range(len(prefix)):
+        if respect_gitignore:
+            rules = GitIgnore.load(os.path.join(root, *prefix[:idx]), "/".join(prefix[:idx]))
+            if rules is not None:
+                ignores += (rules,)
+    start_dir = os.path.join(root, *prefix)
+    if not os.path.isdir(start_dir):
+        return
+    after_parts = tuple(after.split("/")) if after else None
+
+    # 5.使用显式栈完成深度优先遍历，栈中元素为(DirEntry, 绝对路径, 相对路径, 深度, 生效的忽略规则)
+    stack: List[Tuple[Optional[os.DirEntry], str, str, int, Tuple[GitIgnore, ...]]] = [
+        (None, start_dir, "/".join(prefix), len(prefix), ignores),
+    ]
+    while stack:
+        entry, abs_path, rel_path, depth, ignores = stack.pop()
+
+        # 6.判断当前条目是否需要输出(起始目录本身不输出)
+        is_dir = entry is None or entry.is_dir(follow_symlinks=False)
+        if entry is not None:
+            rel_parts = tuple(rel_path.split("/"))
+            skip_emit = False
+            if after_parts is not None:
+                if after_parts[:len(rel_parts)] == rel_parts:
+                    skip_emit = True
+                elif rel_parts < after_parts:
+                    continue
+            if not skip_emit:
+                if matcher is not None and matcher.match(rel_path):
+                    yield rel_path, entry
+                elif is_dir and dir_matcher is not None and dir_matcher.match(rel_path + "/"):
+                    yield rel_path, entry
+
+        # 7.判断是否继续进入当前文件夹
+        if not is_dir or (max_depth is not None and depth >= max_depth):
+            continue
+        children = list_dir(abs_path) if list_dir is not None else None
+        if children is None:
+            children = scan_dir_sorted(abs_path)
+
+        # 8.加载当前文件夹下的.gitignore规则
+        if respect_gitignore and any(child.name == ".gitignore" for child in children):
+            rules = GitIgnore.load(abs_path, rel_path)
+            if rules is not None:
+                ignores = ignores + (rules,)
+
+        # 9.过滤被忽略的子条目，倒序压栈保证按照字典序弹出
+        for child in reversed(children):
+            if child.name in ignore_names or (skip_hidden and child.name.startswith(".")):
+                continue
+            child_rel = f"{rel_path}/{child.name}" if rel_path else child.name
+            if ignores:
+                child_is_dir = child.is_dir(follow_symlinks=False)
+                ignored = None
+                for rules in reversed(ignores):
+                    ignored = rules.match(child_rel, child_is_dir)
+                    if ignored is not None:
+                        break
+                if ignored:
+                    continue
+            stack.append((child, child.path, child_rel, depth + 1, ignores))
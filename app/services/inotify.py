@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 11:05
+@Author : YangFei
+@File   : inotify.py
+@Desc   : 基于ctypes的Linux inotify轻量绑定
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+from typing import List, NamedTuple, Optional
+
+# inotify事件掩码
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+# 文件夹树变更需要关注的事件集合
+IN_TREE_EVENTS = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        | IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyEvent(NamedTuple):
+    """inotify事件"""
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+
+class InotifyError(OSError):
+    """inotify调用失败"""
+
+
+def _load_libc() -> Optional[ctypes.CDLL]:
+    """加载libc并检测inotify接口是否可用，非Linux系统返回None"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def inotify_available() -> bool:
+    """判断当前系统是否支持inotify"""
+    return _libc is not None
+
+
+class Inotify:
+    """inotify实例，封装文件描述符与watch的增删、事件读取"""
+
+    def __init__(self) -> None:
+        """构造函数，创建非阻塞的inotify文件描述符"""
+        if _libc is None:
+            raise InotifyError(errno.ENOSYS, "当前系统不支持inotify")
+        fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise InotifyError(err, f"inotify初始化失败: {os.strerror(err)}")
+        self.fd = fd
+
+    def add_watch(self, path: str, mask: int = IN_TREE_EVENTS) -> int:
+        """为路径添加watch并返回watch描述符，达到系统watch上限时抛出errno为ENOSPC的异常"""
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise InotifyError(err, f"添加inotify监听失败[{path}]: {os.strerror(err)}")
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        """移除watch，watch已经失效时忽略错误"""
+        _libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, bufsize: int = 64 * 1024) -> List[InotifyEvent]:
+        """读取当前已就绪的所有事件，没有事件时返回空列表"""
+        try:
+            data = os.read(self.fd, bufsize)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append(InotifyEvent(wd, mask, cookie, name))
+        return events
+
+    def close(self) -> None:
+        """关闭inotify文件描述符(所有watch随之失效)"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
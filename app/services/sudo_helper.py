@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 18:10
+@Author : YangFei
+@File   : sudo_helper.py
+@Desc   : 常驻的特权文件操作助手进程(Unix socket + 分帧协议)
+"""
+import argparse
+import asyncio
+import errno
+import json
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, AsyncIterable, List, Optional, Tuple, Union
+
+from app.services.file_edit import AtomicWriter, ATOMIC_FALLBACK_ERRNOS, FSYNC_NONE, sync_file
+
+logger = logging.getLogger(__name__)
+
+# 协议说明:
+# 1.每个请求/响应头部为: 4字节大端长度 + JSON
+# 2.需要传输文件内容时，头部之后紧跟若干数据块(4字节大端长度 + 数据)，以长度为0的数据块结束
+# 3.read: 请求头部 -> 响应头部 + 数据块
+#   write: 请求头部 + 数据块 -> 响应头部
+#   stat/delete/shutdown: 请求头部 -> 响应头部
+_LENGTH = struct.Struct("!I")
+
+# 单个数据块的大小
+CHUNK_SIZE = 256 * 1024
+
+# 项目根目录(助手进程通过python -m启动，需要在该目录下运行)
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _encode_frame(data: bytes) -> bytes:
+    """编码一个带长度前缀的帧"""
+    return _LENGTH.pack(len(data)) + data
+
+
+def _encode_header(header: dict) -> bytes:
+    """编码JSON头部"""
+    return _encode_frame(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+
+
+def _read_frame(rfile) -> Optional[bytes]:
+    """(同步)读取一个帧，连接关闭时返回None"""
+    raw = rfile.read(_LENGTH.size)
+    if len(raw) < _LENGTH.size:
+        return None
+    (length,) = _LENGTH.unpack(raw)
+    data = rfile.read(length)
+    if len(data) < length:
+        return None
+    return data
+
+
+async def _read_frame_async(reader: asyncio.StreamReader) -> bytes:
+    """(异步)读取一个帧"""
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def _error_header(e: OSError) -> dict:
+    """将OSError转换为响应头部"""
+    return {"ok": False, "errno": e.errno or errno.EIO, "error": e.strerror or str(e)}
+
+
+class _HelperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """助手进程的多线程Unix socket服务"""
+    daemon_threads = True
+    allowed_uid = 0
+
+
+class _HelperHandler(socketserver.StreamRequestHandler):
+    """
+    单个连接的处理器，同一连接上可以顺序发送多个请求
+    只接受服务进程所属用户(与root)的连接
+    """
+
+    def handle(self) -> None:
+        # 1.通过SO_PEERCRED校验对端进程的用户
+        creds = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", creds)
+        if uid not in (self.server.allowed_uid, 0):
+            return
+
+        # 2.循环处理请求，未知操作直接断开连接(无法判断后续是否还有数据块)
+        while True:
+            raw = _read_frame(self.rfile)
+            if raw is None:
+                return
+            header = json.loads(raw)
+            handler = getattr(self, f"_op_{header.get('op')}", None)
+            if handler is None:
+                self._reply({"ok": False, "errno": errno.EINVAL, "error": f"不支持的操作: {header.get('op')}"})
+                return
+            if handler(header) is False:
+                return
+
+    def _reply(self, header: dict) -> None:
+        self.wfile.write(_encode_header(header))
+        self.wfile.flush()
+
+    def _op_read(self, header: dict) -> Optional[bool]:
+        """读取文件内容并按数据块返回"""
+        try:
+            f = open(header["path"], "rb")
+        except OSError as e:
+            self._reply(_error_header(e))
+            return None
+        with f:
+            self._reply({"ok": True, "size": os.fstat(f.fileno()).st_size})
+            try:
+                while chunk := f.read(CHUNK_SIZE):
+                    self.wfile.write(_encode_frame(chunk))
+            except OSError:
+                # 已经开始传输内容，无法再返回错误头部，直接断开连接
+                return False
+            self.wfile.write(_encode_frame(b""))
+            self.wfile.flush()
+        return None
+
+    def _op_write(self, header: dict) -> Optional[bool]:
+        """
+        接收数据块并写入文件，出错时仍需读完剩余数据块
+        覆盖写入默认原子替换(软链接写入其指向的文件)，存在多个硬链接或者无法原子替换时直接覆盖原文件
+        """
+        path, append = os.path.realpath(header["path"]), bool(header.get("append"))
+        fsync = header.get("fsync", FSYNC_NONE)
+        error: Optional[OSError] = None
+        written = 0
+        writer = None
+        try:
+            if append or not header.get("atomic", True):
+                f = open(path, "ab" if append else "wb")
+            else:
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    st = None
+                if st is not None and st.st_nlink > 1:
+                    f = open(path, "wb")
+                else:
+                    try:
+                        atomic_writer = AtomicWriter(path, mode="wb", preserve_from=st, fsync=fsync,
+                                                     fallback_in_place=True)
+                        f = atomic_writer.__enter__().file
+                        writer = atomic_writer
+                    except OSError as e:
+                        if e.errno not in ATOMIC_FALLBACK_ERRNOS:
+                            raise
+                        f = open(path, "wb")
+        except OSError as e:
+            error, f = e, None
+
+        try:
+            while True:
+                chunk = _read_frame(self.rfile)
+                if chunk is None:
+                    error = error or OSError(errno.EPIPE, "连接在写入完成前关闭")
+                    return False
+                if not chunk:
+                    break
+                if f is not None and error is None:
+                    try:
+                        f.write(chunk)
+                        written += len(chunk)
+                    except OSError as e:
+                        error = e
+        finally:
+            # 1.出错时放弃写入，原子写入的临时文件被删除
+            if writer is not None:
+                if error is not None:
+                    writer.discard()
+                try:
+                    writer.__exit__(None, None, None)
+                except OSError as e:
+                    error = error or e
+            elif f is not None:
+                try:
+                    f.flush()
+                    sync_file(f.fileno(), fsync)
+                except OSError as e:
+                    error = error or e
+                f.close()
+
+        self._reply(_error_header(error) if error is not None else {"ok": True, "bytes_written": written})
+        return None
+
+    def _op_stat(self, header: dict) -> None:
+        """获取文件元数据"""
+        try:
+            st = os.stat(header["path"], follow_symlinks=header.get("follow_symlinks", True))
+        except OSError as e:
+            self._reply(_error_header(e))
+            return
+        self._reply({
+            "ok": True,
+            "stat": {
+                "mode": st.st_mode,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "uid": st.st_uid,
+                "gid": st.st_gid,
+                "ino": st.st_ino,
+                "dev": st.st_dev,
+            },
+        })
+
+    def _op_delete(self, header: dict) -> None:
+        """删除文件"""
+        try:
+            os.remove(header["path"])
+        except OSError as e:
+            self._reply(_error_header(e))
+            return
+        self._reply({"ok": True})
+
+    def _op_shutdown(self, header: dict) -> bool:
+        """关闭助手进程"""
+        self._reply({"ok": True})
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+        return False
+
+
+class SudoHelperClient:
+    """
+    特权文件操作助手的客户端
+    1.第一次使用时通过sudo -n启动常驻的助手进程(当前已是root时直接启动)，之后每次操作只需一次socket往返
+    2.socket位于只有当前用户可以访问的临时目录中，助手进程同时校验对端用户
+    3.空闲连接放回连接池复用，助手进程在服务进程退出后自动退出
+    """
+
+    def __init__(self, max_idle_connections: int = 4) -> None:
+        """构造函数，max_idle_connections为连接池中最多保留的空闲连接数"""
+        self.max_idle_connections = max_idle_connections
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._socket_dir: Optional[str] = None
+        self._socket_path: Optional[str] = None
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._start_lock = asyncio.Lock()
+
+    async def _ensure_started(self) -> None:
+        """确保助手进程已经启动"""
+        if self._process is not None and self._process.returncode is None:
+            return
+        async with self._start_lock:
+            if self._process is not None and self._process.returncode is None:
+                return
+
+            # 1.清理上一次的连接与socket目录
+            self._close_idle()
+            if self._socket_dir is not None:
+                shutil.rmtree(self._socket_dir, ignore_errors=True)
+
+            # 2.在只有当前用户可以访问的临时目录中启动助手进程
+            self._socket_dir = tempfile.mkdtemp(prefix="neon-sudo-")
+            self._socket_path = os.path.join(self._socket_dir, "helper.sock")
+            command = [
+                sys.executable, "-m", "app.services.sudo_helper",
+                "--socket", self._socket_path,
+                "--uid", str(os.getuid()),
+                "--parent-pid", str(os.getpid()),
+            ]
+            if os.geteuid() != 0:
+                command = ["sudo", "-n", *command]
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                cwd=_PROJECT_ROOT,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+
+            # 3.等待socket文件创建，进程提前退出说明启动失败(例如没有免密sudo权限)
+            deadline = time.monotonic() + 10
+            while not os.path.exists(self._socket_path):
+                if process.returncode is not None:
+                    stderr = await process.stderr.read()
+                    raise OSError(errno.EPERM, f"特权助手进程启动失败: {stderr.decode(errors='replace').strip()}")
+                if time.monotonic() > deadline:
+                    process.kill()
+                    raise OSError(errno.ETIMEDOUT, "特权助手进程启动超时")
+                await asyncio.sleep(0.02)
+
+            # 4.后台读取助手进程的错误输出，避免管道写满阻塞助手进程
+            self._process = process
+            asyncio.create_task(self._drain_stderr(process))
+            logger.info(f"特权助手进程已启动, pid: {process.pid}")
+
+    @classmethod
+    async def _drain_stderr(cls, process: asyncio.subprocess.Process) -> None:
+        """读取助手进程的错误输出并写入日志"""
+        while line := await process.stderr.readline():
+            logger.warning(f"特权助手进程: {line.decode(errors='replace').rstrip()}")
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """从连接池获取连接，没有空闲连接时新建"""
+        await self._ensure_started()
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+        return await asyncio.open_unix_connection(self._socket_path)
+
+    def _release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, reusable: bool) -> None:
+        """操作完成后归还连接，出错的连接直接关闭"""
+        if reusable and len(self._idle) < self.max_idle_connections:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def _close_idle(self) -> None:
+        """关闭所有空闲连接"""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    @classmethod
+    def _check(cls, header: dict) -> dict:
+        """检查响应头部，失败时抛出与errno对应的OSError(例如FileNotFoundError)"""
+        if not header.get("ok"):
+            raise OSError(header.get("errno") or errno.EIO, header.get("error") or "特权助手操作失败")
+        return header
+
+    async def _request(self, header: dict) -> dict:
+        """发送不带数据块的请求并读取响应头部"""
+        reader, writer = await self._connect()
+        reusable = False
+        try:
+            writer.write(_encode_header(header))
+            await writer.drain()
+            response = json.loads(await _read_frame_async(reader))
+            reusable = True
+            return self._check(response)
+        finally:
+            self._release(reader, writer, reusable)
+
+    async def read_chunks(self, path: str) -> AsyncIterator[bytes]:
+        """以数据块的形式流式读取文件内容"""
+        reader, writer = await self._connect()
+        reusable = False
+        try:
+            writer.write(_encode_header({"op": "read", "path": path}))
+            await writer.drain()
+            header = json.loads(await _read_frame_async(reader))
+            if not header.get("ok"):
+                reusable = True
+                self._check(header)
+            while chunk := await _read_frame_async(reader):
+                yield chunk
+            reusable = True
+        finally:
+            self._release(reader, writer, reusable)
+
+    async def read(self, path: str) -> bytes:
+        """读取文件的全部内容"""
+        return b"".join([chunk async for chunk in self.read_chunks(path)])
+
+    async def write(
+            self,
+            path: str,
+            data: Union[bytes, AsyncIterable[bytes]],
+            append: bool = False,
+            atomic: bool = True,
+            fsync: str = FSYNC_NONE,
+    ) -> int:
+        """写入文件内容(data可以是异步数据块迭代器)，返回写入的字节数"""
+        reader, writer = await self._connect()
+        reusable = False
+        try:
+            writer.write(_encode_header({"op": "write", "path": path, "append": append, "atomic": atomic, "fsync": fsync}))
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                view = memoryview(data)
+                for offset in range(0, len(view), CHUNK_SIZE):
+                    writer.write(_encode_frame(bytes(view[offset:offset + CHUNK_SIZE])))
+                    await writer.drain()
+            else:
+                async for chunk in data:
+                    if chunk:
+                        writer.write(_encode_frame(chunk))
+                        await writer.drain()
+            writer.write(_encode_frame(b""))
+            await writer.drain()
+            header = json.loads(await _read_frame_async(reader))
+            reusable = True
+            return self._check(header)["bytes_written"]
+        finally:
+            self._release(reader, writer, reusable)
+
+    async def stat(self, path: str, follow_symlinks: bool = True) -> dict:
+        """获取文件元数据"""
+        return (await self._request({"op": "stat", "path": path, "follow_symlinks": follow_symlinks}))["stat"]
+
+    async def delete(self, path: str) -> None:
+        """删除文件"""
+        await self._request({"op": "delete", "path": path})
+
+    async def close(self) -> None:
+        """关闭助手进程并清理socket目录"""
+        process = self._process
+        if process is not None and process.returncode is None:
+            try:
+                await asyncio.wait_for(self._request({"op": "shutdown"}), timeout=2)
+                await asyncio.wait_for(process.wait(), timeout=2)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                logger.warning("特权助手进程未能正常退出")
+        self._close_idle()
+        self._process = None
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+
+def main() -> None:
+    """助手进程入口: python -m app.services.sudo_helper --socket <路径> --uid <用户> --parent-pid <服务进程>"""
+    parser = argparse.ArgumentParser(description="Neon Sandbox 特权文件操作助手")
+    parser.add_argument("--socket", required=True, help="监听的Unix socket路径")
+    parser.add_argument("--uid", type=int, required=True, help="允许连接的用户")
+    parser.add_argument("--parent-pid", type=int, required=True, help="服务进程pid，服务进程退出后助手进程随之退出")
+    args = parser.parse_args()
+
+    # 1.创建socket并只允许服务进程所属用户访问
+    # 先在临时路径上监听并设置属主与权限，再重命名到约定路径，服务进程看到socket文件时权限已经就绪
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    staging_path = f"{args.socket}.{os.getpid()}"
+    server = _HelperServer(staging_path, _HelperHandler)
+    server.allowed_uid = args.uid
+    os.chown(staging_path, args.uid, -1)
+    os.chmod(staging_path, 0o600)
+    os.rename(staging_path, args.socket)
+
+    # 2.服务进程退出后关闭助手进程
+    def watch_parent() -> None:
+        while True:
+            time.sleep(1)
+            try:
+                os.kill(args.parent_pid, 0)
+            except ProcessLookupError:
+                server.shutdown()
+                return
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.unlink(args.socket)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()